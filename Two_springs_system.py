@@ -1,61 +1,82 @@
-import pygame
 import pymunk
+from loop_policy import FixedTimestepPolicy
 '''
-This model consists of two fixed points and falling center point attached to them by two springs.   
+This model consists of two fixed points and falling center point attached to them by two springs.
+The model is created by create_model() without pygame, the window is opened only by main().
 '''
 
-# Pygame initialization
-pygame.init()
-screen = pygame.display.set_mode((800, 600))
-clock = pygame.time.Clock()
 
-# Pymunk initialization
-space = pymunk.Space()
-space.gravity = (0, 10)
+def create_model(gravity = (0, 10)) -> tuple:
+    # Pymunk initialization
+    space = pymunk.Space()
+    space.gravity = gravity
 
-# Creating fixed points
-left_pivot = pymunk.Body(body_type=pymunk.Body.STATIC)
-left_pivot.position = (200, 100)
-right_pivot = pymunk.Body(body_type=pymunk.Body.STATIC)
-right_pivot.position = (600, 100)
+    # Creating fixed points
+    left_pivot = pymunk.Body(body_type=pymunk.Body.STATIC)
+    left_pivot.position = (200, 100)
+    right_pivot = pymunk.Body(body_type=pymunk.Body.STATIC)
+    right_pivot.position = (600, 100)
 
 
-#Creating moving loaded point body. 
-loaded_point = pymunk.Body(7, 1, body_type=pymunk.Body.DYNAMIC)
-loaded_point.position = (400, 100)
+    #Creating moving loaded point body.
+    loaded_point = pymunk.Body(7, 1, body_type=pymunk.Body.DYNAMIC)
+    loaded_point.position = (400, 100)
 
 
-# Creating springs
-spring1 = pymunk.DampedSpring(left_pivot, loaded_point, (0, 0), (0, 0), rest_length = 100, stiffness = 0.2, damping = 0.05)
-spring2 = pymunk.DampedSpring(loaded_point, right_pivot, (0, 0), (0, 0), rest_length = 100, stiffness = 0.2, damping = 0.05)
+    # Creating springs
+    spring1 = pymunk.DampedSpring(left_pivot, loaded_point, (0, 0), (0, 0), rest_length = 100, stiffness = 0.2, damping = 0.05)
+    spring2 = pymunk.DampedSpring(loaded_point, right_pivot, (0, 0), (0, 0), rest_length = 100, stiffness = 0.2, damping = 0.05)
 
-# Adding all of created objects to the space
-space.add(left_pivot, right_pivot, loaded_point, spring1, spring2)
+    # Adding all of created objects to the space
+    space.add(left_pivot, right_pivot, loaded_point, spring1, spring2)
 
-#Initial velocity vector for center point 
-loaded_point.velocity = pymunk.Vec2d(0, 0)
+    #Initial velocity vector for center point
+    loaded_point.velocity = pymunk.Vec2d(0, 0)
+    return space, left_pivot, right_pivot, loaded_point
 
-# Main game loop
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            exit()
-
-    screen.fill((255, 255, 255))
-
-    # The step of Pymunk simulation
-    dt = 1.0 / 60.0
-    for _ in range(10):
-        space.step(dt)
 
+def draw(screen, left_pivot: pymunk.Body, right_pivot: pymunk.Body, loaded_point: pymunk.Body):
     # Draw springs and points
+    import pygame
     pygame.draw.line(screen, (0, 0, 0), left_pivot.position, loaded_point.position, 2)
-    pygame.draw.line(screen, (0, 0, 0), loaded_point.position, right_pivot.position, 2) 
+    pygame.draw.line(screen, (0, 0, 0), loaded_point.position, right_pivot.position, 2)
     pygame.draw.circle(screen, (255, 0, 0), (int(left_pivot.position.x), int(left_pivot.position.y)), 5)
-    pygame.draw.circle(screen, (255, 0, 0), (int(right_pivot.position.x), int(right_pivot.position.y)), 5) 
+    pygame.draw.circle(screen, (255, 0, 0), (int(right_pivot.position.x), int(right_pivot.position.y)), 5)
     pygame.draw.circle(screen, (0, 0, 255), (int(loaded_point.position.x), int(loaded_point.position.y)), 10)
 
-    # Screen update
-    pygame.display.flip()
-    clock.tick(60)
+
+def main():
+    import pygame
+    # Pygame initialization
+    pygame.init()
+    screen = pygame.display.set_mode((800, 600))
+    clock = pygame.time.Clock()
+
+    space, left_pivot, right_pivot, loaded_point = create_model()
+
+    # Physics is stepped with dt = 1/60 and runs 10 times faster than real time (as 10 steps of 1/60 per frame before),
+    # but it doesn't depend on the display rate now
+    policy = FixedTimestepPolicy(physics_rate = 60, max_substeps = 20, time_scale = 10)
+
+    # Main game loop
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+
+        screen.fill((255, 255, 255))
+
+        # The step of Pymunk simulation
+        policy.run(space, clock.get_time() / 1000)
+
+        draw(screen, left_pivot, right_pivot, loaded_point)
+
+        # Screen update
+        pygame.display.flip()
+        clock.tick(60)
+
+
+
+if __name__ == '__main__':
+    main()
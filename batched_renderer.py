@@ -0,0 +1,121 @@
+import itertools
+
+import numpy as np
+
+
+'''
+Batched drawing of chains and ropes from (N, 2) position arrays.
+    1. Chain of springs is drawn as one polyline (pg.draw.lines) instead of one pg.draw.line per spring.
+    2. Nodes are stamped with one Surface.blits call of a pre-rendered circle sprite,
+       sprites are cached by radius and color.
+Positions are converted to Python lists once per call instead of Vec2d -> tuple conversion for every object.
+Pygame is imported by the drawing functions, so the modules of the models can be imported without it.
+With return_rects = True the functions return the bounding rectangles of the drawn primitives.
+
+DirtyRectRenderer draws the static geometry of a model (fixed points, edges) once on a cached background surface.
+Every frame it restores the background under the rectangles of the previous frame, draws the moving parts and returns
+the rectangles of the previous and the current frame, they are passed to pg.display.update(rects) instead of updating
+the whole window. Equal bounding rectangles don't mean equal pixels (a polyline whose inner points moved has the same
+bounding box), so the rectangles of both frames are always updated.
+'''
+
+
+class SpriteCache:
+    #Pre-rendered circle sprites with colorkey transparency, keyed by (radius, color)
+    def __init__(self):
+        self.__sprites = {}
+
+
+    def get(self, radius, color) -> 'pg.Surface':
+        import pygame as pg
+        key = (radius, tuple(color))
+        sprite = self.__sprites.get(key)
+        if sprite is None:
+            size = int(np.ceil(2 * radius)) + 1
+            key_color = (255, 0, 255) if tuple(color)[:3] != (255, 0, 255) else (0, 255, 0)
+            sprite = pg.Surface((size, size))
+            sprite.fill(key_color)
+            sprite.set_colorkey(key_color)
+            pg.draw.circle(sprite, color, (size / 2, size / 2), radius)
+            self.__sprites[key] = sprite
+        return sprite
+
+
+    def clear(self):
+        self.__sprites.clear()
+
+
+sprite_cache = SpriteCache()
+
+
+def stamp_nodes(surface: 'pg.Surface', positions, radius, color, cache = None, return_rects = False):
+    #Drawing circles of the same radius and color at all positions with one Surface.blits call
+    positions = np.asarray(positions, dtype = np.float64)
+    if len(positions) == 0:
+        return [] if return_rects else None
+    sprite = (sprite_cache if cache is None else cache).get(radius, color)
+    top_left = (positions - sprite.get_width() / 2).round().astype(np.int64).tolist()
+    rects = surface.blits(zip(itertools.repeat(sprite), top_left), doreturn = return_rects)
+    return rects if return_rects else None
+
+
+def draw_chain(surface: 'pg.Surface', positions, color, width = 1, return_rects = False):
+    #Drawing the chain of springs (rods) through consecutive positions as one polyline (its rectangle is the bounding box)
+    import pygame as pg
+    points = np.asarray(positions, dtype = np.float64).tolist()
+    rects = [pg.draw.lines(surface, color, False, points, width)] if len(points) >= 2 else []
+    return rects if return_rects else None
+
+
+def draw_segments(surface: 'pg.Surface', a_positions, b_positions, color, width = 1, return_rects = False):
+    #Drawing independent segments a[i] - b[i] (for example vertical constraints of CoupledOscillatorModel)
+    import pygame as pg
+    line = pg.draw.line
+    rects = [line(surface, color, a_pos, b_pos, width) for a_pos, b_pos in
+             zip(np.asarray(a_positions, dtype = np.float64).tolist(), np.asarray(b_positions, dtype = np.float64).tolist())]
+    return rects if return_rects else None
+
+
+class DirtyRectRenderer:
+    def __init__(self, screen: 'pg.Surface', draw_static, draw_dynamic, background_color = (255,255,255),
+                 full_update_ratio = 0.5):
+        #draw_static(surface) draws the static geometry on the given surface,
+        #draw_dynamic(*args) draws the moving parts on the screen and returns the list of rectangles of the drawn primitives.
+        #If the changed area is larger than full_update_ratio of the screen, the whole screen is updated with one rectangle.
+        self.screen, self.draw_static, self.draw_dynamic = screen, draw_static, draw_dynamic
+        self.background_color, self.full_update_ratio = background_color, full_update_ratio
+        self.background, self.__previous_rects = None, None
+
+
+    def invalidate(self):
+        #The next frame rebuilds the background and updates the whole screen
+        #(after the screen was changed by other code, the window was resized or exposed)
+        self.background, self.__previous_rects = None, None
+
+
+    def rebuild(self):
+        import pygame as pg
+        self.background = pg.Surface(self.screen.get_size())
+        self.background.fill(self.background_color)
+        self.draw_static(self.background)
+        self.screen.blit(self.background, (0, 0))
+        self.__previous_rects = None
+
+
+    def render(self, *args) -> list:
+        #Drawing one frame, returns the rectangles for pg.display.update
+        if self.background is None or self.background.get_size() != self.screen.get_size():
+            self.rebuild()
+        previous_rects = self.__previous_rects
+        if previous_rects is not None:
+            background = self.background
+            self.screen.blits([(background, rect, rect) for rect in previous_rects], doreturn = False)
+        rects = self.draw_dynamic(*args)
+        self.__previous_rects = rects
+        screen_rect = self.screen.get_rect()
+        if previous_rects is None:
+            return [screen_rect]
+        dirty = previous_rects + rects
+        if sum(rect.width * rect.height for rect in dirty) > self.full_update_ratio * screen_rect.width * screen_rect.height:
+            return [screen_rect]
+        return dirty
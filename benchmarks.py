@@ -0,0 +1,232 @@
+import argparse
+import gc
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import pymunk as pm
+from coupled_oscillator_model import WindowSpaceInitializer, CoupledOscillatorModel
+from newton_pendulum import NewtonPendulum
+from rope_system_modified import LoadedRopeModel
+
+
+'''
+Benchmark suite of the models. Every model is built headlessly (off-screen surface, no window) for every size
+of the ladder and the following metrics are measured:
+    construct_s - time of the model construction (constructor + create_model) in seconds
+    steps_per_s - number of space.step(dt) calls per second (steps are run until min_time is reached)
+    draw_ms - mean time of one model.draw() call on the off-screen surface in milliseconds (at least draw_repeats calls)
+    peak_memory_mb - peak of the python allocations (tracemalloc) during the construction and steps_for_memory steps,
+                     memory allocated by chipmunk itself isn't traced, so it is a lower bound
+Every measurement is repeated `repeats` times (the model is built again for every repeat): the times are the best
+of the repeats (min of construct_s and draw_ms, max of steps_per_s), the memory is the median. The relative spread
+of the repeats is saved as {metric}_noise, compare() reports only the changes larger than the noise of both rows.
+Pygame is imported only by the drawing and get_meta().
+
+Cases:
+    newton_pendulum - NewtonPendulum with N balls, variant 'spatial_hash' uses pymunk spatial hash instead of the bbtree
+    coupled_oscillator - CoupledOscillatorModel with N fixed points, variants are the constraint types
+                         'vertical-horizontal' (rod-spring, spring-spring, rod-rod, spring-rod)
+    loaded_rope - LoadedRopeModel with N base points
+
+Results are saved in json file: {'meta': {...versions...}, 'results': [row per case, variant and size]},
+compare() finds the rows of the results which are worse than the rows of the stored baseline by more than tolerance.
+
+Usage:
+    python benchmarks.py --sizes 10 100 1000 --output results.json --baseline baseline.json
+'''
+
+
+SIZES = (10, 100, 1000, 10000)
+COUPLED_OSCILLATOR_VARIANTS = ('rod-spring', 'spring-spring', 'rod-rod', 'spring-rod')
+#Direction of every metric: 1 - higher value is worse, -1 - lower value is worse
+METRICS = {'construct_s': 1, 'steps_per_s': -1, 'draw_ms': 1, 'peak_memory_mb': 1}
+SCREEN_SIZE = (1600, 900)
+
+
+def build_newton_pendulum(size: int, variant = None):
+    #Balls radius is reduced with the size, so the balls always fit the screen
+    wsinit = WindowSpaceInitializer(*SCREEN_SIZE, 200, 60, headless = True)
+    wsinit.initialize()
+    left, right = (50, 100), (SCREEN_SIZE[0] - 50, 100)
+    ball_radius = (right[0] - left[0]) / (2 * (size - 1))
+    model = NewtonPendulum(wsinit.space, wsinit.get_screen(), size, 300, left, right, 40, 60, ball_radius,
+                           use_spatial_hash = variant == 'spatial_hash')
+    model.create_model()
+    return wsinit.space, model
+
+
+def build_coupled_oscillator(size: int, variant = 'rod-spring'):
+    vertical_constr_type, horizontal_constr_type = variant.split('-')
+    wsinit = WindowSpaceInitializer(*SCREEN_SIZE, 100, 60, headless = True)
+    wsinit.initialize()
+    wsinit.get_screen()
+    left, right = (50, 100), (SCREEN_SIZE[0] - 50, 100)
+    model = CoupledOscillatorModel(wsinit, left, right, size, vert_rest_len = 200, vert_stiffness = 50, vert_damping = 1,
+                                   hor_rest_len = (right[0] - left[0]) / (size - 1), hor_stiffness = 10, hor_damping = 5,
+                                   vertical_constr_type = vertical_constr_type, horizontal_constr_type = horizontal_constr_type)
+    model.set_styles(fp_radius = 2, mp_radius = 3, vert_line_width = 1)
+    model.create_model()
+    return wsinit.space, model
+
+
+def build_loaded_rope(size: int, variant = None):
+    #Mass and stiffness of one base point and one base spring are the same as in the default model with 20 points,
+    #otherwise the rope with large size is too stiff for dt and the simulation diverges
+    space = pm.Space()
+    space.gravity = (0, 100)
+    import pygame as pg
+    model = LoadedRopeModel(space, pg.Surface(SCREEN_SIZE), base_points_number = size, base_rope_mass = 0.4 * size,
+                            base_rope_stiffness = 140 / size, x_right_coord = SCREEN_SIZE[0] - 30,
+                            static_edges_radius = 4, moving_points_radius = 2)
+    model.create_model()
+    return space, model
+
+
+CASES = {'newton_pendulum': (build_newton_pendulum, (None, 'spatial_hash')),
+         'coupled_oscillator': (build_coupled_oscillator, COUPLED_OSCILLATOR_VARIANTS),
+         'loaded_rope': (build_loaded_rope, (None,))}
+
+
+def benchmark_case(name: str, size: int, variant = None, dt = 1 / 60, min_time = 0.2, draw_repeats = 5,
+                   steps_for_memory = 10, repeats = 5) -> dict:
+    build = CASES[name][0]
+    construct_times, step_rates, draw_times, peak_memories = [], [], [], []
+
+    #Timing passes without tracemalloc (it slows down the python code) and without the garbage collector (as timeit)
+    #Warm-up build is not measured (the first build imports pygame for the surface and fills the caches)
+    build(size, variant)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            space, model = build(size, variant)
+            construct_times.append(time.perf_counter() - start)
+
+            steps_num, elapsed, start = 0, 0.0, time.perf_counter()
+            while elapsed < min_time:
+                space.step(dt)
+                steps_num += 1
+                elapsed = time.perf_counter() - start
+            step_rates.append(steps_num / elapsed)
+
+            #At least draw_repeats calls, small models are drawn until min_time / 4 is reached
+            model.draw()
+            draws_num, elapsed, start = 0, 0.0, time.perf_counter()
+            while draws_num < draw_repeats or elapsed < min_time / 4:
+                model.draw()
+                draws_num += 1
+                elapsed = time.perf_counter() - start
+            draw_times.append(elapsed / draws_num * 1e3)
+            del space, model
+            gc.collect()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    #Memory passes
+    for _ in range(repeats):
+        tracemalloc.start()
+        try:
+            space, model = build(size, variant)
+            for _ in range(steps_for_memory):
+                space.step(dt)
+            peak_memories.append(tracemalloc.get_traced_memory()[1] / 2 ** 20)
+        finally:
+            tracemalloc.stop()
+        del space, model
+
+    row = {'model': name, 'variant': variant, 'size': size, 'repeats': repeats, 'construct_s': min(construct_times),
+           'steps_per_s': max(step_rates), 'draw_ms': min(draw_times), 'peak_memory_mb': float(np.median(peak_memories))}
+    #Noise of every metric: relative spread of the repeats around the median, compare() doesn't report smaller changes
+    for metric, values in (('construct_s', construct_times), ('steps_per_s', step_rates), ('draw_ms', draw_times),
+                           ('peak_memory_mb', peak_memories)):
+        median = float(np.median(values))
+        row[f'{metric}_noise'] = (max(values) - min(values)) / median if median > 0 else 0.0
+    return row
+
+
+def get_meta(dt: float) -> dict:
+    import pygame as pg
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'pymunk': pm.version,
+            'chipmunk': pm.chipmunk_version, 'pygame': pg.version.ver, 'numpy': np.__version__, 'dt': dt,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_benchmarks(sizes = SIZES, models = tuple(CASES.keys()), dt = 1 / 60, min_time = 0.2, draw_repeats = 5,
+                   verbose = True, repeats = 5) -> dict:
+    results = []
+    for name in models:
+        for variant in CASES[name][1]:
+            for size in sizes:
+                row = benchmark_case(name, size, variant, dt, min_time, draw_repeats, repeats = repeats)
+                results.append(row)
+                if verbose:
+                    print(format_row(row), flush = True)
+    return {'meta': get_meta(dt), 'results': results}
+
+
+def get_case_name(row: dict) -> str:
+    return row['model'] if row['variant'] is None else f"{row['model']}[{row['variant']}]"
+
+
+def format_row(row: dict) -> str:
+    return (f"{get_case_name(row):>34} N={row['size']:<6} construct {row['construct_s']:8.4f} s  {row['steps_per_s']:10.1f} steps/s  "
+            f"draw {row['draw_ms']:8.3f} ms  peak {row['peak_memory_mb']:8.2f} MB")
+
+
+def save_results(results: dict, path: str):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent = 2)
+
+
+def load_results(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(results: dict, baseline: dict, tolerance = 0.2) -> list:
+    #Rows of results which are worse than the same (model, variant, size) rows of baseline by more than tolerance
+    #(relative change) and by more than the noise of the metric in both rows (spread of the repeats).
+    #Every regression is a dict: model, variant, size, metric, baseline, current, change.
+    baseline_rows = {(row['model'], row['variant'], row['size']): row for row in baseline['results']}
+    regressions = []
+    for row in results['results']:
+        base_row = baseline_rows.get((row['model'], row['variant'], row['size']))
+        if base_row is None:
+            continue
+        for metric, direction in METRICS.items():
+            if not base_row.get(metric):
+                continue
+            change = (row[metric] - base_row[metric]) / base_row[metric]
+            noise = max(row.get(f'{metric}_noise', 0.0), base_row.get(f'{metric}_noise', 0.0))
+            if direction * change > max(tolerance, noise):
+                regressions.append({'model': row['model'], 'variant': row['variant'], 'size': row['size'], 'metric': metric,
+                                    'baseline': base_row[metric], 'current': row[metric], 'change': change})
+    return regressions
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmarks of the models across sizes')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = list(SIZES))
+    parser.add_argument('--models', nargs = '+', choices = list(CASES.keys()), default = list(CASES.keys()))
+    parser.add_argument('--dt', type = float, default = 1 / 60)
+    parser.add_argument('--min-time', type = float, default = 0.2)
+    parser.add_argument('--repeats', type = int, default = 5, help = 'repeats of every measurement, the best one is saved')
+    parser.add_argument('--output', default = 'benchmark_results.json')
+    parser.add_argument('--baseline', default = None)
+    parser.add_argument('--tolerance', type = float, default = 0.2)
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(args.sizes, args.models, args.dt, args.min_time, repeats = args.repeats)
+    save_results(benchmark_results, args.output)
+    if args.baseline is not None:
+        found_regressions = compare(benchmark_results, load_results(args.baseline), args.tolerance)
+        for regression in found_regressions:
+            print(f"REGRESSION {get_case_name(regression)} N={regression['size']} {regression['metric']}: "
+                  f"{regression['baseline']:.4g} -> {regression['current']:.4g} ({regression['change']:+.0%})")
+        raise SystemExit(1 if found_regressions else 0)
@@ -0,0 +1,167 @@
+import json
+import struct
+
+import numpy as np
+import pymunk as pm
+from model_state import BodiesState
+
+
+'''
+Binary checkpoints of the whole pymunk space.
+
+A checkpoint stores the state of every body of the space (position, velocity, angle, angular velocity, mass and moment),
+the parameters of every constraint (max_force, error_bias, max_bias and the parameters of its type, for example
+rest_length, stiffness and damping of DampedSpring or distance of PinJoint) and the space parameters (gravity, damping,
+iterations). It is restored into the same space (or into a space built by the same code) without rebuilding objects:
+the bodies are written in one bulk call of BodiesState, constraints are updated in place.
+
+File format (version 1, little-endian):
+    magic b'PMCHKPT\0' | uint32 version | uint32 header length | header (utf-8 json) | arrays
+Header describes the arrays (name, dtype, shape, offset from the start of the arrays block), every array starts at
+8-byte aligned offset. Header also keeps sim_time, user metadata and the fingerprint of the space (body types and
+constraint types in the order of space.bodies and space.constraints), restore checks it before changing anything.
+
+Collision arbiters and accumulated impulses of the solver aren't stored, so the first steps after restore can differ
+from the original run at the level of the solver error.
+'''
+
+
+MAGIC, VERSION = b'PMCHKPT\0', 1
+PREFIX = struct.Struct('<8sII')
+#Type specific parameters of the constraints
+CONSTRAINT_PARAMETERS = {'DampedSpring': ('rest_length', 'stiffness', 'damping'),
+                         'PinJoint': ('distance',),
+                         'SlideJoint': ('min', 'max'),
+                         'DampedRotarySpring': ('rest_angle', 'stiffness', 'damping'),
+                         'RotaryLimitJoint': ('min', 'max'),
+                         'RatchetJoint': ('angle', 'phase', 'ratchet'),
+                         'GearJoint': ('phase', 'ratio'),
+                         'SimpleMotor': ('rate',)}
+COMMON_PARAMETERS = ('max_force', 'error_bias', 'max_bias')
+BODY_TYPES = {pm.Body.DYNAMIC: 0, pm.Body.KINEMATIC: 1, pm.Body.STATIC: 2}
+
+
+def align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+class Checkpoint:
+    def __init__(self, header: dict, arrays: dict):
+        self.header, self.arrays = header, arrays
+
+
+    @property
+    def sim_time(self) -> float:
+        return self.header['sim_time']
+
+
+    @property
+    def metadata(self) -> dict:
+        return self.header['metadata']
+
+
+    @classmethod
+    def capture(cls, space: pm.Space, sim_time = 0.0, metadata = None):
+        #Checkpoint of the current state of the space
+        bodies, constraints = list(space.bodies), list(space.constraints)
+        state = BodiesState(space, bodies).get_state()
+        type_names = sorted({type(constr).__name__ for constr in constraints})
+        arrays = {'positions': state['positions'], 'velocities': state['velocities'], 'angles': state['angles'],
+                  'angular_velocities': state['angular_velocities'],
+                  'masses': np.array([body.mass for body in bodies], dtype = np.float64),
+                  'moments': np.array([body.moment for body in bodies], dtype = np.float64),
+                  'body_types': np.array([BODY_TYPES[body.body_type] for body in bodies], dtype = np.uint8),
+                  'constraint_types': np.array([type_names.index(type(constr).__name__) for constr in constraints], dtype = np.uint8),
+                  'constraints_common': np.array([[getattr(constr, name) for name in COMMON_PARAMETERS] for constr in constraints],
+                                                 dtype = np.float64).reshape(-1, len(COMMON_PARAMETERS))}
+        for type_name in type_names:
+            names = CONSTRAINT_PARAMETERS.get(type_name, ())
+            arrays[f'constraints_{type_name}'] = np.array([[getattr(constr, name) for name in names] for constr in constraints
+                                                           if type(constr).__name__ == type_name],
+                                                          dtype = np.float64).reshape(-1, len(names))
+        header = {'version': VERSION, 'sim_time': float(sim_time), 'metadata': {} if metadata is None else metadata,
+                  'space': {'gravity': tuple(space.gravity), 'damping': space.damping, 'iterations': space.iterations},
+                  'constraint_type_names': type_names}
+        return cls(header, arrays)
+
+
+    def to_bytes(self) -> bytes:
+        arrays_description, chunks, offset = [], [], 0
+        for name, array in self.arrays.items():
+            array = np.ascontiguousarray(array, dtype = array.dtype.newbyteorder('<'))
+            arrays_description.append({'name': name, 'dtype': array.dtype.str, 'shape': array.shape, 'offset': offset})
+            chunks.append(array.tobytes() + b'\0' * (align(array.nbytes) - array.nbytes))
+            offset += align(array.nbytes)
+        header = json.dumps({**self.header, 'arrays': arrays_description}).encode('utf-8')
+        header += b' ' * (align(PREFIX.size + len(header)) - PREFIX.size - len(header))
+        return PREFIX.pack(MAGIC, VERSION, len(header)) + header + b''.join(chunks)
+
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        if len(data) < PREFIX.size:
+            raise ValueError('Data is too short for a checkpoint')
+        magic, version, header_size = PREFIX.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('Data is not a checkpoint')
+        if version > VERSION:
+            raise ValueError(f'Checkpoint version {version} is newer than the supported version {VERSION}')
+        header = json.loads(bytes(data[PREFIX.size:PREFIX.size + header_size]).decode('utf-8'))
+        start, arrays = PREFIX.size + header_size, {}
+        for description in header.pop('arrays'):
+            dtype, shape = np.dtype(description['dtype']), tuple(description['shape'])
+            count = int(np.prod(shape))
+            arrays[description['name']] = np.frombuffer(data, dtype, count, start + description['offset']).reshape(shape)
+        return cls(header, arrays)
+
+
+    def save(self, path: str):
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+
+    def check_space(self, space: pm.Space, bodies: list, constraints: list):
+        #Comparing the fingerprint of the checkpoint with the space
+        if len(bodies) != len(self.arrays['positions']) or len(constraints) != len(self.arrays['constraint_types']):
+            raise ValueError('Checkpoint was taken from a space with other number of bodies or constraints')
+        body_types = np.array([BODY_TYPES[body.body_type] for body in bodies], dtype = np.uint8)
+        type_names = self.header['constraint_type_names']
+        constraint_types = [type_names[i] for i in self.arrays['constraint_types'].tolist()]
+        if (not np.array_equal(body_types, self.arrays['body_types']) or
+                constraint_types != [type(constr).__name__ for constr in constraints]):
+            raise ValueError('Checkpoint was taken from a space with other types of bodies or constraints')
+
+
+    def restore(self, space: pm.Space, restore_parameters = True) -> float:
+        #Writing the checkpoint into the space, returns sim_time of the checkpoint.
+        #With restore_parameters = False only the bodies state is restored (masses and constraints are left unchanged).
+        bodies, constraints = list(space.bodies), list(space.constraints)
+        self.check_space(space, bodies, constraints)
+        arrays = self.arrays
+        BodiesState(space, bodies).set_state(arrays['positions'], arrays['velocities'], arrays['angles'],
+                                             arrays['angular_velocities'])
+        if (arrays['body_types'] == BODY_TYPES[pm.Body.STATIC]).any():
+            space.reindex_static()
+        if restore_parameters:
+            self.__restore_parameters(space, bodies, constraints)
+        return self.sim_time
+
+
+    def __restore_parameters(self, space: pm.Space, bodies: list, constraints: list):
+        arrays, parameters = self.arrays, self.header['space']
+        space.gravity, space.damping, space.iterations = tuple(parameters['gravity']), parameters['damping'], parameters['iterations']
+        for body, mass, moment, body_type in zip(bodies, arrays['masses'].tolist(), arrays['moments'].tolist(),
+                                                 arrays['body_types'].tolist()):
+            if body_type == BODY_TYPES[pm.Body.DYNAMIC] and (body.mass != mass or body.moment != moment):
+                body.mass, body.moment = mass, moment
+        type_rows = {name: iter(arrays[f'constraints_{name}'].tolist()) for name in self.header['constraint_type_names']}
+        for constr, common in zip(constraints, arrays['constraints_common'].tolist()):
+            type_name = type(constr).__name__
+            for name, value in zip(COMMON_PARAMETERS + CONSTRAINT_PARAMETERS.get(type_name, ()), common + next(type_rows[type_name])):
+                setattr(constr, name, value)
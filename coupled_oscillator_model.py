@@ -1,6 +1,15 @@
-import pygame as pg
 import pymunk as pm
 import numpy as np
+import copy
+import math
+import time
+from model_state import BodiesState
+from model_builder import add_objects
+from batched_renderer import draw_chain, draw_segments, stamp_nodes, DirtyRectRenderer
+from loop_policy import FixedTimestepPolicy
+from frame_profiler import FrameProfiler
+from checkpoint import Checkpoint
+from quiescence import RestDetector
 
 
 '''
@@ -30,22 +39,34 @@ Parameters of the model:
 
 class WindowSpaceInitializer:
     #Initialization of Pygame and Pymunk libraries, creating pygame window and pymunk space
-    def __init__(self, wind_width: int, wind_length: int, gravity: float, fps: int, resizable = False):
+    def __init__(self, wind_width: int, wind_length: int, gravity: float, fps: int, resizable = False, headless = False):
         self.wind_width, self.wind_length = wind_width, wind_length
         self.gravity, self.fps = gravity if isinstance(gravity, (int, float, tuple)) else 100, fps 
         self.screen, self.clock, self.space = None, None, None 
-        self.resizable = resizable
+        self.resizable, self.headless = resizable, headless
      
 
     def initialize(self):
-        #Initialization of the window and space 
-        pg.init() 
-        self.screen = pg.display.set_mode((self.wind_width, self.wind_length), pg.RESIZABLE if self.resizable else 0)
-        self.clock = pg.time.Clock()
+        #Initialization of the window and space.
+        #In headless mode no display, no clock and no surface are created (pygame isn't imported), the off-screen
+        #surface is created by get_screen() when something is drawn.
+        if not self.headless:
+            import pygame as pg
+            pg.init() 
+            self.screen = pg.display.set_mode((self.wind_width, self.wind_length), pg.RESIZABLE if self.resizable else 0)
+            self.clock = pg.time.Clock()
         self.space = pm.Space()
         self.space.gravity = self.gravity if isinstance(self.gravity, tuple) else (0, self.gravity)
 
 
+    def get_screen(self) -> 'pg.Surface':
+        #Screen surface, in headless mode the off-screen surface is created at the first call
+        if self.screen is None and self.headless:
+            import pygame as pg
+            self.screen = pg.Surface((self.wind_width, self.wind_length))
+        return self.screen
+
+
 class CoupledOscillatorModel:
     '''
     Future updates:
@@ -66,6 +87,10 @@ class CoupledOscillatorModel:
     '''
     
     
+    #Collision categories of the moving and fixed points, picking queries only the moving points category
+    MOVING_POINTS_CATEGORY, FIXED_POINTS_CATEGORY = 0b1, 0b10
+
+
     def set_moving_point_parameters(self, moving_point_mass = 1, moving_point_moment = 1):
         self.__setattr__('moving_point_mass', moving_point_mass)
         self.__setattr__('moving_point_moment', moving_point_moment) 
@@ -102,17 +127,14 @@ class CoupledOscillatorModel:
         self.set_styles()
         self.__objects_shapes = {'fixed_points_shapes': [],'moving_points_shapes': [], 
                                  'vertical_constr': [], 'horizontal_constr': [],}
+        self.__bodies_state = None
 
     
-    def __add_object_to_space(self, *objects):
-        for obj in objects:
-            self.space.add(obj)
-    
-    
     def __create_fixed_point(self, x_coord, y_coord) -> pm.Body:
         fixed_point = pm.Body(body_type = pm.Body.STATIC)
         fixed_point.position = (x_coord, y_coord)
         fixed_point_shape = pm.Circle(fixed_point, self.fixed_points_radius)
+        fixed_point_shape.filter = pm.ShapeFilter(categories = self.FIXED_POINTS_CATEGORY)
         self.__objects_shapes['fixed_points_shapes'].append(fixed_point_shape)
         return fixed_point
     
@@ -136,12 +158,16 @@ class CoupledOscillatorModel:
     
 
     def get_initial_point_coords(self): return self.initial_points_coords
+
+
+    def get_objects_shapes(self): return self.__objects_shapes
         
 
     def __create_moving_point(self, x_coord, y_coord, moving_point_radius):
         moving_point = pm.Body(self.moving_point_mass, self.moving_point_moment, body_type = pm.Body.DYNAMIC)
         moving_point.position = (x_coord, y_coord)
         moving_point_shape = pm.Circle(moving_point, moving_point_radius)
+        moving_point_shape.filter = pm.ShapeFilter(categories = self.MOVING_POINTS_CATEGORY)
         self.__objects_shapes['moving_points_shapes'].append(moving_point_shape)
         return moving_point
 
@@ -157,40 +183,90 @@ class CoupledOscillatorModel:
     
 
     def create_model(self):
-        for x_coord in iter(np.linspace(self.left_fixed_edge_coords[0], self.right_fixed_edge_coords[0], self.fixed_points_num)):
-            fixed_point = self.__create_fixed_point(x_coord, self.left_fixed_edge_coords[1])
-            moving_point = self.__create_moving_point(x_coord, self.left_fixed_edge_coords[1] + self.vert_rest_len, self.mov_points_radius)
-            self.initial_points_coords.append((x_coord, self.left_fixed_edge_coords[1] + self.vert_rest_len))
+        #Coordinates of all points are computed first, all objects are added to the space with one space.add call
+        y_coord, moving_y_coord = self.left_fixed_edge_coords[1], self.left_fixed_edge_coords[1] + self.vert_rest_len
+        bodies, constraints = [], []
+        for i, x_coord in enumerate(self.get_fixed_points_coords()[:, 0].tolist()):
+            fixed_point = self.__create_fixed_point(x_coord, y_coord)
+            moving_point = self.__create_moving_point(x_coord, moving_y_coord, self.mov_points_radius)
+            self.initial_points_coords.append((x_coord, moving_y_coord))
             vertical_constr = self.__create_constraint(fixed_point, moving_point, constr_type = self.vertical_constr_type, constr_direction = 'vertical')    
-            self.__add_object_to_space(fixed_point, self.__objects_shapes['fixed_points_shapes'][-1], moving_point,
-                              self.__objects_shapes['moving_points_shapes'][-1], vertical_constr) 
+            bodies.extend((fixed_point, moving_point))
+            constraints.append(vertical_constr)
             
-            if x_coord > self.left_fixed_edge_coords[0]:
+            if i > 0:
                 horizontal_constr = self.__create_constraint(self.__objects_shapes['moving_points_shapes'][-2].body, moving_point, 
                                                              self.horizontal_constr_type, constr_direction = 'horizontal')
-                self.__add_object_to_space(horizontal_constr)
+                constraints.append(horizontal_constr)
+        
+        add_objects(self.space, bodies, self.__objects_shapes['fixed_points_shapes'] + self.__objects_shapes['moving_points_shapes'],
+                    constraints)
+        self.__bodies_state = BodiesState(self.space, [shape.body for shape in self.__objects_shapes['moving_points_shapes']])
+
+
+    def clone(self, space = None, offset = (0, 0)):
+        #Copy of the built model shifted by offset in the same space (space = None) or in another space,
+        #the copy is built from the parameters of the model and gets its current state
+        model = copy.copy(self)
+        model.space = self.space if space is None else space
+        model.left_fixed_edge_coords = (self.left_fixed_edge_coords[0] + offset[0], self.left_fixed_edge_coords[1] + offset[1])
+        model.right_fixed_edge_coords = (self.right_fixed_edge_coords[0] + offset[0], self.right_fixed_edge_coords[1] + offset[1])
+        model.__objects_shapes = {'fixed_points_shapes': [],'moving_points_shapes': [], 'vertical_constr': [], 'horizontal_constr': []}
+        model.initial_points_coords = []
+        model.create_model()
+        state = self.get_state()
+        model.set_state(state['positions'] + offset, state['velocities'], state['angles'], state['angular_velocities'])
+        return model
+
+
+    def get_state(self) -> dict:
+        #Returns (N, 2) arrays of positions and velocities and (N,) arrays of angles and angular velocities of the moving points
+        return self.__bodies_state.get_state()
+
+
+    def set_state(self, positions = None, velocities = None, angles = None, angular_velocities = None):
+        #Setting the state of all moving points in one bulk call, None values are left unchanged
+        self.__bodies_state.set_state(positions, velocities, angles, angular_velocities)
             
     
-    def draw(self):
+    def get_fixed_points_coords(self) -> np.ndarray:
+        #(N, 2) array of the fixed points coordinates computed from the model parameters
+        x_coords = np.linspace(self.left_fixed_edge_coords[0], self.right_fixed_edge_coords[0], self.fixed_points_num)
+        return np.stack((x_coords, np.full(self.fixed_points_num, self.left_fixed_edge_coords[1])), axis = 1)
+
+
+    def draw_state(self, positions):
+        #Drawing the model from (N, 2) array of moving points positions (for example recorded), pymunk objects aren't used.
+        #Horizontal constraints are one polyline, points are stamped with cached sprites.
+        self.draw_static()
+        self.draw_dynamic(positions)
+
+
+    def draw_static(self, surface = None):
+        #Drawing the fixed points (on the screen or on the cached background surface)
+        stamp_nodes(self.screen if surface is None else surface, self.get_fixed_points_coords(), self.fixed_points_radius,
+                    self.fixed_points_color)
+
+
+    def draw_dynamic(self, positions = None) -> list:
+        #Drawing the constraints and the moving points, returns the list of their bounding rectangles (for DirtyRectRenderer)
         vert_color = (0,0,0) if self.vertical_constr_type == 'rod' else (0,0,90)
         hor_color = (0,0,0) if self.horizontal_constr_type == 'rod' else (0,0,90)
-        for i in iter(range(self.fixed_points_num)):
-            pg.draw.circle(self.screen, self.fixed_points_color, self.__objects_shapes['fixed_points_shapes'][i].body.position, self.fixed_points_radius) 
-            pg.draw.line(self.screen, vert_color, self.__objects_shapes['vertical_constr'][i].a.position, 
-                        self.__objects_shapes['vertical_constr'][i].b.position, self.vert_line_width)
-            pg.draw.circle(self.screen, self.mov_points_color, self.__objects_shapes['moving_points_shapes'][i].body.position, self.mov_points_radius)
+        positions = self.get_state()['positions'] if positions is None else np.asarray(positions, dtype = np.float64)
+        rects = draw_segments(self.screen, self.get_fixed_points_coords(), positions, vert_color, self.vert_line_width, True)
+        rects += stamp_nodes(self.screen, positions, self.mov_points_radius, self.mov_points_color, return_rects = True)
+        rects += draw_chain(self.screen, positions, hor_color, self.hor_line_width, True)
+        return rects
 
-        for hor_constr in iter(self.__objects_shapes['horizontal_constr']):
-            pg.draw.line(self.screen, hor_color, hor_constr.a.position, hor_constr.b.position, self.hor_line_width)
+
+    def draw(self):
+        self.draw_state(self.get_state()['positions'])
 
 
     def get_clicked_point(self, mouse_pos: tuple) -> pm.Circle:
-        check_dist = lambda d: d < 0  
-        bool_list = [check_dist(obj_shape.point_query(mouse_pos)[2]) 
-                     for obj_shape in self.__objects_shapes['moving_points_shapes']] 
-        if all(map(lambda bool_input: not bool_input, bool_list)):
-            return None
-        return self.__objects_shapes['moving_points_shapes'][bool_list.index(True)]        
+        #Moving point under the mouse or None, search goes through the spatial index of pymunk space
+        query_info = self.space.point_query_nearest(mouse_pos, 0, pm.ShapeFilter(mask = self.MOVING_POINTS_CATEGORY))
+        return None if query_info is None else query_info.shape
     
 
     def change_point_position(self, point: pm.Body, start_mouse_pos: tuple, cur_mouse_pos: tuple):
@@ -201,22 +277,190 @@ class CoupledOscillatorModel:
 
     
     def restart_model(self):
-        self.set_points_coords(self.get_initial_point_coords())
-        for point_shape in iter(self.__objects_shapes['moving_points_shapes']): 
-            point_shape.body.velocity = pm.Vec2d(0, 0)    
+        self.set_state(positions = self.get_initial_point_coords(), velocities = np.zeros((self.fixed_points_num, 2)))
                 
 
 
 class GameLoop:
-    def __init__(self, windowspaceinit: WindowSpaceInitializer, model):
+    def __init__(self, windowspaceinit: WindowSpaceInitializer, model, engine = None, policy = None, profiler = None,
+                 stability = None, rest_detector = None, dirty_rects = False, telemetry = None):
+        #engine is any object with step(dt) method (pymunk space by default), 
+        #for example mass_spring_engine.MassSpringEngine built from the same space.
+        #policy is loop_policy.FixedTimestepPolicy for play(), without it the space is stepped by 1 / fps once per frame.
+        #profiler is frame_profiler.FrameProfiler, it measures events, step, draw, display and wait phases of play() frames
+        #(F3 key toggles its overlay).
+        #F5 / F9 keys in play() save / restore the in-memory checkpoint of the space.
+        #stability is stability.StabilityEstimator of the space: it chooses the physics rate of the policy (a policy is
+        #created if it isn't given), the substeps of run() and space.iterations, and it is re-evaluated in play() frames.
+        #rest_detector is quiescence.RestDetector (True - detector of all dynamic bodies of the space): play() doesn't
+        #step and redraw the resting model until mouse or key events, run() and run_until() stop when the model comes to rest.
+        #With dirty_rects = True the static geometry is cached (model.draw_static) and play() updates only the changed
+        #rectangles of model.draw_dynamic (batched_renderer.DirtyRectRenderer).
+        #telemetry is telemetry_server.ModelTelemetry, it gets the state after the steps of run() and play() frames.
+        #step_wall_time is the wall time spent in the steps of the engine (measured in play() and in run() with telemetry
+        #or render_callback).
         self.wsinit, self.model = windowspaceinit, model
+        self.engine = windowspaceinit.space if engine is None else engine
+        self.policy, self.profiler, self.stability = policy, profiler, stability
+        self.rest_detector = RestDetector(windowspaceinit.space) if rest_detector is True else rest_detector
+        self.renderer, self.telemetry = None, telemetry
+        if telemetry is not None and self.engine is not windowspaceinit.space:
+            telemetry.sync = self.engine.sync_to_space
+        if dirty_rects:
+            self.renderer = DirtyRectRenderer(windowspaceinit.screen, model.draw_static, model.draw_dynamic)
+        self.sim_time, self.steps_done, self.step_wall_time = 0.0, 0, 0.0
+        self.quick_checkpoint = None
+        if stability is not None:
+            if self.policy is None:
+                self.policy = FixedTimestepPolicy(physics_rate = windowspaceinit.fps)
+            stability.configure(self.policy, self.policy.time_scale / windowspaceinit.fps)
+
+
+    def step(self, dt = None):
+        #One step of the simulation, dt = 1 / fps by default
+        dt = 1 / self.wsinit.fps if dt is None else dt
+        self.engine.step(dt)
+        self.sim_time += dt
+        self.steps_done += 1
+
+
+    def get_model_positions(self):
+        if self.engine is not self.wsinit.space:
+            self.engine.sync_to_space()
+        return self.model.get_state()['positions']
+
+
+    def draw_frame(self, positions = None) -> list:
+        #Drawing the model on the screen surface without the display update, returns the changed rectangles of the screen.
+        #positions (for example interpolated by the policy) are drawn with model.draw_state
+        if self.engine is not self.wsinit.space:
+            self.engine.sync_to_space()
+        screen = self.get_screen()
+        if self.renderer is not None:
+            return self.renderer.render(positions)
+        screen.fill((255,255,255))
+        if positions is None:
+            self.model.draw()
+        else:
+            self.model.draw_state(positions)
+        return [screen.get_rect()]
+
+
+    def get_screen(self) -> 'pg.Surface':
+        #Screen of the window, in headless mode the off-screen surface is created at the first drawing
+        #and it is given to the model and the renderer built without it
+        screen = self.wsinit.get_screen()
+        if self.model.screen is None:
+            self.model.screen = screen
+        if self.renderer is not None and self.renderer.screen is None:
+            self.renderer.screen = screen
+        return screen
+
+
+    def render(self, positions = None):
+        #Drawing the model on the screen (on the off-screen surface in headless mode)
+        rects = self.draw_frame(positions)
+        if not self.wsinit.headless:
+            import pygame as pg
+            pg.display.update(rects)
+
+
+    def is_at_rest(self) -> bool:
+        #Updating the rest detector at the current simulated time
+        if self.rest_detector is None:
+            return False
+        if self.rest_detector.is_due(self.sim_time) and self.engine is not self.wsinit.space:
+            self.engine.sync_to_space()
+        return self.rest_detector.update(self.sim_time)
+
+
+    def run(self, n_steps: int, dt = None, render_callback = None, render_every = 1):
+        #Fixed-step run of n_steps steps without clock throttling.
+        #render_callback(gameloop) is called every render_every steps, it can call gameloop.render().
+        #With the stability estimator every step of dt is split into the stable substeps.
+        #With the rest detector the run stops early when the model comes to rest.
+        if render_every < 1:
+            raise ValueError(f'render_every must be at least 1 step, got {render_every!r}')
+        dt = 1 / self.wsinit.fps if dt is None else dt
+        space_step = self.engine.step
+        substeps = 1 if self.stability is None else self.stability.get_substeps(dt)
+        if substeps > 1:
+            engine_step = self.engine.step
+            def space_step(dt):
+                for _ in range(substeps):
+                    engine_step(dt / substeps)
+        start_time, start_steps = self.sim_time, self.steps_done
+        check_rest, telemetry = self.rest_detector is not None, self.telemetry
+        if telemetry is not None or render_callback is not None:
+            #Only the steps are timed (step_time of the telemetry frames), not the callbacks
+            untimed_step = space_step
+            def space_step(dt):
+                step_start = time.perf_counter()
+                untimed_step(dt)
+                self.step_wall_time += time.perf_counter() - step_start
+        if check_rest:
+            self.rest_detector.wake()
+        for i in range(1, n_steps + 1):
+            space_step(dt)
+            if check_rest or telemetry is not None or (render_callback is not None and i % render_every == 0):
+                self.sim_time, self.steps_done = start_time + i * dt, start_steps + i
+            if render_callback is not None and i % render_every == 0:
+                render_callback(self)
+            if telemetry is not None:
+                telemetry.update(self.sim_time, self.steps_done, self.step_wall_time)
+            if check_rest and self.is_at_rest():
+                return self.sim_time
+        self.sim_time, self.steps_done = start_time + n_steps * dt, start_steps + n_steps
+        return self.sim_time
+
+
+    def run_until(self, t: float, dt = None, render_callback = None, render_every = 1):
+        #Fixed-step run until simulated time reaches t
+        dt = 1 / self.wsinit.fps if dt is None else dt
+        n_steps = max(0, math.ceil((t - self.sim_time) / dt - 1e-9))
+        return self.run(n_steps, dt, render_callback, render_every)
+
+
+    def save_checkpoint(self, path = None) -> Checkpoint:
+        #Checkpoint of the space with the simulated time and the steps of the loop, it is saved in path if path is given
+        if self.engine is not self.wsinit.space:
+            self.engine.sync_to_space()
+        checkpoint = Checkpoint.capture(self.wsinit.space, self.sim_time, {'steps_done': self.steps_done})
+        if path is not None:
+            checkpoint.save(path)
+        return checkpoint
+
+
+    def load_checkpoint(self, checkpoint):
+        #Restoring Checkpoint (or checkpoint file) into the space of the loop, objects of the model aren't rebuilt
+        if self.engine is not self.wsinit.space:
+            raise RuntimeError('Checkpoints are restored into the pymunk space, the state of the engine is not restored')
+        checkpoint = Checkpoint.load(checkpoint) if isinstance(checkpoint, str) else checkpoint
+        self.sim_time = checkpoint.restore(self.wsinit.space)
+        self.steps_done = checkpoint.metadata.get('steps_done', self.steps_done)
+        if self.policy is not None:
+            self.policy.reset(self.sim_time)
+        if self.rest_detector is not None:
+            self.rest_detector.wake()
 
 
     def play(self):
+        if self.wsinit.headless:
+            raise RuntimeError('play() needs a display, use run() or run_until() in headless mode')
+        import pygame as pg
         running, is_dragging, nearest_point, start_mouse_pos = True, False, None, None
+        profiler = self.profiler
+        mark = profiler.mark if profiler is not None else (lambda phase: None)
         while running:
+            if profiler is not None: profiler.begin_frame()
             for event in pg.event.get():
                 if event.type == pg.QUIT: pg.quit()
+
+                if self.rest_detector is not None and event.type in (pg.MOUSEBUTTONDOWN, pg.KEYDOWN, pg.VIDEORESIZE,
+                                                                     pg.WINDOWEXPOSED):
+                    self.rest_detector.wake()
+
+                if self.renderer is not None and event.type in (pg.VIDEORESIZE, pg.WINDOWEXPOSED): self.renderer.invalidate()
             
                 if event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
                     start_mouse_pos, is_dragging  = pg.mouse.get_pos(), True
@@ -227,35 +471,68 @@ class GameLoop:
 
                 if event.type == pg.KEYDOWN and event.key == pg.K_0: self.model.restart_model()
 
+                if event.type == pg.KEYDOWN and event.key == pg.K_F3 and profiler is not None: 
+                    profiler.show_overlay = not profiler.show_overlay
+
+                if event.type == pg.KEYDOWN and event.key == pg.K_F5: self.quick_checkpoint = self.save_checkpoint()
+
+                if event.type == pg.KEYDOWN and event.key == pg.K_F9 and self.quick_checkpoint is not None:
+                    self.load_checkpoint(self.quick_checkpoint)
+
             if is_dragging:
                 if nearest_point is not None:
                     mouse_pos = pg.mouse.get_pos()
                     self.model.change_point_position(nearest_point.body, start_mouse_pos, mouse_pos)
 
-            self.wsinit.screen.fill((255,255,255))
-            self.model.draw()
-            self.wsinit.space.step(1 / self.wsinit.fps)
-            pg.display.update()
-            wsinit.clock.tick(self.wsinit.fps)
-
-
-            '''
-            wsinit.screen.fill((255,255,255))
-            couple_osc_model.draw()
-            wsinit.space.step(1 / wsinit.fps)
-            pg.display.update()
-            wsinit.clock.tick(wsinit.fps)
-            '''
-
-wsinit = WindowSpaceInitializer(900, 600, 100, 60, True)
-wsinit.initialize() 
-couple_osc_model = CoupledOscillatorModel(wsinit, (100, 100), (700, 100), 5, hor_rest_len = 100, hor_damping = 5, hor_stiffness = 10, vert_rest_len = 200)
-couple_osc_model.create_model()
-gameloop = GameLoop(wsinit, couple_osc_model)
-gameloop.play()
-
-
-
-
-
-        
+            if self.stability is not None and self.stability.update():
+                self.stability.configure(self.policy, self.policy.time_scale / self.wsinit.fps)
+                if self.rest_detector is not None: self.rest_detector.wake()
+
+            mark('events')
+
+            if self.rest_detector is not None and not is_dragging and self.rest_detector.is_at_rest:
+                #The resting model isn't stepped and redrawn, the last frame stays on the screen
+                self.wsinit.clock.tick(self.wsinit.fps)
+                mark('wait')
+                if profiler is not None: profiler.end_frame()
+                continue
+            if self.policy is None:
+                rects = self.draw_frame()
+                mark('draw')
+                step_start = time.perf_counter()
+                self.step()
+                self.step_wall_time += time.perf_counter() - step_start
+                mark('step')
+            else:
+                step_start = time.perf_counter()
+                n_steps = self.policy.run(self.engine, self.wsinit.clock.get_time() / 1000, 
+                                          self.get_model_positions if self.policy.interpolate else None)
+                self.step_wall_time += time.perf_counter() - step_start
+                self.sim_time += n_steps * self.policy.physics_dt
+                self.steps_done += n_steps
+                mark('step')
+                rects = self.draw_frame(self.policy.interpolated_positions() if self.policy.interpolate else None)
+                mark('draw')
+            if not is_dragging: self.is_at_rest()
+            if self.telemetry is not None: self.telemetry.update(self.sim_time, self.steps_done, self.step_wall_time)
+            if profiler is not None and profiler.show_overlay:
+                #The overlay isn't a part of the cached background, the next frame is redrawn completely
+                profiler.draw_overlay(self.wsinit.screen)
+                rects = [self.wsinit.screen.get_rect()]
+                if self.renderer is not None: self.renderer.invalidate()
+            pg.display.update(rects)
+            mark('display')
+            self.wsinit.clock.tick(self.wsinit.fps)
+            mark('wait')
+            if profiler is not None: profiler.end_frame()
+
+
+
+if __name__ == '__main__':
+    wsinit = WindowSpaceInitializer(900, 600, 100, 60, True)
+    wsinit.initialize() 
+    couple_osc_model = CoupledOscillatorModel(wsinit, (100, 100), (700, 100), 5, hor_rest_len = 100, hor_damping = 5, hor_stiffness = 10, vert_rest_len = 200)
+    couple_osc_model.create_model()
+    gameloop = GameLoop(wsinit, couple_osc_model, policy = FixedTimestepPolicy(physics_rate = wsinit.fps, interpolate = True),
+                        profiler = FrameProfiler(show_overlay = False), rest_detector = True, dirty_rects = True)
+    gameloop.play()
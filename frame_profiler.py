@@ -0,0 +1,96 @@
+import csv
+import time
+
+import numpy as np
+
+
+'''
+Per-phase frame profiling.
+Durations of the phases of every frame are measured with time.perf_counter_ns and stored in a fixed-size
+ring buffer (the last capacity frames), so profiling of a long run uses constant memory.
+
+Usage in a loop:
+    profiler.begin_frame()
+    ...handling events...
+    profiler.mark('events')
+    ...space.step...
+    profiler.mark('step')
+    ...
+    profiler.end_frame()
+
+mark(phase) adds the time since the previous mark (or begin_frame) to the phase.
+'''
+
+
+class FrameProfiler:
+    PHASES = ('events', 'step', 'draw', 'display', 'wait')
+
+    def __init__(self, capacity = 600, phases = PHASES, show_overlay = True):
+        self.capacity, self.phases = capacity, tuple(phases)
+        self.__phase_index = {phase: i for i, phase in enumerate(self.phases)}
+        self.durations = np.zeros((capacity, len(self.phases)), dtype = np.int64)
+        self.frames_num, self.show_overlay = 0, show_overlay
+        self.__current = np.zeros(len(self.phases), dtype = np.int64)
+        self.__last_mark, self.__font = None, None
+
+
+    def begin_frame(self):
+        self.__current[:] = 0
+        self.__last_mark = time.perf_counter_ns()
+
+
+    def mark(self, phase: str):
+        now = time.perf_counter_ns()
+        self.__current[self.__phase_index[phase]] += now - self.__last_mark
+        self.__last_mark = now
+
+
+    def end_frame(self):
+        self.durations[self.frames_num % self.capacity] = self.__current
+        self.frames_num += 1
+
+
+    def get_durations(self) -> np.ndarray:
+        #(frames, phases) array of the stored frames in the order of recording, in nanoseconds
+        if self.frames_num <= self.capacity:
+            return self.durations[:self.frames_num].copy()
+        start = self.frames_num % self.capacity
+        return np.concatenate((self.durations[start:], self.durations[:start]))
+
+
+    def percentiles(self, q = (50, 95, 99)) -> dict:
+        #Rolling percentiles of every phase and of the whole frame in milliseconds: {phase: array of len(q)}
+        durations = self.get_durations()
+        if len(durations) == 0:
+            return {}
+        values = np.percentile(durations / 1e6, q, axis = 0)
+        result = {phase: values[:, i] for i, phase in enumerate(self.phases)}
+        result['frame'] = np.percentile(durations.sum(axis = 1) / 1e6, q)
+        return result
+
+
+    def draw_overlay(self, surface: 'pg.Surface', position = (10, 10), color = (200, 0, 0)):
+        #Drawing p50 / p95 / p99 of every phase in the corner of the surface
+        if not self.show_overlay:
+            return
+        import pygame as pg
+        if self.__font is None:
+            if not pg.font.get_init():
+                pg.font.init()
+            self.__font = pg.font.SysFont('monospace', 14)
+        lines = [f'{phase:>8}: ' + ' / '.join(f'{value:6.2f}' for value in values) + ' ms'
+                 for phase, values in self.percentiles().items()]
+        for i, line in enumerate(['   phase:   p50 /    p95 /    p99'] + lines):
+            surface.blit(self.__font.render(line, True, color), (position[0], position[1] + 16 * i))
+
+
+    def dump(self, path: str):
+        #Saving the stored frames: csv file (durations in nanoseconds) or .npy file
+        durations = self.get_durations()
+        if path.endswith('.csv'):
+            with open(path, 'w', newline = '') as file:
+                writer = csv.writer(file)
+                writer.writerow(self.phases)
+                writer.writerows(durations.tolist())
+        else:
+            np.save(path, durations)
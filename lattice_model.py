@@ -0,0 +1,225 @@
+import numpy as np
+import pymunk as pm
+from coupled_oscillator_model import WindowSpaceInitializer, GameLoop
+from model_state import BodiesState
+from model_builder import add_objects
+from batched_renderer import draw_chain, draw_segments, stamp_nodes
+
+
+'''
+2D lattice (cloth / membrane) extension of the coupled oscillator model: R x C nodes joined by links.
+
+Parameters of the model:
+1. Nodes:
+    1.1 Coordinates of the top left node, number of rows and columns, distance between neighbouring nodes
+    1.2 Node mass, node moment, radius, colors
+    1.3 Pinned rows (indices) and pinned boundaries ('left', 'right', 'top', 'bottom') - these nodes are static
+
+2. Link families (every family can be disabled with None):
+    2.1 structural - links to the right and lower neighbours
+    2.2 shear - diagonal links of every cell
+    2.3 bend - links to the second right and second lower neighbours
+    Every family has its own type ('spring' or 'rod'), stiffness and damping, rest length of the link is
+    the distance between its nodes in the initial layout.
+
+All nodes and links are computed as index arrays first and added to the space with one space.add call (add_objects).
+Rows of get_state() arrays are the nodes in row-major order (pinned nodes are included).
+'''
+
+
+class CoupledLatticeModel:
+    LINK_FAMILIES = ('structural', 'shear', 'bend')
+    #Collision categories of the moving and fixed nodes, picking queries only the moving nodes category
+    MOVING_POINTS_CATEGORY, FIXED_POINTS_CATEGORY = 0b1, 0b10
+    #Nodes of the lattice don't collide with each other (the same non-zero group)
+    NODES_GROUP = 1
+
+    def __init__(self, windowspaceinit: WindowSpaceInitializer, top_left_coords, rows = 10, cols = 10, spacing = 20,
+                 pinned_rows = (0,), pinned_boundaries = (), node_mass = 1, node_moment = 1,
+                 structural = None, shear = None, bend = None):
+        if rows < 2 or cols < 2:
+            raise ValueError('Lattice must have at least 2 rows and 2 columns')
+        self.space, self.screen = windowspaceinit.space, windowspaceinit.screen
+        self.top_left_coords, self.rows, self.cols, self.spacing = top_left_coords, rows, cols, spacing
+        self.nodes_num = rows * cols
+        self.pinned_rows, self.pinned_boundaries = tuple(pinned_rows), tuple(pinned_boundaries)
+        self.node_mass, self.node_moment = node_mass, node_moment
+        self.link_parameters = {}
+        #structural links are always present (default parameters if None), shear and bend links only if their parameters are set
+        for family, parameters in (('structural', {} if structural is None else structural), ('shear', shear), ('bend', bend)):
+            if parameters is None:
+                self.link_parameters[family] = None
+            else:
+                self.set_link_parameters(family, **parameters)
+        self.set_styles()
+        self.initial_points_coords = self.__compute_layout()
+        self.pinned = self.__compute_pinned()
+        self.links = {family: self.__compute_links(family) for family in self.LINK_FAMILIES}
+        self.__objects_shapes = {'nodes_shapes': [], 'links': {family: [] for family in self.LINK_FAMILIES}}
+        self.__bodies_state = None
+
+
+    def set_link_parameters(self, family: str, link_type = 'spring', stiffness = 100, damping = 1):
+        if family not in self.LINK_FAMILIES:
+            raise ValueError(f'family must be one of {self.LINK_FAMILIES}')
+        if link_type not in ('spring', 'rod'):
+            raise ValueError("link_type must be 'spring' or 'rod'")
+        self.link_parameters[family] = {'link_type': link_type, 'stiffness': stiffness, 'damping': damping}
+
+
+    def set_styles(self, fp_color = (0,0,0), mp_color = (0,0,0), node_radius = 3, link_colors = None, link_width = 1,
+                   draw_families = ('structural',), draw_nodes = True):
+        #draw_families - link families which are drawn (shear and bend links aren't drawn by default)
+        self.fixed_points_color, self.mov_points_color, self.node_radius = fp_color, mp_color, node_radius
+        self.link_colors = {'structural': (0,0,90), 'shear': (120,120,160), 'bend': (160,120,120)}
+        self.link_colors.update(link_colors if link_colors is not None else {})
+        self.link_width, self.draw_families, self.draw_nodes = link_width, tuple(draw_families), draw_nodes
+
+
+    def __compute_layout(self) -> np.ndarray:
+        #(R * C, 2) array of the initial nodes coordinates in row-major order
+        cols_grid, rows_grid = np.meshgrid(np.arange(self.cols), np.arange(self.rows))
+        return np.stack((self.top_left_coords[0] + cols_grid.ravel() * self.spacing,
+                         self.top_left_coords[1] + rows_grid.ravel() * self.spacing), axis = 1).astype(np.float64)
+
+
+    def __compute_pinned(self) -> np.ndarray:
+        pinned = np.zeros((self.rows, self.cols), dtype = bool)
+        pinned[[row for row in self.pinned_rows if -self.rows <= row < self.rows], :] = True
+        boundaries = {'left': (slice(None), 0), 'right': (slice(None), -1), 'top': (0, slice(None)), 'bottom': (-1, slice(None))}
+        for boundary in self.pinned_boundaries:
+            pinned[boundaries[boundary]] = True
+        return pinned.ravel()
+
+
+    def __compute_links(self, family: str) -> np.ndarray:
+        #(L, 2) array of the node indices joined by the links of the family, links between two pinned nodes are skipped
+        if self.link_parameters[family] is None:
+            return np.empty((0, 2), dtype = np.intp)
+        index = np.arange(self.nodes_num).reshape(self.rows, self.cols)
+        if family == 'structural':
+            pairs = [(index[:, :-1], index[:, 1:]), (index[:-1, :], index[1:, :])]
+        elif family == 'shear':
+            pairs = [(index[:-1, :-1], index[1:, 1:]), (index[:-1, 1:], index[1:, :-1])]
+        else:
+            pairs = [(index[:, :-2], index[:, 2:]), (index[:-2, :], index[2:, :])]
+        links = np.concatenate([np.stack((a.ravel(), b.ravel()), axis = 1) for a, b in pairs])
+        return links[~(self.pinned[links[:, 0]] & self.pinned[links[:, 1]])]
+
+
+    def create_model(self):
+        coords = self.initial_points_coords
+        bodies = []
+        for (x_coord, y_coord), is_pinned in zip(coords.tolist(), self.pinned.tolist()):
+            body = pm.Body(body_type = pm.Body.STATIC) if is_pinned else pm.Body(self.node_mass, self.node_moment, body_type = pm.Body.DYNAMIC)
+            body.position = (x_coord, y_coord)
+            bodies.append(body)
+
+        moving_filter = pm.ShapeFilter(group = self.NODES_GROUP, categories = self.MOVING_POINTS_CATEGORY)
+        fixed_filter = pm.ShapeFilter(group = self.NODES_GROUP, categories = self.FIXED_POINTS_CATEGORY)
+        shapes = [pm.Circle(body, self.node_radius) for body in bodies]
+        for shape, is_pinned in zip(shapes, self.pinned.tolist()):
+            shape.filter = fixed_filter if is_pinned else moving_filter
+
+        constraints = []
+        for family, links in self.links.items():
+            if len(links) == 0:
+                continue
+            parameters = self.link_parameters[family]
+            d = coords[links[:, 1]] - coords[links[:, 0]]
+            rest_lengths = np.sqrt(np.einsum('ij,ij->i', d, d)).tolist()
+            if parameters['link_type'] == 'rod':
+                family_constraints = [pm.constraints.PinJoint(bodies[a], bodies[b], (0,0), (0,0)) for a, b in links.tolist()]
+            else:
+                family_constraints = [pm.constraints.DampedSpring(bodies[a], bodies[b], (0,0), (0,0), rest_len,
+                                                                  parameters['stiffness'], parameters['damping'])
+                                      for (a, b), rest_len in zip(links.tolist(), rest_lengths)]
+            self.__objects_shapes['links'][family] = family_constraints
+            constraints.extend(family_constraints)
+
+        add_objects(self.space, bodies, shapes, constraints)
+        self.__objects_shapes['nodes_shapes'] = shapes
+        self.__bodies_state = BodiesState(self.space, bodies)
+
+
+    def get_objects_shapes(self):
+        return self.__objects_shapes
+
+
+    def get_initial_point_coords(self):
+        return self.initial_points_coords
+
+
+    def get_state(self) -> dict:
+        #Returns (R * C, 2) arrays of positions and velocities and (R * C,) arrays of angles and angular velocities of the nodes
+        return self.__bodies_state.get_state()
+
+
+    def set_state(self, positions = None, velocities = None, angles = None, angular_velocities = None):
+        #Setting the state of all nodes in one bulk call, None values are left unchanged
+        self.__bodies_state.set_state(positions, velocities, angles, angular_velocities)
+
+
+    def draw_state(self, positions):
+        #Drawing the lattice from (R * C, 2) array of nodes positions: structural links are one polyline per row and
+        #per column, other families are drawn as segments, nodes are stamped with cached sprites
+        self.draw_static()
+        self.draw_dynamic(positions)
+
+
+    def draw_static(self, surface = None):
+        #Drawing the pinned nodes (on the screen or on the cached background surface)
+        if self.draw_nodes:
+            stamp_nodes(self.screen if surface is None else surface, self.initial_points_coords[self.pinned],
+                        self.node_radius, self.fixed_points_color)
+
+
+    def draw_dynamic(self, positions = None) -> list:
+        #Drawing the links and the moving nodes, returns the list of their bounding rectangles (for DirtyRectRenderer)
+        positions = self.get_state()['positions'] if positions is None else np.asarray(positions, dtype = np.float64)
+        grid = positions.reshape(self.rows, self.cols, 2)
+        rects = []
+        for family in self.draw_families:
+            color = self.link_colors[family]
+            if family == 'structural' and self.link_parameters['structural'] is not None:
+                for row in grid:
+                    rects += draw_chain(self.screen, row, color, self.link_width, True)
+                for col in grid.transpose(1, 0, 2):
+                    rects += draw_chain(self.screen, col, color, self.link_width, True)
+            elif len(self.links[family]) > 0:
+                rects += draw_segments(self.screen, positions[self.links[family][:, 0]], positions[self.links[family][:, 1]],
+                                       color, self.link_width, True)
+        if self.draw_nodes:
+            rects += stamp_nodes(self.screen, positions[~self.pinned], self.node_radius, self.mov_points_color,
+                                 return_rects = True)
+        return rects
+
+
+    def draw(self):
+        self.draw_state(self.get_state()['positions'])
+
+
+    def get_clicked_point(self, mouse_pos: tuple) -> pm.Circle:
+        #Moving node under the mouse or None, search goes through the spatial index of pymunk space
+        query_info = self.space.point_query_nearest(mouse_pos, 0, pm.ShapeFilter(mask = self.MOVING_POINTS_CATEGORY))
+        return None if query_info is None else query_info.shape
+
+
+    def change_point_position(self, point: pm.Body, start_mouse_pos: tuple, cur_mouse_pos: tuple):
+        displacement = cur_mouse_pos[0] - start_mouse_pos[0], cur_mouse_pos[1] - start_mouse_pos[1]
+        point.position = point.position[0] + displacement[0], point.position[1] + displacement[1]
+
+
+    def restart_model(self):
+        self.set_state(positions = self.initial_points_coords, velocities = np.zeros((self.nodes_num, 2)))
+
+
+
+if __name__ == '__main__':
+    wsinit = WindowSpaceInitializer(900, 700, 100, 60, True)
+    wsinit.initialize()
+    lattice_model = CoupledLatticeModel(wsinit, (150, 60), 30, 40, 15, pinned_rows = (0,),
+                                        structural = {'stiffness': 400, 'damping': 2}, shear = {'stiffness': 100, 'damping': 1})
+    lattice_model.create_model()
+    gameloop = GameLoop(wsinit, lattice_model, dirty_rects = True)
+    gameloop.play()
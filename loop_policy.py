@@ -0,0 +1,77 @@
+import numpy as np
+
+
+'''
+Fixed-timestep loop policy with decoupled physics and render rates.
+
+Every rendered frame adds its wall time (multiplied by time_scale) to the accumulator and the physics
+is stepped with the fixed dt = 1 / physics_rate as many times as the accumulator allows.
+    1. physics_rate doesn't depend on the display rate: stiff models can use small dt and slow displays
+       don't change the physics.
+    2. max_substeps caps the number of steps per frame, the time which didn't fit is dropped
+       (no spiral of death when one frame is slower than the physics it has to catch up).
+    3. With interpolate = True the positions before and after the last substep are kept and
+       interpolated_positions() returns the state between them at the accumulator remainder,
+       it can be drawn with model.draw_state(positions).
+'''
+
+
+class FixedTimestepPolicy:
+    def __init__(self, physics_rate = 60, max_substeps = 8, interpolate = False, time_scale = 1.0):
+        self.physics_rate, self.physics_dt = physics_rate, 1 / physics_rate
+        self.max_substeps, self.interpolate, self.time_scale = max_substeps, interpolate, time_scale
+        self.accumulator, self.dropped_time, self.sim_time = 0.0, 0.0, 0.0
+        self.previous_positions, self.current_positions = None, None
+
+
+    def set_physics_rate(self, physics_rate):
+        self.physics_rate, self.physics_dt = physics_rate, 1 / physics_rate
+
+
+    def reset(self, sim_time = None):
+        #Dropping the accumulated time and the interpolation states (after the state of the model was replaced)
+        self.accumulator, self.previous_positions, self.current_positions = 0.0, None, None
+        if sim_time is not None:
+            self.sim_time = sim_time
+
+
+    def advance(self, frame_time: float) -> int:
+        #Adding frame_time seconds of wall time, returns the number of physics steps for this frame
+        self.accumulator += frame_time * self.time_scale
+        n_steps = int(self.accumulator / self.physics_dt)
+        if n_steps > self.max_substeps:
+            self.dropped_time += (n_steps - self.max_substeps) * self.physics_dt
+            n_steps = self.max_substeps
+            self.accumulator = n_steps * self.physics_dt + self.accumulator % self.physics_dt
+        self.accumulator -= n_steps * self.physics_dt
+        self.sim_time += n_steps * self.physics_dt
+        return n_steps
+
+
+    @property
+    def alpha(self) -> float:
+        #Fraction of the physics step which is left in the accumulator, used for the interpolation
+        return self.accumulator / self.physics_dt
+
+
+    def run(self, stepper, frame_time: float, get_positions = None) -> int:
+        #Stepping stepper (pymunk space or any object with step(dt)) for one rendered frame.
+        #get_positions() returns (N, 2) array of the model positions, it is needed only for the interpolation.
+        n_steps = self.advance(frame_time)
+        interpolate = self.interpolate and get_positions is not None
+        for i in range(n_steps):
+            if interpolate and i == n_steps - 1:
+                self.previous_positions = get_positions()
+            stepper.step(self.physics_dt)
+        if interpolate and (n_steps > 0 or self.current_positions is None):
+            self.current_positions = get_positions()
+            if self.previous_positions is None:
+                self.previous_positions = self.current_positions
+        return n_steps
+
+
+    def interpolated_positions(self) -> np.ndarray:
+        if self.current_positions is None:
+            return None
+        alpha = min(self.alpha, 1.0)
+        return self.previous_positions + alpha * (self.current_positions - self.previous_positions)
@@ -0,0 +1,143 @@
+import numpy as np
+import pymunk as pm
+from model_state import BodiesState, get_space_layout
+
+
+'''
+Vectorized NumPy engine for point-mass / spring networks (ropes, spring chains).
+It is an alternative to pymunk.Space.step for models which consist only of point masses and DampedSprings:
+one step is a few NumPy kernels over all springs instead of the general rigid body solver.
+
+Model description:
+    1. positions - (N, 2) initial coordinates of the nodes
+    2. masses - (N,) masses of the nodes
+    3. springs - (S, 2) indices of the nodes joined by springs
+    4. rest_lengths, stiffness, damping - (S,) or (M, S) parameters of the springs
+    5. pinned - (N,) bool mask of the fixed nodes
+    6. copies - number M of independent copies stepped together (batch dimension)
+
+State arrays positions and velocities have shape (M, N, 2).
+Spring force is the same as in pymunk.DampedSpring: f = stiffness * (length - rest_length) + damping * relative normal velocity.
+'''
+
+
+class MassSpringEngine:
+    SCHEMES = ('semi_implicit_euler', 'velocity_verlet')
+
+    def __init__(self, positions, masses, springs, rest_lengths, stiffness, damping, pinned = None, gravity = (0, 0),
+                 velocities = None, copies = 1, scheme = 'semi_implicit_euler', velocity_damping = 1.0):
+        if scheme not in self.SCHEMES:
+            raise ValueError(f'scheme must be one of {self.SCHEMES}')
+        positions = np.asarray(positions, dtype = np.float64)
+        self.nodes_num, self.copies, self.scheme = positions.shape[-2], copies, scheme
+        self.positions = np.array(np.broadcast_to(positions, (copies, self.nodes_num, 2)))
+        self.velocities = (np.zeros_like(self.positions) if velocities is None else
+                           np.array(np.broadcast_to(np.asarray(velocities, dtype = np.float64), self.positions.shape)))
+        self.pinned = np.zeros(self.nodes_num, dtype = bool) if pinned is None else np.asarray(pinned, dtype = bool)
+        self.velocities[:, self.pinned] = 0
+
+        self.springs = np.asarray(springs, dtype = np.intp).reshape(-1, 2)
+        self.springs_num = len(self.springs)
+        springs_shape = (copies, self.springs_num)
+        self.rest_lengths = np.array(np.broadcast_to(np.asarray(rest_lengths, dtype = np.float64), springs_shape))
+        self.stiffness = np.array(np.broadcast_to(np.asarray(stiffness, dtype = np.float64), springs_shape))
+        self.damping = np.array(np.broadcast_to(np.asarray(damping, dtype = np.float64), springs_shape))
+
+        masses = np.asarray(masses, dtype = np.float64)
+        #Pinned nodes don't move, their inverse mass is 0
+        self.inv_masses = np.where(self.pinned | ~np.isfinite(masses), 0.0, 1 / np.where(masses > 0, masses, 1))
+        self.gravity = np.where(self.pinned[:, None], 0.0, np.asarray(gravity, dtype = np.float64))
+        self.velocity_damping = velocity_damping
+        self.sim_time = 0.0
+
+        #Flat indices of the spring ends in the (M * N) array of nodes, used for scatter-add of forces with np.bincount
+        offsets = (np.arange(copies) * self.nodes_num)[:, None]
+        self.__scatter_index = np.concatenate(((self.springs[:, 0] + offsets).ravel(), (self.springs[:, 1] + offsets).ravel()))
+        self.__accelerations = None
+        self.__bodies_state, self.__dynamic_nodes = None, None
+
+
+    @classmethod
+    def from_space(cls, space: pm.Space, copies = 1, scheme = 'semi_implicit_euler'):
+        #Building the engine from pymunk space, which consists only of point masses and DampedSprings
+        layout = get_space_layout(space)
+        if len(layout['rods']) > 0 or len(layout['other_constraints']) > 0:
+            raise ValueError('MassSpringEngine supports only DampedSpring constraints')
+        if any(tuple(s.anchor_a) != (0, 0) or tuple(s.anchor_b) != (0, 0) for s in layout['springs']):
+            raise ValueError('Springs must be attached to the centers of the bodies')
+        bodies_state = BodiesState(space, layout['bodies'])
+        state = bodies_state.get_state()
+        pinned = np.array([body.body_type != pm.Body.DYNAMIC for body in layout['bodies']], dtype = bool)
+        engine = cls(state['positions'], layout['masses'], layout['springs_ends'], layout['rest_lengths'], layout['stiffness'],
+                     layout['damping'], pinned, tuple(space.gravity), state['velocities'], copies, scheme, space.damping)
+        engine.__bodies_state = BodiesState(space, [body for body, pin in zip(layout['bodies'], pinned) if not pin])
+        engine.__dynamic_nodes = np.flatnonzero(~pinned)
+        return engine
+
+
+    def sync_to_space(self, copy_index = 0):
+        #Writing positions and velocities of one copy back to the bodies of the space (for drawing by the model classes)
+        if self.__bodies_state is None:
+            raise ValueError('The engine was not created from a pymunk space')
+        self.__bodies_state.set_state(self.positions[copy_index, self.__dynamic_nodes],
+                                      self.velocities[copy_index, self.__dynamic_nodes])
+
+
+    def set_state(self, positions = None, velocities = None):
+        #Setting (M, N, 2) or (N, 2) state arrays, None values are left unchanged
+        if positions is not None:
+            self.positions[...] = positions
+        if velocities is not None:
+            self.velocities[...] = velocities
+            self.velocities[:, self.pinned] = 0
+        self.__accelerations = None
+
+
+    def get_spring_lengths(self) -> np.ndarray:
+        #Current lengths of all springs, shape (M, S)
+        d = self.positions[:, self.springs[:, 1]] - self.positions[:, self.springs[:, 0]]
+        return np.sqrt(np.einsum('msk,msk->ms', d, d))
+
+
+    def compute_accelerations(self, positions = None, velocities = None) -> np.ndarray:
+        positions = self.positions if positions is None else positions
+        velocities = self.velocities if velocities is None else velocities
+        a_index, b_index = self.springs[:, 0], self.springs[:, 1]
+        d = positions[:, b_index] - positions[:, a_index]
+        lengths = np.sqrt(np.einsum('msk,msk->ms', d, d))
+        directions = d / np.where(lengths > 0, lengths, 1)[..., None]
+        rel_velocities = np.einsum('msk,msk->ms', velocities[:, b_index] - velocities[:, a_index], directions)
+        tension = self.stiffness * (lengths - self.rest_lengths) + self.damping * rel_velocities
+        forces = tension[..., None] * directions
+        #Spring pulls its first end to the second one and the second end to the first one
+        size = self.copies * self.nodes_num
+        fx = np.bincount(self.__scatter_index, np.concatenate((forces[..., 0].ravel(), -forces[..., 0].ravel())), size)
+        fy = np.bincount(self.__scatter_index, np.concatenate((forces[..., 1].ravel(), -forces[..., 1].ravel())), size)
+        accelerations = np.stack((fx, fy), axis = -1).reshape(self.copies, self.nodes_num, 2)
+        accelerations *= self.inv_masses[:, None]
+        accelerations += self.gravity
+        return accelerations
+
+
+    def step(self, dt: float):
+        #One step of the integration with the same signature as pymunk.Space.step
+        damping = self.velocity_damping ** dt
+        if self.scheme == 'semi_implicit_euler':
+            self.velocities *= damping
+            self.velocities += self.compute_accelerations() * dt
+            self.positions += self.velocities * dt
+        else:
+            if self.__accelerations is None:
+                self.__accelerations = self.compute_accelerations()
+            self.velocities *= damping
+            self.velocities += 0.5 * dt * self.__accelerations
+            self.positions += self.velocities * dt
+            self.__accelerations = self.compute_accelerations()
+            self.velocities += 0.5 * dt * self.__accelerations
+        self.sim_time += dt
+
+
+    def run(self, n_steps: int, dt: float):
+        for _ in range(n_steps):
+            self.step(dt)
+        return self.sim_time
@@ -0,0 +1,121 @@
+import numpy as np
+import pymunk as pm
+
+try:
+    import pymunk.batch as pm_batch
+except ImportError:
+    #Old pymunk versions don't have the batch module, bodies are read one by one
+    pm_batch = None
+
+
+'''
+Bulk access to the state of a group of pymunk bodies.
+All of the arrays are contiguous float64 NumPy arrays:
+    positions, velocities - shape (N, 2)
+    angles, angular_velocities - shape (N,)
+
+When pymunk.batch is available one call of get_space_bodies (set_space_bodies) replaces
+N Python attribute round-trips. The batch module iterates over all bodies of the space,
+so the rows of the model bodies are found by body ids and cached while the order of bodies
+in the space doesn't change.
+'''
+
+
+class BodiesState:
+    #Layout of one row of the batch buffer: x, y, angle, vx, vy, angular velocity
+    ROW_SIZE = 6
+
+    def __init__(self, space: pm.Space, bodies: list):
+        self.space, self.bodies = space, list(bodies)
+        self.bodies_num = len(self.bodies)
+        self.__body_ids = np.array([body.id for body in self.bodies], dtype = np.uintp)
+        self.__space_ids, self.__rows = None, None
+        if pm_batch is not None:
+            self.__fields = (pm_batch.BodyFields.BODY_ID | pm_batch.BodyFields.POSITION | pm_batch.BodyFields.ANGLE |
+                             pm_batch.BodyFields.VELOCITY | pm_batch.BodyFields.ANGULAR_VELOCITY)
+            self.__buffer, self.__set_buffer = pm_batch.Buffer(), pm_batch.Buffer()
+
+
+    def __read_space(self) -> np.ndarray:
+        #Reading all bodies of the space in one batch call, returns array of shape (space bodies, 6)
+        self.__buffer.clear()
+        pm_batch.get_space_bodies(self.space, self.__fields, self.__buffer)
+        space_ids = np.frombuffer(self.__buffer.int_buf(), dtype = np.uintp)
+        if self.__space_ids is None or not np.array_equal(space_ids, self.__space_ids):
+            #Order of bodies in the space was changed (or it is the first call), rows are searched again
+            order = np.argsort(space_ids)
+            found = order[np.searchsorted(space_ids, self.__body_ids, sorter = order)]
+            if not np.array_equal(space_ids[found], self.__body_ids):
+                raise ValueError('Not all of the bodies are added to the space')
+            self.__space_ids, self.__rows = space_ids.copy(), found
+        return np.frombuffer(self.__buffer.float_buf(), dtype = np.float64).reshape(-1, self.ROW_SIZE)
+
+
+    def get_state(self) -> dict:
+        #Returns dict with positions, velocities, angles and angular velocities of the bodies
+        if pm_batch is not None and self.bodies_num > 0:
+            rows = self.__read_space()[self.__rows]
+            return {'positions': np.ascontiguousarray(rows[:, 0:2]), 'velocities': np.ascontiguousarray(rows[:, 3:5]),
+                    'angles': np.ascontiguousarray(rows[:, 2]), 'angular_velocities': np.ascontiguousarray(rows[:, 5])}
+
+        return {'positions': np.array([tuple(body.position) for body in self.bodies], dtype = np.float64).reshape(-1, 2),
+                'velocities': np.array([tuple(body.velocity) for body in self.bodies], dtype = np.float64).reshape(-1, 2),
+                'angles': np.array([body.angle for body in self.bodies], dtype = np.float64),
+                'angular_velocities': np.array([body.angular_velocity for body in self.bodies], dtype = np.float64)}
+
+
+    def get_positions(self) -> np.ndarray:
+        if pm_batch is not None and self.bodies_num > 0:
+            return np.ascontiguousarray(self.__read_space()[self.__rows, 0:2])
+        return np.array([tuple(body.position) for body in self.bodies], dtype = np.float64).reshape(-1, 2)
+
+
+    def set_state(self, positions = None, velocities = None, angles = None, angular_velocities = None):
+        #Setting the state of the bodies, None values are left unchanged
+        values = {0: positions, 3: velocities, 2: angles, 5: angular_velocities}
+        if pm_batch is not None and self.bodies_num > 0:
+            data = self.__read_space().copy()
+            for column, value in values.items():
+                if value is None:
+                    continue
+                value = np.asarray(value, dtype = np.float64)
+                if column in (0, 3):
+                    data[self.__rows, column:column + 2] = value.reshape(self.bodies_num, 2)
+                else:
+                    data[self.__rows, column] = value.reshape(self.bodies_num)
+            #Separate buffer: set_float_buf makes the buffer point to the NumPy array memory
+            self.__set_buffer.set_float_buf(data)
+            pm_batch.set_space_bodies(self.space, self.__fields & ~pm_batch.BodyFields.BODY_ID, self.__set_buffer)
+            return
+
+        for i, body in enumerate(self.bodies):
+            if positions is not None: body.position = tuple(positions[i])
+            if velocities is not None: body.velocity = tuple(velocities[i])
+            if angles is not None: body.angle = float(angles[i])
+            if angular_velocities is not None: body.angular_velocity = float(angular_velocities[i])
+
+
+def get_space_layout(space: pm.Space) -> dict:
+    #Description of the space as arrays: all bodies (static too), masses and constraint ends as body indices.
+    #Static bodies have infinite mass. Bodies which are used only by constraints (space.static_body) are included too.
+    bodies = list(space.bodies)
+    for constr in space.constraints:
+        for body in (constr.a, constr.b):
+            if body not in bodies:
+                bodies.append(body)
+    index = {body: i for i, body in enumerate(bodies)}
+    springs = [constr for constr in space.constraints if isinstance(constr, pm.constraints.DampedSpring)]
+    rods = [constr for constr in space.constraints if isinstance(constr, pm.constraints.PinJoint)]
+    return {'bodies': bodies,
+            'masses': np.array([body.mass if body.body_type == pm.Body.DYNAMIC else np.inf for body in bodies], dtype = np.float64),
+            'moments': np.array([body.moment if body.body_type == pm.Body.DYNAMIC else np.inf for body in bodies], dtype = np.float64),
+            'springs': springs,
+            'springs_ends': np.array([(index[s.a], index[s.b]) for s in springs], dtype = np.intp).reshape(-1, 2),
+            'rest_lengths': np.array([s.rest_length for s in springs], dtype = np.float64),
+            'stiffness': np.array([s.stiffness for s in springs], dtype = np.float64),
+            'damping': np.array([s.damping for s in springs], dtype = np.float64),
+            'rods': rods,
+            'rods_ends': np.array([(index[r.a], index[r.b]) for r in rods], dtype = np.intp).reshape(-1, 2),
+            'rods_distances': np.array([r.distance for r in rods], dtype = np.float64),
+            'other_constraints': [constr for constr in space.constraints if not isinstance(constr, (pm.constraints.DampedSpring, 
+                                                                                                     pm.constraints.PinJoint))]}
@@ -0,0 +1,248 @@
+import math
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+from coupled_oscillator_model import WindowSpaceInitializer, CoupledOscillatorModel
+from newton_pendulum import NewtonPendulum
+from loop_policy import FixedTimestepPolicy
+
+
+'''
+Side by side comparison of several model configurations: every scene is stepped in its own worker process,
+one renderer (the main process) tiles the scenes in one window.
+
+A scene is a dict {'builder': function, 'parameters': dict, 'title': str, 'physics_rate': float}, builder(**parameters)
+returns (space, model) of the built model, it must be a module level function (workers are started with 'spawn'),
+physics_rate of the scene (the physics_rate of the runner by default) is optional. The model draws the tile on its screen,
+so the builder creates the surface (WindowSpaceInitializer.get_screen() in headless mode).
+The main process builds every scene once to draw it with model.draw_state(positions) and to know the size of its state,
+the worker builds the same scene and steps its space with FixedTimestepPolicy in real time (multiplied by time_scale).
+
+Positions are published into multiprocessing.shared_memory, one block per scene:
+    float64 [sequence, sim_time, steps_done, positions (N, 2)]
+The block is a seqlock: the worker makes the sequence odd before writing and even after it, the renderer copies
+the positions and retries if the sequence was odd or was changed during the copy, so a frame never mixes two steps.
+If the retries fail (large scenes are written for a long time), the last consistent frame of the scene is drawn again.
+The stepping of N scenes runs on N cores instead of N times slower in one loop, the renderer only copies N arrays per frame.
+
+Usage:
+    with MultiSceneRunner(scenes) as runner:
+        runner.play()
+'''
+
+
+HEADER_SIZE = 3
+
+
+class SceneBuffer:
+    def __init__(self, shape: tuple, name = None):
+        #New shared block for the positions of the given shape (name = None) or the existing block with the name
+        self.shape = tuple(shape)
+        size = (HEADER_SIZE + int(np.prod(self.shape))) * 8
+        self.shm = shared_memory.SharedMemory(name = name, create = name is None, size = size)
+        self.array = np.ndarray((HEADER_SIZE + int(np.prod(self.shape)),), dtype = np.float64, buffer = self.shm.buf)
+        if name is None:
+            self.array[:] = 0.0
+        self.positions = self.array[HEADER_SIZE:].reshape(self.shape)
+        self.last_frame = None
+
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+
+    def write(self, positions: np.ndarray, sim_time: float, steps_done: int):
+        sequence = self.array[0]
+        self.array[0] = sequence + 1
+        self.positions[...] = positions
+        self.array[1], self.array[2] = sim_time, steps_done
+        self.array[0] = sequence + 2
+
+
+    def read(self, retries = 100):
+        #Returns (positions copy, sim_time, steps_done) of one consistent write, the reader yields the CPU to the writer
+        #between the retries. If all retries fail, the last consistent frame is returned.
+        for _ in range(retries):
+            sequence = self.array[0]
+            if sequence % 2 == 0:
+                positions, sim_time, steps_done = self.positions.copy(), float(self.array[1]), int(self.array[2])
+                if self.array[0] == sequence:
+                    self.last_frame = positions, sim_time, steps_done
+                    return self.last_frame
+            time.sleep(0)
+        if self.last_frame is None:
+            raise RuntimeError('Scene buffer is being written too often to be read')
+        return self.last_frame
+
+
+    def close(self, unlink = False):
+        del self.positions, self.array
+        self.last_frame = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def run_scene_worker(builder, parameters: dict, buffer_name: str, shape: tuple, physics_rate: float, time_scale: float,
+                     publish_rate: float, stop_event):
+    #Worker process: building the scene and stepping it in real time until stop_event is set
+    space, model = builder(**parameters)
+    buffer = SceneBuffer(shape, buffer_name)
+    policy = FixedTimestepPolicy(physics_rate = physics_rate, max_substeps = 2 * math.ceil(physics_rate * time_scale / publish_rate),
+                                 time_scale = time_scale)
+    steps_done, publish_dt = 0, 1 / publish_rate
+    buffer.write(model.get_state()['positions'], policy.sim_time, steps_done)
+    last_time = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            now = time.perf_counter()
+            n_steps = policy.run(space, now - last_time)
+            last_time = now
+            if n_steps > 0:
+                steps_done += n_steps
+                buffer.write(model.get_state()['positions'], policy.sim_time, steps_done)
+            time.sleep(max(0.0, publish_dt - (time.perf_counter() - now)))
+    finally:
+        buffer.close()
+
+
+class MultiSceneRunner:
+    def __init__(self, scenes: list, tile_size = (450, 300), columns = None, fps = 60, physics_rate = 60, time_scale = 1.0):
+        if len(scenes) == 0:
+            raise ValueError('At least one scene is needed')
+        self.scenes, self.tile_size, self.fps = list(scenes), tuple(tile_size), fps
+        self.columns = math.ceil(math.sqrt(len(self.scenes))) if columns is None else columns
+        self.rows = math.ceil(len(self.scenes) / self.columns)
+        self.physics_rate, self.time_scale = physics_rate, time_scale
+        self.models, self.buffers, self.workers, self.stop_event = [], [], [], None
+        self.__font = None
+
+
+    def start(self):
+        #Building the scenes for drawing, creating the shared blocks and starting the workers
+        context = mp.get_context('spawn')
+        self.stop_event = context.Event()
+        try:
+            for scene in self.scenes:
+                space, model = scene['builder'](**scene.get('parameters', {}))
+                buffer = SceneBuffer(model.get_state()['positions'].shape)
+                self.buffers.append(buffer)
+                buffer.write(model.get_state()['positions'], 0.0, 0)
+                #The initial frame is the last good frame until the first frame of the worker is read
+                buffer.read()
+                worker = context.Process(target = run_scene_worker, daemon = True,
+                                         args = (scene['builder'], scene.get('parameters', {}), buffer.name, buffer.shape,
+                                                 scene.get('physics_rate', self.physics_rate), self.time_scale, self.fps,
+                                                 self.stop_event))
+                self.models.append(model)
+                self.workers.append(worker)
+            for worker in self.workers:
+                worker.start()
+        except BaseException:
+            #Shared blocks of the built scenes are released if a scene can't be built
+            self.stop()
+            raise
+
+
+    def stop(self, timeout = 5.0):
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for worker in self.workers:
+            if worker.pid is None:
+                continue
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        for buffer in self.buffers:
+            buffer.close(unlink = True)
+        self.models, self.buffers, self.workers, self.stop_event = [], [], [], None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    def read_scenes(self) -> list:
+        #List of (positions, sim_time, steps_done) of the scenes
+        return [buffer.read() for buffer in self.buffers]
+
+
+    def get_window_size(self) -> tuple:
+        return self.columns * self.tile_size[0], self.rows * self.tile_size[1]
+
+
+    def draw(self, screen: 'pg.Surface'):
+        #Drawing the last published state of every scene in its tile of the screen
+        import pygame as pg
+        if self.__font is None:
+            if not pg.font.get_init():
+                pg.font.init()
+            self.__font = pg.font.SysFont('monospace', 14)
+        screen.fill((255,255,255))
+        for i, (scene, model, (positions, sim_time, steps_done)) in enumerate(zip(self.scenes, self.models, self.read_scenes())):
+            model.screen.fill((255,255,255))
+            model.draw_state(positions)
+            tile_position = (i % self.columns) * self.tile_size[0], (i // self.columns) * self.tile_size[1]
+            screen.blit(pg.transform.smoothscale(model.screen, self.tile_size), tile_position)
+            pg.draw.rect(screen, (200,200,200), (*tile_position, *self.tile_size), 1)
+            label = f"{scene.get('title', f'scene {i}')}  t = {sim_time:.2f} s"
+            screen.blit(self.__font.render(label, True, (0,0,0)), (tile_position[0] + 5, tile_position[1] + 5))
+
+
+    def play(self):
+        import pygame as pg
+        pg.init()
+        screen = pg.display.set_mode(self.get_window_size())
+        clock = pg.time.Clock()
+        running = True
+        while running:
+            for event in pg.event.get():
+                if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                    running = False
+            if not running:
+                break
+            self.draw(screen)
+            pg.display.update()
+            clock.tick(self.fps)
+            if not all(worker.is_alive() for worker in self.workers):
+                raise RuntimeError('Worker of a scene has stopped')
+        pg.quit()
+
+
+#Builders of the scenes (module level functions, so the workers can import them)
+def build_coupled_oscillator(window_size = (900, 600), gravity = 100, **parameters):
+    wsinit = WindowSpaceInitializer(*window_size, gravity, 60, headless = True)
+    wsinit.initialize()
+    wsinit.get_screen()
+    model = CoupledOscillatorModel(wsinit, **parameters)
+    model.create_model()
+    return wsinit.space, model
+
+
+def build_newton_pendulum(window_size = (900, 600), gravity = 200, **parameters):
+    wsinit = WindowSpaceInitializer(*window_size, gravity, 60, headless = True)
+    wsinit.initialize()
+    model = NewtonPendulum(wsinit.space, wsinit.get_screen(), **parameters)
+    model.create_model()
+    return wsinit.space, model
+
+
+
+if __name__ == '__main__':
+    oscillator = {'left_fixed_edge_coords': (100, 100), 'right_fixed_edge_coords': (800, 100), 'fixed_points_num': 6,
+                  'hor_rest_len': 100, 'hor_damping': 5, 'vert_rest_len': 200}
+    pendulum = {'constr_num': 7, 'constr_len': 300, 'left_edge_point_coords': (250, 100), 'right_edge_point_coords': (650, 100),
+                'ball_mass': 40, 'ball_moment': 60, 'ball_radius': 33.3333333333}
+    scenes = [{'builder': build_coupled_oscillator, 'parameters': {**oscillator, 'hor_stiffness': stiffness},
+               'title': f'oscillator, k = {stiffness}'} for stiffness in (2, 10, 50)]
+    scenes.append({'builder': build_newton_pendulum, 'parameters': pendulum, 'title': 'Newton pendulum'})
+    with MultiSceneRunner(scenes) as runner:
+        runner.play()
@@ -1,6 +1,8 @@
-import pygame as pg
+import copy
 import pymunk as pm
 import numpy as np
+from model_state import BodiesState
+from model_builder import add_objects
 
 
 '''
@@ -15,20 +17,44 @@ import numpy as np
     2.2 Moment
     2.3 Radius
     2.4 Initial coords
+
+3. Large cradles
+    3.1 rows - number of cradles one under another (row_spacing between the rows of fixed points)
+    3.2 Only neighbouring balls collide: ball i of the row has the category bit i % 4 and its mask has the bits of
+        the balls i - 1 and i + 1 (balls i +- 3, i +- 5, ... have the same bits, but they never reach each other),
+        even and odd rows use different 4 bits, so the balls of neighbouring rows don't collide.
+        Collision pairs which pass the broadphase are rejected by the filter before the narrowphase.
+    3.3 use_spatial_hash - pymunk spatial hash with the cell size 2 * ball_radius instead of the bounding box tree,
+        a ball overlaps a constant number of cells, so the cost of the broadphase grows linearly with the number of balls.
 '''
 
 
 class NewtonPendulum:
-    def get_nearest_ball(self, x_coord: float, y_coord: float):
-        #Method returns the nearest ball shape to the point with coords (x_coord, y_coord)    
-        distances = [pm.Vec2d(x_coord, y_coord).get_distance(ball_shape.body.position) for ball_shape in self.__objects_shapes['balls_shapes']]
-        return self.__objects_shapes['balls_shapes'][distances.index(min(distances))] 
+    #Collision categories of the balls (4 bits of even rows and 4 bits of odd rows) and fixed points,
+    #picking queries the union of the balls categories
+    BALLS_CATEGORIES = tuple(1 << i for i in range(8))
+    BALLS_CATEGORY, FIXED_POINTS_CATEGORY = 0xff, 0x100
+
+    def get_nearest_ball(self, x_coord: float, y_coord: float, max_distance = None):
+        #Method returns the nearest ball shape to the point with coords (x_coord, y_coord) within max_distance
+        #from the ball surface (ball_radius by default, 0 - the point must be inside the ball) or None.
+        #Search goes through the spatial index of pymunk space, so with a bounded max_distance it checks only the balls
+        #near the point. max_distance = math.inf finds the nearest ball at any distance, but it checks all balls (O(N)).
+        max_distance = self.ball_radius if max_distance is None else max_distance
+        query_info = self.space.point_query_nearest((x_coord, y_coord), max_distance,
+                                                    pm.ShapeFilter(mask = self.BALLS_CATEGORY))
+        return None if query_info is None else query_info.shape
 
     
-    def __check_parameters(self, screen: pg.Surface, constr_num, constr_len, left_edge_point_coords, 
-                           right_edge_point_coords, ball_mass, ball_moment, ball_radius):
+    def __check_parameters(self, screen: 'pg.Surface', constr_num, constr_len, left_edge_point_coords, 
+                           right_edge_point_coords, ball_mass, ball_moment, ball_radius, rows, row_spacing):
         output_dict = {}
         try:
+            if isinstance(rows, int) and rows >= 1:
+                output_dict['rows'] = rows
+            else:
+                raise ValueError('rows error')
+
             if isinstance(constr_num, int) and constr_num >= 2:
                 output_dict['constr_num'] = constr_num
             else:
@@ -43,8 +69,9 @@ class NewtonPendulum:
             statement1 = isinstance(left_edge_point_coords, (pm.Vec2d, tuple))
             statement2 = isinstance(right_edge_point_coords, (pm.Vec2d, tuple))
             statement3 = left_edge_point_coords[0] < right_edge_point_coords[0]
-            statement4 = left_edge_point_coords[1] == right_edge_point_coords[1] and 0 < left_edge_point_coords[1] < screen.get_height()                               
-            statement5 = left_edge_point_coords[0] > 0 and right_edge_point_coords[0] < screen.get_width()
+            #Window bounds are checked only if the model has the screen (screen = None in headless runs)
+            statement4 = left_edge_point_coords[1] == right_edge_point_coords[1] and 0 < left_edge_point_coords[1] and (screen is None or left_edge_point_coords[1] < screen.get_height())
+            statement5 = left_edge_point_coords[0] > 0 and (screen is None or right_edge_point_coords[0] < screen.get_width())
             if all((statement1, statement2, statement3, statement4, statement5)):  
                 output_dict['left_edge_point_coords'] = left_edge_point_coords  
                 output_dict['right_edge_point_coords'] = right_edge_point_coords    
@@ -66,18 +93,30 @@ class NewtonPendulum:
                 output_dict['ball_radius'] = ball_radius       
             else:
                 raise ValueError('ball_radius error')
+
+            #row_spacing is computed and checked after constr_len and ball_radius it depends on
+            row_spacing = constr_len + 3 * ball_radius if row_spacing is None else row_spacing
+            if not (isinstance(row_spacing, (int, float)) and row_spacing > 0):
+                raise ValueError('row_spacing error')
+            if screen is not None and left_edge_point_coords[1] + (rows - 1) * row_spacing >= screen.get_height():
+                raise ValueError('Fixed edge points error')
+            output_dict['row_spacing'] = row_spacing
         
     
     
         except ValueError as ve:
-            if str(ve) == 'constr_num error':
+            if str(ve) == 'rows error':
+                print('rows parameter must be integer and >= 1')
+            elif str(ve) == 'row_spacing error':
+                print('row_spacing parameter must be int or float and > 0')
+            elif str(ve) == 'constr_num error':
                 print('constr_num parameter must be integer and >= 2')
             elif str(ve) == 'constr_len error':
                 print('constr_len parameter must be int or float and > 0')
             elif str(ve) == 'Fixed edge points error':
             
                 print('''Edges coords must have type tuple or pymunk.Vec2d, \n its 
-                      x > 0 and y > 0 coords must have values < sizes of Pygame window and \n 
+                      x > 0 and y > 0 coords must have values < sizes of Pygame window (y of the last row too) and \n 
                       y coords of the left and right edges should be the same.''')
             elif str(ve) == 'ball_mass error':
                 print('ball_mass parameter must be float or int and > 0')
@@ -91,10 +130,13 @@ class NewtonPendulum:
            
     
     
-    def __init__(self, space: pm.Space, screen: pg.Surface, constr_num: int, constr_len: float, left_edge_point_coords, 
-                 right_edge_point_coords, ball_mass: float, ball_moment: float, ball_radius: float):
+    def __init__(self, space: pm.Space, screen: 'pg.Surface', constr_num: int, constr_len: float, left_edge_point_coords, 
+                 right_edge_point_coords, ball_mass: float, ball_moment: float, ball_radius: float, rows = 1,
+                 row_spacing = None, use_spatial_hash = False):
+        #constr_num is the number of balls in one row, the rows are numbered from the top (row_spacing is
+        #constr_len + 3 * ball_radius by default), arrays of the model state keep the balls row by row
         verified_parameters = self.__check_parameters(screen, constr_num, constr_len, left_edge_point_coords, right_edge_point_coords, 
-                                               ball_mass, ball_moment, ball_radius)
+                                               ball_mass, ball_moment, ball_radius, rows, row_spacing)
         
         self.space, self.screen = space, screen
         self.constr_num, self.constr_len = verified_parameters['constr_num'], verified_parameters['constr_len']
@@ -102,8 +144,11 @@ class NewtonPendulum:
         self.right_edge_point_coords = verified_parameters['right_edge_point_coords']
         self.ball_mass, self.ball_moment = verified_parameters['ball_mass'], verified_parameters['ball_moment'] 
         self.ball_radius = verified_parameters['ball_radius'] 
+        self.rows, self.row_spacing = verified_parameters['rows'], verified_parameters['row_spacing']
+        self.use_spatial_hash = use_spatial_hash
         self.__objects_shapes = {'fixed_points_shapes': [], 'balls_shapes': [], 'rods': []}
         self.initial_coords = []
+        self.__bodies_state = None
 
     
     def set_balls_initial_coords(self):
@@ -124,35 +169,117 @@ class NewtonPendulum:
         return self.__objects_shapes
     
 
+    def get_state(self) -> dict:
+        #Returns (N, 2) arrays of positions and velocities and (N,) arrays of angles and angular velocities of the balls
+        return self.__bodies_state.get_state()
+
+
+    def set_state(self, positions = None, velocities = None, angles = None, angular_velocities = None):
+        #Setting the state of all balls in one bulk call, None values are left unchanged
+        self.__bodies_state.set_state(positions, velocities, angles, angular_velocities)
+    
+
     def create_model(self, fixed_points_radius = 4):
-        for x_coord in iter(np.linspace(self.left_edge_point_coords[0], self.right_edge_point_coords[0], self.constr_num)):
+        #Coordinates of all points are computed first, all objects are added to the space with one space.add call
+        fixed_coords = self.get_fixed_points_coords().tolist()
+        balls_coords = (self.get_fixed_points_coords() + (0, self.constr_len)).tolist()
+        fixed_filter = pm.ShapeFilter(categories = self.FIXED_POINTS_CATEGORY)
+        bodies = []
+        if self.use_spatial_hash:
+            self.space.use_spatial_hash(2 * self.ball_radius, 10 * len(balls_coords))
+        for i, (fixed_point_coords, ball_coords) in enumerate(zip(fixed_coords, balls_coords)):
             fixed_point = pm.Body(body_type=pm.Body.STATIC)
-            fixed_point.position = (x_coord, self.left_edge_point_coords[1])
+            fixed_point.position = fixed_point_coords
             fixed_point_shape = pm.Circle(fixed_point, fixed_points_radius)
+            fixed_point_shape.filter = fixed_filter
             ball = pm.Body(self.ball_mass, self.ball_moment, body_type = pm.Body.DYNAMIC)
-            ball.position = (x_coord, self.left_edge_point_coords[1] + self.constr_len)
+            ball.position = ball_coords
             ball_shape = pm.Circle(ball, self.ball_radius)
             ball_shape.elasticity, ball_shape.friction = 1, 1
+            ball_shape.filter = self.get_ball_filter(i // self.constr_num, i % self.constr_num)
             rod = pm.constraints.PinJoint(fixed_point, ball, (0,0), (0,0))
-            self.space.add(fixed_point, fixed_point_shape, ball, ball_shape, rod)
+            bodies.extend((fixed_point, ball))
             self.__objects_shapes['fixed_points_shapes'].append(fixed_point_shape)
             self.__objects_shapes['balls_shapes'].append(ball_shape)
             self.__objects_shapes['rods'].append(rod)
 
+        add_objects(self.space, bodies, self.__objects_shapes['fixed_points_shapes'] + self.__objects_shapes['balls_shapes'],
+                    self.__objects_shapes['rods'])
         self.set_balls_initial_coords()
+        self.__bodies_state = BodiesState(self.space, [ball.body for ball in self.__objects_shapes['balls_shapes']])
 
         
+    def get_ball_filter(self, row: int, index: int) -> pm.ShapeFilter:
+        #Filter of the ball with the index in the row: it collides only with the neighbouring balls of the row and fixed points
+        bits = self.BALLS_CATEGORIES[4 * (row % 2):4 * (row % 2) + 4]
+        return pm.ShapeFilter(categories = bits[index % 4],
+                              mask = bits[(index - 1) % 4] | bits[(index + 1) % 4] | self.FIXED_POINTS_CATEGORY)
+
+
     def draw(self, fixed_points_radius = 4, line_width = 3):
-        for i in iter(range(self.constr_num)):
+        import pygame as pg
+        for i in iter(range(self.constr_num * self.rows)):
             pg.draw.circle(self.screen, (0,0,0), self.__objects_shapes['fixed_points_shapes'][i].body.position, fixed_points_radius) 
             pg.draw.line(self.screen, (0,0,0), self.__objects_shapes['rods'][i].a.position, self.__objects_shapes['rods'][i].b.position, line_width)
             pg.draw.circle(self.screen, (0,0,0), self.__objects_shapes['balls_shapes'][i].body.position, self.ball_radius)
 
 
+    def clone(self, space = None, offset = (0, 0), fixed_points_radius = 4):
+        #Copy of the built model shifted by offset in the same space (space = None) or in another space,
+        #the copy is built from the parameters of the model and gets its current state
+        model = copy.copy(self)
+        model.space = self.space if space is None else space
+        model.left_edge_point_coords = (self.left_edge_point_coords[0] + offset[0], self.left_edge_point_coords[1] + offset[1])
+        model.right_edge_point_coords = (self.right_edge_point_coords[0] + offset[0], self.right_edge_point_coords[1] + offset[1])
+        model.__objects_shapes = {'fixed_points_shapes': [], 'balls_shapes': [], 'rods': []}
+        model.initial_coords = []
+        model.create_model(fixed_points_radius)
+        state = self.get_state()
+        model.set_state(state['positions'] + offset, state['velocities'], state['angles'], state['angular_velocities'])
+        return model
+
+
+    def get_fixed_points_coords(self) -> np.ndarray:
+        #(N, 2) array of the fixed points coordinates computed from the model parameters (row by row)
+        x_coords = np.linspace(self.left_edge_point_coords[0], self.right_edge_point_coords[0], self.constr_num)
+        y_coords = self.left_edge_point_coords[1] + self.row_spacing * np.arange(self.rows)
+        return np.stack((np.tile(x_coords, self.rows), np.repeat(y_coords, self.constr_num)), axis = 1)
+
+
+    def draw_state(self, positions, fixed_points_radius = 4, line_width = 3):
+        #Drawing the model from (N, 2) array of balls positions (for example recorded), pymunk objects aren't used
+        self.draw_static(fixed_points_radius = fixed_points_radius)
+        self.draw_dynamic(positions, line_width)
+
+
+    def draw_static(self, surface = None, fixed_points_radius = 4):
+        #Drawing the fixed points (on the screen or on the cached background surface)
+        import pygame as pg
+        surface = self.screen if surface is None else surface
+        for fixed_coords in self.get_fixed_points_coords().tolist():
+            pg.draw.circle(surface, (0,0,0), fixed_coords, fixed_points_radius)
+
+
+    def draw_dynamic(self, positions = None, line_width = 3) -> list:
+        #Drawing the rods and the balls, returns the list of their bounding rectangles (for DirtyRectRenderer)
+        import pygame as pg
+        positions = self.get_state()['positions'] if positions is None else positions
+        rects = []
+        for fixed_coords, ball_coords in zip(self.get_fixed_points_coords().tolist(), np.asarray(positions).tolist()):
+            rects.append(pg.draw.line(self.screen, (0,0,0), fixed_coords, ball_coords, line_width))
+            rects.append(pg.draw.circle(self.screen, (0,0,0), ball_coords, self.ball_radius))
+        return rects
+
+
 
 
 if __name__ == '__main__':
-    FPS = 60
+    import pygame as pg
+    from loop_policy import FixedTimestepPolicy
+    from checkpoint import Checkpoint
+    from quiescence import RestDetector
+    from batched_renderer import DirtyRectRenderer
+    FPS, PHYSICS_RATE = 60, 120
     pg.init()
     screen = pg.display.set_mode((900, 600))
     clock = pg.time.Clock()
@@ -163,18 +290,34 @@ if __name__ == '__main__':
     seven_joint_model = NewtonPendulum(space, screen, 7, 300, (250, 100), (650, 100), 40, 60, 33.3333333333)
     seven_joint_model.create_model()
     is_dragging, start_mouse_pos, start_body_pos = False, None, None
+    policy = FixedTimestepPolicy(physics_rate = PHYSICS_RATE, max_substeps = 8)
+    quick_checkpoint = None
+    #The resting pendulum isn't stepped and redrawn until a key or mouse button is pressed
+    rest_detector = RestDetector(space)
+    #Fixed points are drawn once on the cached background, only the rectangles of the moving balls and rods are updated
+    renderer = DirtyRectRenderer(screen, seven_joint_model.draw_static, seven_joint_model.draw_dynamic)
 
     while True:
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 pg.quit()
 
+            if event.type in (pg.KEYDOWN, pg.MOUSEBUTTONDOWN, pg.WINDOWEXPOSED):
+                rest_detector.wake()
+
+            if event.type == pg.WINDOWEXPOSED:
+                renderer.invalidate()
+
             if event.type == pg.KEYDOWN:
                 if event.key == pg.K_0:
                     #If you press a "0" key, this model will be restarted.
-                    seven_joint_model.set_velocities()
-                    for i, ball_shape in enumerate(seven_joint_model.get_objects_shapes()['balls_shapes']):
-                        ball_shape.body.position = seven_joint_model.get_balls_initial_coords()[i]         
+                    seven_joint_model.set_state(positions = seven_joint_model.get_balls_initial_coords(), 
+                                                velocities = np.zeros((len(seven_joint_model.get_balls_initial_coords()), 2)))
+                elif event.key == pg.K_F5:
+                    #"F5" key saves the current state of the model, "F9" key returns the model to this state
+                    quick_checkpoint = Checkpoint.capture(space, policy.sim_time)
+                elif event.key == pg.K_F9 and quick_checkpoint is not None:
+                    policy.reset(quick_checkpoint.restore(space))
         
             if event.type == pg.MOUSEBUTTONDOWN:
                 if event.button == 1:
@@ -185,9 +328,10 @@ if __name__ == '__main__':
                 nearest_ball.body.position = mouse_x, mouse_y
                     '''
                     mouse_x, mouse_y  = pg.mouse.get_pos()
-                    nearest_ball = seven_joint_model.get_nearest_ball(mouse_x, mouse_y)
+                    #Only the ball under the mouse is dragged
+                    nearest_ball = seven_joint_model.get_nearest_ball(mouse_x, mouse_y, 0)
 
-                    if nearest_ball.point_query(event.pos):
+                    if nearest_ball is not None:
                         is_dragging, start_mouse_pos, start_body_pos  = True, (mouse_x, mouse_y), nearest_ball.body.position
                     
             elif event.type == pg.MOUSEBUTTONUP:
@@ -198,11 +342,13 @@ if __name__ == '__main__':
             mouse_pos = pg.mouse.get_pos()
             displacement = mouse_pos[0] - start_mouse_pos[0], mouse_pos[1] - start_mouse_pos[1]
             nearest_ball.body.position = start_body_pos[0] + displacement[0], start_body_pos[1] + displacement[1]
+        elif rest_detector.update(policy.sim_time):
+            clock.tick(FPS)
+            continue
 
-        screen.fill((255,255,255))
-        seven_joint_model.draw()
-        space.step(1 / FPS)
-        pg.display.update()
+        rects = renderer.render()
+        policy.run(space, clock.get_time() / 1000)
+        pg.display.update(rects)
         clock.tick(FPS)
 
 '''
@@ -0,0 +1,267 @@
+import numpy as np
+import pymunk as pm
+from model_state import get_space_layout
+
+
+'''
+Normal-mode solver of the point-mass models in the small-oscillation regime (CoupledOscillatorModel with rods and
+springs, chains of springs, NewtonPendulum without collisions).
+
+1. Equilibrium: the minimum of the potential energy (gravity + springs) subject to the rod constraints
+   (|p_b - p_a| = distance) is found by Newton iterations on the Lagrange conditions, starting from the current layout.
+2. Linearization: the Hessian of the Lagrangian (springs stiffness, rods tension * rods curvature - this term gives
+   the pendulum restoring force of the rods) is projected to the null space of the rods Jacobian,
+   so every rod removes one degree of freedom.
+3. Modes: generalized eigenproblem K v = omega^2 M v is reduced to the symmetric one with the Cholesky factor of M.
+   Mode shapes are mass-normalized (shapes.T @ M @ shapes = I).
+
+State at time t is the superposition of the modes, it costs O(N * modes) per time without any stepping,
+state_at() accepts an array of times. Damping of the springs isn't included (the solution is undamped),
+modes with omega^2 < 0 (unstable equilibrium) grow as cosh / sinh.
+
+Rows of the positions and velocities arrays are the dynamic bodies in the order of `bodies`
+(moving points of the model for from_model()).
+'''
+
+
+def spring_blocks(positions: np.ndarray, ends: np.ndarray, rest_lengths: np.ndarray):
+    #Unit vectors, lengths and (C, 2, 2) stiffness blocks (per unit stiffness) of the springs:
+    #u u^T + (1 - rest_length / length) * (I - u u^T)
+    d = positions[ends[:, 1]] - positions[ends[:, 0]]
+    lengths = np.sqrt(np.einsum('ij,ij->i', d, d))
+    u = d / lengths[:, None]
+    uu = np.einsum('ij,ik->ijk', u, u)
+    blocks = uu + (1 - rest_lengths / lengths)[:, None, None] * (np.eye(2) - uu)
+    return u, lengths, blocks
+
+
+def assemble(matrix: np.ndarray, ends: np.ndarray, blocks: np.ndarray):
+    #Adding (C, 2, 2) blocks of the pair constraints to the (2N, 2N) matrix: +B to (a, a), (b, b) and -B to (a, b), (b, a)
+    for (a, b), block in zip(ends.tolist(), blocks):
+        matrix[2 * a:2 * a + 2, 2 * a:2 * a + 2] += block
+        matrix[2 * b:2 * b + 2, 2 * b:2 * b + 2] += block
+        matrix[2 * a:2 * a + 2, 2 * b:2 * b + 2] -= block
+        matrix[2 * b:2 * b + 2, 2 * a:2 * a + 2] -= block
+
+
+class NormalModes:
+    def __init__(self, positions, masses, springs, rest_lengths, stiffness, rods = None, rods_distances = None,
+                 pinned = None, gravity = (0, 0), tolerance = 1e-9, max_iterations = 100):
+        #positions, masses - (N,) nodes, springs - (S, 2), rods - (R, 2) indices of the nodes, pinned - (N,) bool mask
+        self.positions = np.asarray(positions, dtype = np.float64).reshape(-1, 2)
+        self.nodes_num = len(self.positions)
+        self.masses = np.asarray(masses, dtype = np.float64).reshape(self.nodes_num)
+        self.springs = np.asarray(springs, dtype = np.intp).reshape(-1, 2)
+        self.rest_lengths = np.asarray(rest_lengths, dtype = np.float64).reshape(len(self.springs))
+        self.stiffness = np.asarray(stiffness, dtype = np.float64).reshape(len(self.springs))
+        self.rods = np.empty((0, 2), dtype = np.intp) if rods is None else np.asarray(rods, dtype = np.intp).reshape(-1, 2)
+        self.rods_distances = (np.empty(0) if rods_distances is None else
+                               np.asarray(rods_distances, dtype = np.float64).reshape(len(self.rods)))
+        self.pinned = np.zeros(self.nodes_num, dtype = bool) if pinned is None else np.asarray(pinned, dtype = bool)
+        self.gravity = np.asarray(gravity, dtype = np.float64)
+        self.dynamic_nodes = np.flatnonzero(~self.pinned)
+        self.__dofs = np.stack((2 * self.dynamic_nodes, 2 * self.dynamic_nodes + 1), axis = 1).ravel()
+
+        self.equilibrium, self.tensions = self.find_equilibrium(tolerance, max_iterations)
+        self.__compute_modes()
+        self.set_initial_state()
+
+
+    @classmethod
+    def from_space(cls, space: pm.Space, bodies = None, **kwargs):
+        #Building the solver from pymunk space with point masses, DampedSprings and PinJoints attached to the centers.
+        #bodies - dynamic bodies in the order of the rows of the results (all dynamic bodies of the space by default).
+        layout = get_space_layout(space)
+        if len(layout['other_constraints']) > 0:
+            raise ValueError('NormalModes supports only DampedSpring and PinJoint constraints')
+        if any(tuple(c.anchor_a) != (0, 0) or tuple(c.anchor_b) != (0, 0) for c in layout['springs'] + layout['rods']):
+            raise ValueError('Constraints must be attached to the centers of the bodies')
+        pinned = ~np.isfinite(layout['masses'])
+        if bodies is not None:
+            index = {body: i for i, body in enumerate(layout['bodies'])}
+            order = [index[body] for body in bodies]
+            if sorted(order) != np.flatnonzero(~pinned).tolist():
+                raise ValueError('bodies must be all of the dynamic bodies of the space')
+            #Moving the dynamic bodies to the order of `bodies`, pinned bodies are put after them
+            permutation = np.array(order + np.flatnonzero(pinned).tolist(), dtype = np.intp)
+        else:
+            permutation = np.arange(len(layout['bodies']))
+        inverse = np.argsort(permutation)
+        positions = np.array([tuple(layout['bodies'][i].position) for i in permutation], dtype = np.float64)
+        return cls(positions, layout['masses'][permutation], inverse[layout['springs_ends']], layout['rest_lengths'],
+                   layout['stiffness'], inverse[layout['rods_ends']], layout['rods_distances'], pinned[permutation],
+                   tuple(space.gravity), **kwargs)
+
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        #Solver of CoupledOscillatorModel (rows are the moving points) or NewtonPendulum (rows are the balls)
+        shapes = model.get_objects_shapes()
+        shapes = shapes['moving_points_shapes'] if 'moving_points_shapes' in shapes else shapes['balls_shapes']
+        return cls.from_space(model.space, [shape.body for shape in shapes], **kwargs)
+
+
+    def __potential_derivatives(self, positions: np.ndarray, tensions: np.ndarray):
+        #Gradient and Hessian of the Lagrangian (potential + tensions * rods constraints) over all 2N coordinates,
+        #constraints values and their Jacobian
+        gradient = -(np.where(self.pinned, 0, self.masses)[:, None] * self.gravity).ravel()
+        hessian = np.zeros((2 * self.nodes_num, 2 * self.nodes_num))
+
+        u, lengths, blocks = spring_blocks(positions, self.springs, self.rest_lengths)
+        forces = (self.stiffness * (lengths - self.rest_lengths))[:, None] * u
+        np.add.at(gradient.reshape(-1, 2), self.springs[:, 1], forces)
+        np.add.at(gradient.reshape(-1, 2), self.springs[:, 0], -forces)
+        assemble(hessian, self.springs, self.stiffness[:, None, None] * blocks)
+
+        #Rod constraint g = length - distance, its gradient is +-u and its Hessian is (I - u u^T) / length
+        u, lengths, blocks = spring_blocks(positions, self.rods, self.rods_distances)
+        jacobian = np.zeros((len(self.rods), 2 * self.nodes_num))
+        rows = np.arange(len(self.rods))
+        for column in (0, 1):
+            jacobian[rows, 2 * self.rods[:, 1] + column] += u[:, column]
+            jacobian[rows, 2 * self.rods[:, 0] + column] -= u[:, column]
+        curvature = (np.eye(2) - np.einsum('ij,ik->ijk', u, u)) / lengths[:, None, None]
+        assemble(hessian, self.rods, tensions[:, None, None] * curvature)
+        return gradient, hessian, lengths - self.rods_distances, jacobian
+
+
+    def find_equilibrium(self, tolerance = 1e-9, max_iterations = 100):
+        #Newton iterations on the Lagrange conditions: grad V + J^T tensions = 0, g = 0
+        positions, dofs, rods_num = self.positions.copy(), self.__dofs, len(self.rods)
+        gradient, hessian, values, jacobian = self.__potential_derivatives(positions, np.zeros(rods_num))
+        tensions = (-np.linalg.lstsq(jacobian[:, dofs].T, gradient[dofs], rcond = None)[0] if rods_num > 0
+                    else np.zeros(0))
+        scale = max(1.0, float(np.abs(gradient[dofs]).max(initial = 0)))
+        for _ in range(max_iterations):
+            gradient, hessian, values, jacobian = self.__potential_derivatives(positions, tensions)
+            residual = np.concatenate((gradient[dofs] + jacobian[:, dofs].T @ tensions, values))
+            if np.abs(residual).max(initial = 0) < tolerance * scale:
+                return positions, tensions
+            kkt = np.block([[hessian[np.ix_(dofs, dofs)], jacobian[:, dofs].T],
+                            [jacobian[:, dofs], np.zeros((rods_num, rods_num))]])
+            delta = np.linalg.lstsq(kkt, -residual, rcond = None)[0]
+            #Limiting the step to a fraction of the smallest constraint length keeps the iterations stable far from equilibrium
+            lengths = np.concatenate((self.rest_lengths, self.rods_distances))
+            max_step = 0.25 * lengths.min() if len(lengths) > 0 else np.inf
+            step_scale = min(1.0, max_step / max(np.abs(delta[:len(dofs)]).max(initial = 0), 1e-300))
+            positions.reshape(-1)[dofs] += step_scale * delta[:len(dofs)]
+            tensions = tensions + step_scale * delta[len(dofs):]
+        raise RuntimeError('Equilibrium was not found, the model may have no stable rest configuration')
+
+
+    def __compute_modes(self):
+        dofs = self.__dofs
+        gradient, hessian, values, jacobian = self.__potential_derivatives(self.equilibrium, self.tensions)
+        mass_diagonal = np.repeat(self.masses, 2)[dofs]
+        #Basis of the motions which keep the rods lengths (null space of the Jacobian)
+        if len(self.rods) > 0:
+            _, singular_values, vt = np.linalg.svd(jacobian[:, dofs])
+            rank = int(np.sum(singular_values > 1e-12 * max(singular_values.max(initial = 0), 1)))
+            basis = vt[rank:].T
+        else:
+            basis = np.eye(len(dofs))
+        reduced_stiffness = basis.T @ hessian[np.ix_(dofs, dofs)] @ basis
+        cholesky = np.linalg.cholesky(basis.T @ (mass_diagonal[:, None] * basis))
+        inverse_cholesky = np.linalg.inv(cholesky)
+        eigenvalues, eigenvectors = np.linalg.eigh(inverse_cholesky @ reduced_stiffness @ inverse_cholesky.T)
+        self.eigenvalues = eigenvalues
+        self.__shapes = basis @ inverse_cholesky.T @ eigenvectors
+        self.__mass_diagonal = mass_diagonal
+
+
+    @property
+    def modes_num(self) -> int:
+        return len(self.eigenvalues)
+
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        #Angular frequencies of the modes (rad / s of simulated time), 0 for unstable and free modes
+        return np.sqrt(np.clip(self.eigenvalues, 0, None))
+
+
+    @property
+    def periods(self) -> np.ndarray:
+        with np.errstate(divide = 'ignore'):
+            return 2 * np.pi / self.frequencies
+
+
+    @property
+    def is_stable(self) -> bool:
+        return bool(np.all(self.eigenvalues > -1e-9 * max(1.0, np.abs(self.eigenvalues).max(initial = 0))))
+
+
+    def get_equilibrium_positions(self) -> np.ndarray:
+        return self.equilibrium[self.dynamic_nodes].copy()
+
+
+    def get_mode_shapes(self) -> np.ndarray:
+        #(modes, N, 2) mass-normalized displacements of the dynamic nodes, modes are sorted by frequency
+        return self.__shapes.T.reshape(self.modes_num, -1, 2).copy()
+
+
+    def set_initial_state(self, positions = None, velocities = None, t0 = 0.0):
+        #Initial (N, 2) positions and velocities of the dynamic nodes at time t0 (equilibrium at rest by default),
+        #they are projected to the modes (the components which break the rods are dropped)
+        positions = self.get_equilibrium_positions() if positions is None else np.asarray(positions, dtype = np.float64)
+        velocities = np.zeros((len(self.dynamic_nodes), 2)) if velocities is None else np.asarray(velocities, dtype = np.float64)
+        displacement = (positions - self.get_equilibrium_positions()).ravel()
+        self.initial_amplitudes = self.__shapes.T @ (self.__mass_diagonal * displacement)
+        self.initial_rates = self.__shapes.T @ (self.__mass_diagonal * velocities.ravel())
+        self.t0 = t0
+
+
+    def __time_functions(self, t: np.ndarray):
+        #c(t) and s(t) of every mode: cos(w t), sin(w t) / w for w^2 > 0; cosh, sinh / k for w^2 < 0; 1, t for w^2 = 0
+        t = t[:, None] - self.t0
+        eigenvalues = self.eigenvalues[None, :]
+        root = np.sqrt(np.abs(eigenvalues))
+        tiny = np.abs(eigenvalues) < 1e-12
+        safe_root = np.where(tiny, 1.0, root)
+        c = np.where(eigenvalues > 0, np.cos(root * t), np.cosh(root * t))
+        s = np.where(eigenvalues > 0, np.sin(root * t), np.sinh(root * t)) / safe_root
+        return np.where(tiny, 1.0, c), np.where(tiny, t, s)
+
+
+    def get_modal_coordinates(self, t) -> np.ndarray:
+        #Amplitudes of the modes at time t (scalar or (T,) array), shape (modes,) or (T, modes)
+        times = np.atleast_1d(np.asarray(t, dtype = np.float64))
+        c, s = self.__time_functions(times)
+        amplitudes = self.initial_amplitudes * c + self.initial_rates * s
+        return amplitudes[0] if np.ndim(t) == 0 else amplitudes
+
+
+    def state_at(self, t) -> dict:
+        #Positions and velocities of the dynamic nodes at time t: (N, 2) arrays for scalar t, (T, N, 2) for (T,) array
+        times = np.atleast_1d(np.asarray(t, dtype = np.float64))
+        c, s = self.__time_functions(times)
+        amplitudes = self.initial_amplitudes * c + self.initial_rates * s
+        rates = -self.eigenvalues * self.initial_amplitudes * s + self.initial_rates * c
+        positions = self.get_equilibrium_positions() + (amplitudes @ self.__shapes.T).reshape(len(times), -1, 2)
+        velocities = (rates @ self.__shapes.T).reshape(len(times), -1, 2)
+        if np.ndim(t) == 0:
+            return {'positions': positions[0], 'velocities': velocities[0]}
+        return {'positions': positions, 'velocities': velocities}
+
+
+
+if __name__ == '__main__':
+    from coupled_oscillator_model import WindowSpaceInitializer, CoupledOscillatorModel, GameLoop
+    wsinit = WindowSpaceInitializer(900, 600, 100, 60, headless = True)
+    wsinit.initialize()
+    model = CoupledOscillatorModel(wsinit, (100, 100), (700, 100), 5, hor_rest_len = 100, hor_damping = 0, hor_stiffness = 10,
+                                   vert_rest_len = 200)
+    model.create_model()
+    modes = NormalModes.from_model(model)
+    print('frequencies, rad/s:', np.round(modes.frequencies, 4))
+
+    #Small kick of the first point from the equilibrium, pymunk run is compared with the modes solution
+    velocities = np.zeros((5, 2))
+    velocities[0] = (5, 0)
+    model.set_state(positions = modes.get_equilibrium_positions(), velocities = velocities)
+    modes.set_initial_state(modes.get_equilibrium_positions(), velocities)
+    gameloop = GameLoop(wsinit, model)
+    for t in (1, 5, 20):
+        gameloop.run_until(t, 1 / 600)
+        error = np.abs(model.get_state()['positions'] - modes.state_at(gameloop.sim_time)['positions']).max()
+        print(f't = {t} s: max difference between pymunk and normal modes {error:.4f} px')
@@ -0,0 +1,188 @@
+import math
+
+import numpy as np
+import pymunk as pm
+from model_state import BodiesState, get_space_layout
+
+
+'''
+Energies and invariants of the whole space computed with a few NumPy operations per call:
+    kinetic - translational and rotational kinetic energy of the dynamic bodies
+    gravitational - potential energy of the dynamic bodies in the gravity field of the space, -sum(m * (g, p))
+    elastic - energy of DampedSpring constraints, sum(k * (length - rest_length) ** 2 / 2)
+    total - kinetic + gravitational + elastic
+    rod_max_error, rod_rms_error - drift of PinJoint lengths from their distances (absolute, in pixels)
+
+Damping of the springs, collisions and the solver dissipate energy, so total energy of a damped model decreases
+by itself, drift of an undamped model shows the error of dt and of the number of solver iterations.
+
+ObservablesMonitor keeps running statistics (Welford algorithm, constant memory) of every observable over a run
+and the energy drift per second of simulated time, it can be used as render_callback of GameLoop.run().
+'''
+
+
+def rotate(vectors: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    #Rotation of the (N, 2) vectors by the (N,) angles
+    cos, sin = np.cos(angles), np.sin(angles)
+    return np.stack((vectors[:, 0] * cos - vectors[:, 1] * sin, vectors[:, 0] * sin + vectors[:, 1] * cos), axis = 1)
+
+
+class Observables:
+    def __init__(self, space: pm.Space):
+        #The layout of the space is read once, call refresh() after adding or removing bodies and constraints
+        self.space = space
+        self.refresh()
+
+
+    def refresh(self):
+        layout = get_space_layout(self.space)
+        self.layout = layout
+        space_bodies = set(self.space.bodies)
+        #Bodies which are used only by constraints (space.static_body) aren't read by the batch module
+        self.__tracked = np.array([i for i, body in enumerate(layout['bodies']) if body in space_bodies], dtype = np.intp)
+        self.__extra = [(i, body) for i, body in enumerate(layout['bodies']) if body not in space_bodies]
+        self.__bodies_state = BodiesState(self.space, [layout['bodies'][i] for i in self.__tracked])
+        self.__dynamic = np.isfinite(layout['masses'])
+        self.masses, self.moments = layout['masses'][self.__dynamic], layout['moments'][self.__dynamic]
+        self.__springs_anchors = self.__get_anchors(layout['springs'])
+        self.__rods_anchors = self.__get_anchors(layout['rods'])
+
+
+    @staticmethod
+    def __get_anchors(constraints: list):
+        #(anchors_a, anchors_b) arrays of shape (C, 2) or None if all of the anchors are zero
+        anchors_a = np.array([tuple(constr.anchor_a) for constr in constraints], dtype = np.float64).reshape(-1, 2)
+        anchors_b = np.array([tuple(constr.anchor_b) for constr in constraints], dtype = np.float64).reshape(-1, 2)
+        return None if not (anchors_a.any() or anchors_b.any()) else (anchors_a, anchors_b)
+
+
+    def get_bodies_state(self) -> dict:
+        #State of all bodies of the layout (rows in the order of layout['bodies'])
+        tracked_state = self.__bodies_state.get_state()
+        bodies_num = len(self.layout['bodies'])
+        state = {'positions': np.zeros((bodies_num, 2)), 'velocities': np.zeros((bodies_num, 2)),
+                 'angles': np.zeros(bodies_num), 'angular_velocities': np.zeros(bodies_num)}
+        for key, value in tracked_state.items():
+            state[key][self.__tracked] = value
+        for i, body in self.__extra:
+            state['positions'][i], state['velocities'][i] = tuple(body.position), tuple(body.velocity)
+            state['angles'][i], state['angular_velocities'][i] = body.angle, body.angular_velocity
+        return state
+
+
+    def __get_lengths(self, ends: np.ndarray, anchors, positions: np.ndarray, angles: np.ndarray) -> np.ndarray:
+        a_points, b_points = positions[ends[:, 0]], positions[ends[:, 1]]
+        if anchors is not None:
+            a_points = a_points + rotate(anchors[0], angles[ends[:, 0]])
+            b_points = b_points + rotate(anchors[1], angles[ends[:, 1]])
+        d = b_points - a_points
+        return np.sqrt(np.einsum('ij,ij->i', d, d))
+
+
+    def compute(self) -> dict:
+        state, layout = self.get_bodies_state(), self.layout
+        positions, angles = state['positions'], state['angles']
+        velocities = state['velocities'][self.__dynamic]
+        angular_velocities = state['angular_velocities'][self.__dynamic]
+
+        kinetic = 0.5 * (self.masses @ np.einsum('ij,ij->i', velocities, velocities) +
+                         self.moments @ (angular_velocities * angular_velocities))
+        gravitational = -float(self.masses @ (positions[self.__dynamic] @ np.asarray(tuple(self.space.gravity))))
+        extension = self.__get_lengths(layout['springs_ends'], self.__springs_anchors, positions, angles) - layout['rest_lengths']
+        elastic = 0.5 * float(layout['stiffness'] @ (extension * extension))
+        rods_error = np.abs(self.__get_lengths(layout['rods_ends'], self.__rods_anchors, positions, angles) - layout['rods_distances'])
+        return {'kinetic': float(kinetic), 'gravitational': gravitational, 'elastic': elastic,
+                'total': float(kinetic) + gravitational + elastic,
+                'rod_max_error': float(rods_error.max()) if len(rods_error) > 0 else 0.0,
+                'rod_rms_error': float(np.sqrt(np.mean(rods_error * rods_error))) if len(rods_error) > 0 else 0.0}
+
+
+class RunningStats:
+    #Running count, mean, variance, min and max of a value (Welford algorithm)
+    def __init__(self):
+        self.count, self.mean, self.__m2 = 0, 0.0, 0.0
+        self.min, self.max = math.inf, -math.inf
+
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.__m2 += delta * (value - self.mean)
+        self.min, self.max = min(self.min, value), max(self.max, value)
+
+
+    @property
+    def variance(self) -> float:
+        return self.__m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+    def as_dict(self) -> dict:
+        return {'count': self.count, 'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
+
+
+class ObservablesMonitor:
+    def __init__(self, observables: Observables):
+        self.observables = observables
+        self.stats = {}
+        self.initial_values, self.initial_time = None, None
+        self.last_values, self.last_time = None, None
+        self.max_energy_error = 0.0
+
+
+    @classmethod
+    def for_space(cls, space: pm.Space):
+        return cls(Observables(space))
+
+
+    def update(self, sim_time: float) -> dict:
+        #Computing the observables at sim_time and updating the statistics, returns the observables
+        values = self.observables.compute()
+        if self.initial_values is None:
+            self.initial_values, self.initial_time = values, sim_time
+        for key, value in values.items():
+            self.stats.setdefault(key, RunningStats()).update(value)
+        self.max_energy_error = max(self.max_energy_error, abs(values['total'] - self.initial_values['total']))
+        self.last_values, self.last_time = values, sim_time
+        return values
+
+
+    def as_callback(self):
+        #Callback for GameLoop.run() / run_until()
+        return lambda gameloop: self.update(gameloop.sim_time)
+
+
+    @property
+    def energy_drift_rate(self) -> float:
+        #Change of the total energy per second of simulated time between the first and the last update
+        if self.initial_values is None or self.last_time == self.initial_time:
+            return 0.0
+        return (self.last_values['total'] - self.initial_values['total']) / (self.last_time - self.initial_time)
+
+
+    def summary(self) -> dict:
+        return {'stats': {key: stats.as_dict() for key, stats in self.stats.items()},
+                'energy_drift_rate': self.energy_drift_rate, 'max_energy_error': self.max_energy_error,
+                'max_rod_error': self.stats['rod_max_error'].max if 'rod_max_error' in self.stats else 0.0}
+
+
+
+if __name__ == '__main__':
+    from coupled_oscillator_model import WindowSpaceInitializer, CoupledOscillatorModel, GameLoop
+    for dt in (1 / 30, 1 / 60, 1 / 240):
+        wsinit = WindowSpaceInitializer(900, 600, 100, 60, headless = True)
+        wsinit.initialize()
+        model = CoupledOscillatorModel(wsinit, (100, 100), (700, 100), 5, hor_rest_len = 100, hor_damping = 0, hor_stiffness = 10,
+                                       vert_rest_len = 200)
+        model.create_model()
+        model.set_state(velocities = [(100, 0)] + [(0, 0)] * 4)
+        monitor = ObservablesMonitor.for_space(wsinit.space)
+        GameLoop(wsinit, model).run_until(20, dt, monitor.as_callback())
+        result = monitor.summary()
+        print(f"dt 1/{round(1 / dt)}: energy drift {result['energy_drift_rate']:.4g} / s, "
+              f"max rod error {result['max_rod_error']:.4g} px")
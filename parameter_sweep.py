@@ -0,0 +1,99 @@
+import csv
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pymunk as pm
+from model_state import BodiesState
+from rope_system_modified import LoadedRopeModel
+
+
+'''
+Parameter sweep of the loaded rope model (rope_system_modified.LoadedRopeModel).
+Every configuration of the grid is simulated headlessly (without pygame) in a worker of ProcessPoolExecutor,
+the result is one table: a row per configuration with its parameters and summary observables:
+    final_sag - distance from the line of the fixed points to the load point at the end of the run
+    settling_time - simulated time after which the load point speed stays below settle_speed (nan if it never settles)
+    peak_extension - maximum extension (length - rest length) of the springs over the run
+    max_load_speed - maximum speed of the load point over the run
+'''
+
+
+def run_rope_configuration(parameters: dict, duration = 20.0, dt = 1 / 60, gravity = (0, 100), settle_speed = 1.0,
+                           sample_every = 1) -> dict:
+    #Headless run of one configuration, parameters are keyword arguments of LoadedRopeModel
+    space = pm.Space()
+    space.gravity = gravity
+    model = LoadedRopeModel(space, None, **parameters)
+    model.create_model()
+
+    #Rows of the state array: moving points and then two fixed edges
+    bodies = [shape.body for shape in model.get_moving_shapes()] + list(model.edges['bodies'])
+    index = {body: i for i, body in enumerate(bodies)}
+    springs = model.get_springs()
+    a_index = np.array([index[spring.a] for spring in springs], dtype = np.intp)
+    b_index = np.array([index[spring.b] for spring in springs], dtype = np.intp)
+    rest_lengths = np.array([spring.rest_length for spring in springs], dtype = np.float64)
+    load_index = len(model.get_moving_shapes()) - 1
+    bodies_state = BodiesState(space, bodies)
+
+    n_steps = math.ceil(duration / dt - 1e-9)
+    peak_extension, max_load_speed, last_unsettled_time = -np.inf, 0.0, 0.0
+    for i in range(1, n_steps + 1):
+        space.step(dt)
+        if i % sample_every != 0 and i != n_steps:
+            continue
+        state = bodies_state.get_state()
+        d = state['positions'][b_index] - state['positions'][a_index]
+        peak_extension = max(peak_extension, float(np.max(np.sqrt(np.einsum('ij,ij->i', d, d)) - rest_lengths)))
+        load_speed = float(np.hypot(*state['velocities'][load_index]))
+        max_load_speed = max(max_load_speed, load_speed)
+        if load_speed > settle_speed or not np.isfinite(load_speed):
+            last_unsettled_time = i * dt
+
+    final_sag = float(model.get_load_point().position.y - model.y_coord)
+    settling_time = last_unsettled_time if last_unsettled_time < n_steps * dt else math.nan
+    return {**parameters, 'final_sag': final_sag, 'settling_time': settling_time,
+            'peak_extension': peak_extension, 'max_load_speed': max_load_speed}
+
+
+def make_grid(grid: dict) -> list:
+    #{'base_points_number': [10, 20], 'delta_len': [50, 150]} -> list of 4 parameters dicts
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def sweep(grid, duration = 20.0, dt = 1 / 60, gravity = (0, 100), settle_speed = 1.0, sample_every = 1,
+          max_workers = None, chunksize = None) -> list:
+    #grid is a dict of parameters lists (full product is swept) or a list of parameters dicts.
+    #Returns the table as a list of rows in the order of the configurations.
+    configurations = make_grid(grid) if isinstance(grid, dict) else list(grid)
+    if len(configurations) == 0:
+        return []
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+    if chunksize is None:
+        chunksize = max(1, len(configurations) // (4 * max_workers))
+    run = partial(run_rope_configuration, duration = duration, dt = dt, gravity = gravity,
+                  settle_speed = settle_speed, sample_every = sample_every)
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        return list(executor.map(run, configurations, chunksize = chunksize))
+
+
+def save_table(rows: list, path: str):
+    #Saving the sweep table in csv file
+    fieldnames = list(rows[0].keys()) if rows else []
+    with open(path, 'w', newline = '') as file:
+        writer = csv.DictWriter(file, fieldnames = fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+
+if __name__ == '__main__':
+    table = sweep({'base_points_number': [10, 20, 30], 'base_rope_stiffness': [3.8, 7],
+                   'delta_len': [50, 150], 'weight_point_mass': [10, 30]}, duration = 10)
+    for row in table:
+        print(row)
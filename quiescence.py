@@ -0,0 +1,79 @@
+import numpy as np
+import pymunk as pm
+from model_state import BodiesState
+
+
+'''
+Rest (quiescence) detection of the damped models.
+
+The system is at rest when the maximum speed of the dynamic bodies is below speed_threshold and their kinetic energy
+(translational, 0.5 * sum(m * v^2)) is below energy_threshold during hold_time seconds of simulated time.
+Hysteresis: the resting system wakes up only when the maximum speed exceeds wake_factor * speed_threshold
+or the energy exceeds wake_factor * energy_threshold, so it doesn't flicker between the states near the thresholds.
+It also wakes up when bodies or constraints are added or removed, when gravity or damping of the space are changed
+and when wake() is called (user interaction, changed parameters of the objects).
+
+Usage:
+    in interactive loops - while is_at_rest the loop doesn't step the space and doesn't redraw,
+                           events of the user call wake();
+    in batch runs - GameLoop.run() stops when the system comes to rest.
+The state is read at most once per check_interval seconds of simulated time.
+'''
+
+
+class RestDetector:
+    def __init__(self, space: pm.Space, bodies = None, speed_threshold = 1.0, energy_threshold = None, hold_time = 1.0,
+                 wake_factor = 4.0, check_interval = 0.0):
+        #bodies - bodies which are checked (all dynamic bodies of the space by default),
+        #energy_threshold is 0.5 * total mass * (speed_threshold / 2)^2 by default
+        self.space = space
+        self.bodies = [body for body in space.bodies if body.body_type == pm.Body.DYNAMIC] if bodies is None else list(bodies)
+        self.masses = np.array([body.mass for body in self.bodies], dtype = np.float64)
+        self.speed_threshold, self.hold_time, self.wake_factor = speed_threshold, hold_time, wake_factor
+        self.energy_threshold = 0.5 * self.masses.sum() * (speed_threshold / 2) ** 2 if energy_threshold is None else energy_threshold
+        self.check_interval = check_interval
+        self.__bodies_state = BodiesState(space, self.bodies)
+        self.is_at_rest, self.rest_since, self.last_check = False, None, None
+        self.kinetic_energy, self.max_speed = np.inf, np.inf
+        self.__signature = self.__get_signature()
+
+
+    def __get_signature(self):
+        return len(self.space.bodies), len(self.space.constraints), tuple(self.space.gravity), self.space.damping
+
+
+    def wake(self):
+        self.is_at_rest, self.rest_since = False, None
+
+
+    def is_due(self, sim_time: float) -> bool:
+        #True if update(sim_time) reads the state (check_interval has passed since the last check)
+        return self.last_check is None or sim_time - self.last_check >= self.check_interval
+
+
+    def update(self, sim_time: float) -> bool:
+        #Checking the state at sim_time, returns is_at_rest
+        signature = self.__get_signature()
+        if signature != self.__signature:
+            self.__signature = signature
+            self.wake()
+        if not self.is_due(sim_time):
+            return self.is_at_rest
+        self.last_check = sim_time
+
+        velocities = self.__bodies_state.get_state()['velocities']
+        speeds_squared = np.einsum('ij,ij->i', velocities, velocities)
+        self.kinetic_energy = 0.5 * float(self.masses @ speeds_squared)
+        self.max_speed = float(np.sqrt(speeds_squared.max())) if len(speeds_squared) > 0 else 0.0
+
+        if self.is_at_rest:
+            if self.max_speed > self.wake_factor * self.speed_threshold or self.kinetic_energy > self.wake_factor * self.energy_threshold:
+                self.wake()
+        elif self.max_speed < self.speed_threshold and self.kinetic_energy < self.energy_threshold:
+            if self.rest_since is None:
+                self.rest_since = sim_time
+            if sim_time - self.rest_since >= self.hold_time:
+                self.is_at_rest = True
+        else:
+            self.rest_since = None
+        return self.is_at_rest
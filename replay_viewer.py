@@ -0,0 +1,123 @@
+import argparse
+
+import numpy as np
+import pygame as pg
+from trajectory_recorder import TrajectoryReader
+
+
+'''
+Physics-free replay of the trajectories recorded by trajectory_recorder.TrajectoryRecorder.
+Frames are drawn straight from the stored position arrays by draw_state(positions) function,
+for example NewtonPendulum.draw_state, CoupledOscillatorModel.draw_state or LoadedRopeModel.draw_state
+(models don't need create_model() and pymunk space isn't stepped).
+
+Playback follows the simulated time of the frames: with speed multiplier > 1 the frames which
+fall between two rendered frames are skipped, frame_skip additionally draws only every k-th frame.
+
+Controls of play():
+    Space - pause / resume
+    Left / Right - seek 1 second (of simulated time) back / forward, one frame when paused
+    Up / Down - speed x2 / x0.5
+    Home / End - go to the first / last frame
+    Esc - quit
+'''
+
+
+def draw_points(screen: pg.Surface, positions, color = (0,0,50), radius = 4):
+    #Generic drawing of the recorded nodes for the recordings without a model
+    for pos in np.asarray(positions).tolist():
+        pg.draw.circle(screen, color, pos, radius)
+
+
+class ReplayViewer:
+    def __init__(self, reader: TrajectoryReader, draw_state, screen: pg.Surface, fps = 60, speed = 1.0, frame_skip = 1):
+        self.reader, self.draw_state, self.screen = reader, draw_state, screen
+        self.fps, self.speed, self.frame_skip = fps, speed, max(1, frame_skip)
+        self.paused, self.frame_index = False, 0
+        self.playback_time = float(reader.times[0]) if reader.frames_num > 0 else 0.0
+
+
+    def seek(self, frame_index: int):
+        self.frame_index = int(np.clip(frame_index, 0, max(self.reader.frames_num - 1, 0)))
+        self.playback_time = float(self.reader.times[self.frame_index]) if self.reader.frames_num > 0 else 0.0
+
+
+    def seek_time(self, t: float):
+        self.seek(self.reader.find_frame(t))
+
+
+    def set_speed(self, speed: float):
+        self.speed = speed
+
+
+    def advance(self, real_dt: float):
+        #Moving the playback by real_dt seconds of wall time multiplied by the speed
+        if self.paused or self.reader.frames_num == 0:
+            return
+        self.playback_time = min(self.playback_time + real_dt * self.speed, float(self.reader.times[-1]))
+        frame_index = self.reader.find_frame(self.playback_time)
+        if self.frame_skip > 1:
+            frame_index -= frame_index % self.frame_skip
+        self.frame_index = frame_index
+
+
+    def render(self):
+        self.screen.fill((255,255,255))
+        if self.reader.frames_num > 0:
+            self.draw_state(self.reader.get_frame(self.frame_index)['positions'])
+
+
+    def handle_event(self, event) -> bool:
+        #Returns False when the viewer must be closed
+        if event.type == pg.QUIT:
+            return False
+        if event.type == pg.KEYDOWN:
+            if event.key == pg.K_ESCAPE:
+                return False
+            elif event.key == pg.K_SPACE:
+                self.paused = not self.paused
+            elif event.key in (pg.K_LEFT, pg.K_RIGHT):
+                direction = 1 if event.key == pg.K_RIGHT else -1
+                if self.paused:
+                    self.seek(self.frame_index + direction * self.frame_skip)
+                else:
+                    self.seek_time(self.playback_time + direction)
+            elif event.key == pg.K_UP:
+                self.set_speed(self.speed * 2)
+            elif event.key == pg.K_DOWN:
+                self.set_speed(self.speed / 2)
+            elif event.key == pg.K_HOME:
+                self.seek(0)
+            elif event.key == pg.K_END:
+                self.seek(self.reader.frames_num - 1)
+        return True
+
+
+    def play(self):
+        clock, running = pg.time.Clock(), True
+        while running:
+            for event in pg.event.get():
+                running = self.handle_event(event) and running
+            self.advance(clock.get_time() / 1000)
+            self.render()
+            pg.display.update()
+            clock.tick(self.fps)
+        pg.quit()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Replay of the recorded trajectory')
+    parser.add_argument('directory', help = 'directory of the recording')
+    parser.add_argument('--speed', type = float, default = 1.0)
+    parser.add_argument('--frame-skip', type = int, default = 1)
+    parser.add_argument('--size', type = int, nargs = 2, default = (900, 600))
+    args = parser.parse_args()
+
+    pg.init()
+    screen = pg.display.set_mode(args.size)
+    reader = TrajectoryReader(args.directory)
+    pg.display.set_caption(f"Replay: {reader.metadata.get('model', args.directory)}")
+    viewer = ReplayViewer(reader, lambda positions: draw_points(screen, positions), screen,
+                          speed = args.speed, frame_skip = args.frame_skip)
+    viewer.play()
@@ -1,20 +1,18 @@
 import pymunk as pm
-import pygame as pg
-import pymunk.pygame_util
+from loop_policy import FixedTimestepPolicy
+from quiescence import RestDetector
+from batched_renderer import DirtyRectRenderer
 
 
 '''
 In this python program there are 2 fixed points by the edges, central moving point, which is joined to
 fixed points by 2 springs (spring1, spring2) and to loaded point by spring3.
 You can change values of hyperparameters and see changes of behaviour of this system.
+The model is built by create_static_edges and add_moving_circles, so it can be imported and stepped without pygame,
+the window is opened only by main().
 '''
 
 FPS = 60
-pg.init()
-screen = pg.display.set_mode((800, 650))
-clock = pg.time.Clock()
-space = pm.Space()
-space.gravity = (0,100)
 
 
 #Hyperparameters
@@ -41,11 +39,10 @@ def create_static_edges(space: pm.Space) -> dict:
     space.add(left_edge_body, right_edge_body, left_shape, right_shape)
     return {'bodies': (left_edge_body, right_edge_body), 'shapes': (left_shape, right_shape)}
 
-edges = create_static_edges(space)
 
-
-def draw_edges(edges: dict) -> None:
+def draw_edges(screen: 'pg.Surface', edges: dict) -> None:
     #Drawing fixed edges on the screen
+    import pygame as pg
     for edge in edges['shapes']:
         pos_tuple = edge.body.position.x, edge.body.position.y
         pg.draw.circle(screen, (0, 0, 50), pos_tuple, static_edges_radius)
@@ -90,33 +87,66 @@ def add_moving_circles(space: pm.Space, edges: dict) -> tuple:
     return (shape, weight_point_shape), spring1, spring2, spring3    
     
 
-def draw_circles(circles: tuple) -> None:
-    #This function draws all moving points and all springs between them.
-    
+def draw_circles(screen: 'pg.Surface', circles: tuple) -> list:
+    #This function draws all moving points and all springs between them,
+    #returns the bounding rectangles of the drawn points and springs (for batched_renderer.DirtyRectRenderer).
+    import pygame as pg
     center_pos_tuple = (circles[0][0].body.position.x, circles[0][0].body.position.y)
-    pg.draw.circle(screen, (0,0,50), center_pos_tuple, moving_points_radius)
     weight_pos_tuple = (circles[0][1].body.position.x, circles[0][1].body.position.y)
-    pg.draw.circle(screen, (0,0,50), weight_pos_tuple, moving_points_radius)
+    rects = [pg.draw.circle(screen, (0,0,50), center_pos_tuple, moving_points_radius),
+             pg.draw.circle(screen, (0,0,50), weight_pos_tuple, moving_points_radius)]
     
     #drawing springs
-    pg.draw.line(screen, (0,0,0), circles[1].a.position, center_pos_tuple, 1)
-    pg.draw.line(screen, (0,0,0), center_pos_tuple, circles[2].b.position, 1) 
-    pg.draw.line(screen, (0,0,0), center_pos_tuple, weight_pos_tuple, 1) 
-
-
-
-
-circles = add_moving_circles(space, edges)
-while True:
-    for event in pg.event.get():
-        if event.type == pg.QUIT:
-            pg.quit()
-            
-    screen.fill((255,255,255))
-    draw_edges(edges)
-    draw_circles(circles)
-    space.step(1/FPS)
-    pg.display.update()
-    clock.tick(FPS)
+    rects.append(pg.draw.line(screen, (0,0,0), circles[1].a.position, center_pos_tuple, 1))
+    rects.append(pg.draw.line(screen, (0,0,0), center_pos_tuple, circles[2].b.position, 1))
+    rects.append(pg.draw.line(screen, (0,0,0), center_pos_tuple, weight_pos_tuple, 1))
+    return rects
+
+
+
+def create_model(gravity = (0, 100)) -> tuple:
+    #Creating the space with the model, returns (space, edges, circles)
+    space = pm.Space()
+    space.gravity = gravity
+    edges = create_static_edges(space)
+    circles = add_moving_circles(space, edges)
+    return space, edges, circles
+
+
+def main():
+    import pygame as pg
+    pg.init()
+    screen = pg.display.set_mode((800, 650))
+    clock = pg.time.Clock()
+    space, edges, circles = create_model()
+    policy = FixedTimestepPolicy(physics_rate = FPS, max_substeps = 8)
+    #Fixed edges are drawn once on the cached background, only the changed rectangles of the window are updated
+    renderer = DirtyRectRenderer(screen, lambda surface: draw_edges(surface, edges), lambda: draw_circles(screen, circles))
+    #The settled rope isn't stepped and redrawn until a key or mouse button is pressed
+    rest_detector = RestDetector(space)
+    while True:
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                pg.quit()
+
+            if event.type in (pg.KEYDOWN, pg.MOUSEBUTTONDOWN, pg.WINDOWEXPOSED):
+                rest_detector.wake()
+
+            if event.type == pg.WINDOWEXPOSED:
+                renderer.invalidate()
+
+        if rest_detector.update(policy.sim_time):
+            clock.tick(FPS)
+            continue
+                
+        rects = renderer.render()
+        policy.run(space, clock.get_time() / 1000)
+        pg.display.update(rects)
+        clock.tick(FPS)
+
+
+
+if __name__ == '__main__':
+    main()
 
 
@@ -1,208 +1,307 @@
+import copy
 import numpy as np
 import pymunk as pm
-import pygame as pg
-import pymunk.pygame_util
-import datetime
-import time 
-
-
-FPS = 60
-pg.init()
-screen = pg.display.set_mode((800, 650))
-clock = pg.time.Clock()
-space = pm.Space()
-space.gravity = (0,100)
-do_snapshots = False  #Do (True) or not (False) snapshots 
-interval = 1.05   #Interval between snapshots in seconds    
-num_snapshots = 12  #Number of shots
-snapshot_delay = 2.2 #Delay in taking shots in seconds 
-
-#Hyperparameters
-base_points_number = 20 #12 #24 #18            #the number of base points without a central point 
-loaded_rope_points_number = 3     #the number of loaded_rope points without a central point and without a load point
-x_left_coord, x_right_coord = 30, 770  #coordinates of fixed points along the x axis 
-y_coord = 120                          #y coordinate of fixed points and base rope points 
-x_center_point_coord =  (770 + 30) / 2  #coordinate of the central point of the base         
-center_weight_distance = 150            #distance from the central point of the base to the load point without deformation
-base_rope_mass = 8                      #mass of the entire rope
-base_rope_stiffness =  7  #3.8 #7       #stiffness coefficient of the entire base rope
-#base_spring_stiffness, base_spring_damping = 1.5, 0.05#1.5, 0.0015 #1.5, 0.02   #stiffness and coefficient of viscosity for the springs of the base
-base_spring_stiffness, base_spring_damping = base_rope_stiffness * base_points_number, 0.05 
-loaded_rope_stiffness, loaded_rope_damping = base_spring_stiffness / 2, base_spring_damping / 2 
-delta_len = 150                          #the size of the extension of the base springs at the initial moment of time
-#base_point_mass, base_point_moment = 0.001, 1    #mass and moment of inertia of the base points
-base_point_mass, base_point_moment = base_rope_mass / base_points_number, 1
-static_edges_radius = 10                         #static points radius
-loaded_rope_point_mass, loaded_rope_point_moment = 1, 1      #mass and moment of inertia of the loaded rope points
-weight_point_mass, weight_point_moment = 30, 5               #mass and moment of inertia of the weight point
-static_point_mass, static_point_moment = 1, 0                
-moving_points_radius = 7                                     #moving points radius
-x_bias, y_bias = 0, 0                 #displacement along the x-axis and along the y-axis of the load point relative to the central point
-
-
-def create_static_edges(space: pm.Space) -> dict:
-    #Creating fixed edge points
-    left_edge_body = pm.Body(static_point_mass, static_point_moment, body_type=pm.Body.STATIC)
-    right_edge_body = pm.Body(static_point_mass, static_point_moment, body_type=pm.Body.STATIC)
-    left_edge_body.position, right_edge_body.position = (x_left_coord, y_coord), (x_right_coord, y_coord)
-    left_shape, right_shape = pm.Circle(left_edge_body, static_edges_radius), pm.Circle(right_edge_body, static_edges_radius)
-    space.add(left_edge_body, right_edge_body, left_shape, right_shape)
-    return {'bodies': (left_edge_body, right_edge_body), 'shapes': (left_shape, right_shape)}
-
-
-edges = create_static_edges(space)
-
-
-def draw_edges(edges: dict) -> None:
-    #Function draws edges 
-    
-    for edge in edges['shapes']:
-        pos_tuple = (int(edge.body.position.x),int(edge.body.position.y))
-        pg.draw.circle(screen, (0, 0, 50), pos_tuple, static_edges_radius)
-
-
-def add_moving_circles(space: pm.Space, edges: dict) -> dict:
-    #Function add center moving points 
-    center_point = pm.Body(base_point_mass, base_point_moment, body_type = pm.Body.DYNAMIC)
-    center_point.position = pm.Vec2d(x_center_point_coord, y_coord)
-    shape = pm.Circle(center_point, moving_points_radius)
-
-    weight_point = pm.Body(weight_point_mass, weight_point_moment, body_type = pm.Body.DYNAMIC)
-    weight_point.position = pm.Vec2d(x_center_point_coord + x_bias, y_coord - center_weight_distance - y_bias)
-    weight_point_shape = pm.Circle(weight_point, moving_points_radius)
-    center_point.velocity, weight_point.velocity = pm.Vec2d(0, 0), pymunk.Vec2d(0, 0)
-
-    point_shapes, point_bodies, springs = [],[],[]
-    x_base_point_coords = np.linspace(edges['bodies'][0].position[0], edges['bodies'][1].position[0], base_points_number + 3) #[1:]
-    y_loaded_rope_coords = np.linspace(center_point.position.y, weight_point.position.y, loaded_rope_points_number + 2)[1:]
-    
-    #stretched_len_base_spring = abs(edges['bodies'][0].position[0] - x_base_point_coords[1])
-    #rest_len_loaded_rope_spring = abs(y_coord - y_loaded_rope_coords[1])
-    stretched_len_base_spring = edges['bodies'][0].position.get_distance((x_base_point_coords[1], y_coord))
-    delta = delta_len if 0 <= delta_len < stretched_len_base_spring else 0.5 * stretched_len_base_spring 
-    rest_len_base_spring = stretched_len_base_spring -  delta
-    rest_len_loaded_rope_spring = center_point.position.get_distance((x_center_point_coord, y_loaded_rope_coords[0]))
-    
-
-    for i in range(len(x_base_point_coords)):
-        #loop for adding points of the base spring
-        if i == 0:
-            continue
-        elif i == len(x_base_point_coords) - 1:
-            spring = pm.constraints.DampedSpring(point_bodies[-1], edges['bodies'][1], anchor_a = (0,0), anchor_b = (0,0),
-                                          rest_length = rest_len_base_spring, stiffness = base_spring_stiffness,
-                                          damping = base_spring_damping)
-            
-        else:
-            left_point = edges['bodies'][0] if i == 1 else point_bodies[-1]
-            
-            if i == int(len(x_base_point_coords) / 2):   #if i == index of the center point x_coord
-                point = center_point
-                point_shape = shape
-                
+from model_state import BodiesState
+from model_builder import add_objects
+from batched_renderer import draw_chain, stamp_nodes, DirtyRectRenderer
+
+
+'''
+Loaded rope model: the base rope is stretched between two fixed edge points,
+the loaded rope hangs from the central point of the base rope and ends with the load (weight) point.
+
+Parameters of the model (arguments of LoadedRopeModel):
+    base_points_number - the number of base points without a central point
+    loaded_rope_points_number - the number of loaded_rope points without a central point and without a load point
+    x_left_coord, x_right_coord - coordinates of fixed points along the x axis
+    y_coord - y coordinate of fixed points and base rope points
+    center_weight_distance - distance from the central point of the base to the load point without deformation
+    base_rope_mass - mass of the entire rope
+    base_rope_stiffness - stiffness coefficient of the entire base rope,
+                          stiffness of one base spring is base_rope_stiffness * base_points_number
+    base_spring_damping - coefficient of viscosity for the springs of the base
+    delta_len - the size of the extension of the base springs at the initial moment of time
+    base_point_moment - moment of inertia of the base points (mass of the base point is base_rope_mass / base_points_number)
+    loaded_rope_point_mass, loaded_rope_point_moment - mass and moment of inertia of the loaded rope points
+    weight_point_mass, weight_point_moment - mass and moment of inertia of the weight point
+    static_edges_radius, moving_points_radius - radiuses of the static and moving points
+    x_bias, y_bias - displacement along the x-axis and along the y-axis of the load point relative to the central point
+    screen - pygame surface for drawing (None for headless runs, pygame is imported only by the drawing functions)
+'''
+
+
+class LoadedRopeModel:
+    def __init__(self, space: pm.Space, screen = None, base_points_number = 20, loaded_rope_points_number = 3,
+                 x_left_coord = 30, x_right_coord = 770, y_coord = 120, center_weight_distance = 150,
+                 base_rope_mass = 8, base_rope_stiffness = 7, base_spring_damping = 0.05, delta_len = 150,
+                 base_point_moment = 1, loaded_rope_point_mass = 1, loaded_rope_point_moment = 1,
+                 weight_point_mass = 30, weight_point_moment = 5, static_point_mass = 1, static_point_moment = 0,
+                 static_edges_radius = 10, moving_points_radius = 7, x_bias = 0, y_bias = 0):
+        self.space, self.screen = space, screen
+        self.base_points_number, self.loaded_rope_points_number = base_points_number, loaded_rope_points_number
+        self.x_left_coord, self.x_right_coord, self.y_coord = x_left_coord, x_right_coord, y_coord
+        self.x_center_point_coord = (x_left_coord + x_right_coord) / 2
+        self.center_weight_distance = center_weight_distance
+        self.base_rope_mass, self.base_rope_stiffness = base_rope_mass, base_rope_stiffness
+        self.base_spring_stiffness, self.base_spring_damping = base_rope_stiffness * base_points_number, base_spring_damping
+        self.loaded_rope_stiffness, self.loaded_rope_damping = self.base_spring_stiffness / 2, base_spring_damping / 2
+        self.delta_len = delta_len
+        self.base_point_mass, self.base_point_moment = base_rope_mass / base_points_number, base_point_moment
+        self.loaded_rope_point_mass, self.loaded_rope_point_moment = loaded_rope_point_mass, loaded_rope_point_moment
+        self.weight_point_mass, self.weight_point_moment = weight_point_mass, weight_point_moment
+        self.static_point_mass, self.static_point_moment = static_point_mass, static_point_moment
+        self.static_edges_radius, self.moving_points_radius = static_edges_radius, moving_points_radius
+        self.x_bias, self.y_bias = x_bias, y_bias
+        self.edges, self.circles = None, None
+        self.__bodies_state = None
+
+
+    def create_static_edges(self) -> dict:
+        #Creating fixed edge points, they are added to the space together with the moving points (add_moving_circles)
+        left_edge_body = pm.Body(self.static_point_mass, self.static_point_moment, body_type=pm.Body.STATIC)
+        right_edge_body = pm.Body(self.static_point_mass, self.static_point_moment, body_type=pm.Body.STATIC)
+        left_edge_body.position, right_edge_body.position = (self.x_left_coord, self.y_coord), (self.x_right_coord, self.y_coord)
+        left_shape, right_shape = pm.Circle(left_edge_body, self.static_edges_radius), pm.Circle(right_edge_body, self.static_edges_radius)
+        return {'bodies': (left_edge_body, right_edge_body), 'shapes': (left_shape, right_shape)}
+
+
+    def add_moving_circles(self, edges: dict) -> dict:
+        #Function add center moving points. All points and springs are created first and added to the space with the edges
+        #in one space.add call.
+        center_point = pm.Body(self.base_point_mass, self.base_point_moment, body_type = pm.Body.DYNAMIC)
+        center_point.position = pm.Vec2d(self.x_center_point_coord, self.y_coord)
+        shape = pm.Circle(center_point, self.moving_points_radius)
+
+        weight_point = pm.Body(self.weight_point_mass, self.weight_point_moment, body_type = pm.Body.DYNAMIC)
+        weight_point.position = pm.Vec2d(self.x_center_point_coord + self.x_bias, self.y_coord - self.center_weight_distance - self.y_bias)
+        weight_point_shape = pm.Circle(weight_point, self.moving_points_radius)
+        center_point.velocity, weight_point.velocity = pm.Vec2d(0, 0), pm.Vec2d(0, 0)
+
+        point_shapes, point_bodies, springs = [],[],[]
+        x_base_point_coords = np.linspace(edges['bodies'][0].position[0], edges['bodies'][1].position[0], self.base_points_number + 3) #[1:]
+        y_loaded_rope_coords = np.linspace(center_point.position.y, weight_point.position.y, self.loaded_rope_points_number + 2)[1:]
+
+        #stretched_len_base_spring = abs(edges['bodies'][0].position[0] - x_base_point_coords[1])
+        #rest_len_loaded_rope_spring = abs(y_coord - y_loaded_rope_coords[1])
+        stretched_len_base_spring = edges['bodies'][0].position.get_distance((x_base_point_coords[1], self.y_coord))
+        delta = self.delta_len if 0 <= self.delta_len < stretched_len_base_spring else 0.5 * stretched_len_base_spring
+        rest_len_base_spring = stretched_len_base_spring -  delta
+        rest_len_loaded_rope_spring = center_point.position.get_distance((self.x_center_point_coord, y_loaded_rope_coords[0]))
+
+
+        for i in range(len(x_base_point_coords)):
+            #loop for adding points of the base spring
+            if i == 0:
+                continue
+            elif i == len(x_base_point_coords) - 1:
+                spring = pm.constraints.DampedSpring(point_bodies[-1], edges['bodies'][1], anchor_a = (0,0), anchor_b = (0,0),
+                                              rest_length = rest_len_base_spring, stiffness = self.base_spring_stiffness,
+                                              damping = self.base_spring_damping)
+
+            else:
+                left_point = edges['bodies'][0] if i == 1 else point_bodies[-1]
+
+                if i == int(len(x_base_point_coords) / 2):   #if i == index of the center point x_coord
+                    point = center_point
+                    point_shape = shape
+
+                else:
+                    point = pm.Body(self.base_point_mass, self.base_point_moment, body_type = pm.Body.DYNAMIC)
+                    point.position = pm.Vec2d(x_base_point_coords[i], self.y_coord)
+                    point_shape = pm.Circle(point, self.moving_points_radius)
+
+
+                spring = pm.constraints.DampedSpring(left_point, point, anchor_a = (0,0), anchor_b = (0,0),
+                                              rest_length = rest_len_base_spring, stiffness = self.base_spring_stiffness,
+                                              damping = self.base_spring_damping)
+
+
+                point.velocity = pm.Vec2d(0, 0)
+                point_shapes.append(point_shape)
+                point_bodies.append(point)
+
+
+            springs.append(spring)
+
+
+        loaded_rope_point_shapes, loaded_rope_point_bodies, loaded_rope_point_springs = [],[],[]
+        for i in range(len(y_loaded_rope_coords)):
+            #Loop for adding points of loaded spring
+            if i == len(y_loaded_rope_coords) - 1:
+                a_point = center_point if i == 0 else loaded_rope_point_bodies[i - 1]
+                point, point_shape  = weight_point, weight_point_shape
+
             else:
-                point = pm.Body(base_point_mass, base_point_moment, body_type = pm.Body.DYNAMIC)
-                point.position = pm.Vec2d(x_base_point_coords[i], y_coord)
-                point_shape = pm.Circle(point, moving_points_radius)
-                
-            
-            spring = pm.constraints.DampedSpring(left_point, point, anchor_a = (0,0), anchor_b = (0,0),
-                                          rest_length = rest_len_base_spring, stiffness = base_spring_stiffness,
-                                          damping = base_spring_damping)
-            
-            
-            point.velocity = pm.Vec2d(0, 0)
-            point_shapes.append(point_shape)
-            point_bodies.append(point)
-            space.add(point, point_shape)
-
-         
-        spring.activate_bodies()
-        springs.append(spring) 
-        space.add(spring)
-    
-   
-    loaded_rope_point_shapes, loaded_rope_point_bodies, loaded_rope_point_springs = [],[],[]
-    for i in range(len(y_loaded_rope_coords)):
-        #Loop for adding points of loaded spring
-        if i == len(y_loaded_rope_coords) - 1:
-            a_point = center_point if i == 0 else loaded_rope_point_bodies[i - 1]
-            point, point_shape  = weight_point, weight_point_shape
-            
-        else:
-            a_point = center_point if i == 0 else loaded_rope_point_bodies[i - 1]
-            point = pm.Body(loaded_rope_point_mass, loaded_rope_point_moment, body_type = pm.Body.DYNAMIC)
-            point.position = pm.Vec2d(x_center_point_coord, y_loaded_rope_coords[i])
-            point_shape = pm.Circle(point, moving_points_radius)
-
-        spring = pm.constraints.DampedSpring(a_point, point, anchor_a = (0,0), anchor_b = (0,0),
-                                          rest_length = rest_len_loaded_rope_spring, 
-                                          stiffness = loaded_rope_stiffness,
-                                          damping = loaded_rope_damping)
-
-
-        loaded_rope_point_shapes.append(point_shape)
-        loaded_rope_point_bodies.append(point)
-        space.add(point, point_shape)
-
-        loaded_rope_point_springs.append(spring) 
-        spring.activate_bodies()
-        space.add(spring)
-        
-         
-    return {'base_shapes': point_shapes, 'base_springs': springs, 'loaded_rope_shapes': loaded_rope_point_shapes,
-            'loaded_rope_springs': loaded_rope_point_springs}
-           
-       
-    
-
-def draw_circles(circles: dict) -> None:
-    #Drawing all objects using pygame interface
-    for base_shape in circles['base_shapes']:
-        pos_tuple = (base_shape.body.position.x, base_shape.body.position.y)
-        pg.draw.circle(screen, (0,0,50), pos_tuple, moving_points_radius)
-
-
-    for i, lr_shape in enumerate(circles['loaded_rope_shapes']):
-        pos_tuple = (lr_shape.body.position.x, lr_shape.body.position.y)
-        colors = (0, 0, 250) if i == len(circles['loaded_rope_shapes']) - 1 else (0,0,50)
-        pg.draw.circle(screen, colors, pos_tuple, moving_points_radius)
-        
-     
-    for base_spring in circles['base_springs']:
-        pg.draw.line(screen, (0,0,0), (base_spring.a.position.x, base_spring.a.position.y),
-                   (base_spring.b.position.x, base_spring.b.position.y), 1)
-
-    
-    for lr_spring in circles['loaded_rope_springs']:
-        pg.draw.line(screen, (0,0,0), (lr_spring.a.position.x, lr_spring.a.position.y),
-                     (lr_spring.b.position.x, lr_spring.b.position.y),  1)
-        
-    
-
-circles = add_moving_circles(space, edges)
-
-snapshot_timer = 0
-snapshot_counter = 0
-
-loop_start_time = time.time()
-while True:
-    for event in pg.event.get():
-        if event.type == pg.QUIT:
-            pg.quit()
-            
-    screen.fill((255,255,255))
-    draw_edges(edges)
-    draw_circles(circles)
-    space.step(1/FPS)
-    if do_snapshots and time.time() > loop_start_time + snapshot_delay: 
-        #This block of code doing snapshots.
-        snapshot_timer += clock.get_time()
-        if snapshot_timer >= interval * 1000 and snapshot_counter < num_snapshots:
-            snapshot_datetime = datetime.datetime.now().strftime("%d%m%Y_%H%M%S") 
-            pg.image.save(screen, f"screenshot_{snapshot_counter}_{snapshot_datetime}.png")
-            snapshot_counter += 1
-            snapshot_timer = 0
-    pg.display.update()
-    clock.tick(FPS)
-    
+                a_point = center_point if i == 0 else loaded_rope_point_bodies[i - 1]
+                point = pm.Body(self.loaded_rope_point_mass, self.loaded_rope_point_moment, body_type = pm.Body.DYNAMIC)
+                point.position = pm.Vec2d(self.x_center_point_coord, y_loaded_rope_coords[i])
+                point_shape = pm.Circle(point, self.moving_points_radius)
+
+            spring = pm.constraints.DampedSpring(a_point, point, anchor_a = (0,0), anchor_b = (0,0),
+                                              rest_length = rest_len_loaded_rope_spring,
+                                              stiffness = self.loaded_rope_stiffness,
+                                              damping = self.loaded_rope_damping)
+
+
+            loaded_rope_point_shapes.append(point_shape)
+            loaded_rope_point_bodies.append(point)
+
+            loaded_rope_point_springs.append(spring)
+
+
+        add_objects(self.space, [*edges['bodies'], *point_bodies, *loaded_rope_point_bodies],
+                    [*edges['shapes'], *point_shapes, *loaded_rope_point_shapes], springs + loaded_rope_point_springs)
+        for spring in springs + loaded_rope_point_springs:
+            spring.activate_bodies()
+        return {'base_shapes': point_shapes, 'base_springs': springs, 'loaded_rope_shapes': loaded_rope_point_shapes,
+                'loaded_rope_springs': loaded_rope_point_springs}
+
+
+    def create_model(self):
+        self.edges = self.create_static_edges()
+        self.circles = self.add_moving_circles(self.edges)
+        self.__bodies_state = BodiesState(self.space, [shape.body for shape in self.get_moving_shapes()])
+
+
+    def clone(self, space = None, offset = (0, 0)):
+        #Copy of the built model shifted by offset in the same space (space = None) or in another space,
+        #the copy is built from the parameters of the model and gets its current state
+        model = copy.copy(self)
+        model.space = self.space if space is None else space
+        model.x_left_coord, model.x_right_coord = self.x_left_coord + offset[0], self.x_right_coord + offset[0]
+        model.x_center_point_coord, model.y_coord = self.x_center_point_coord + offset[0], self.y_coord + offset[1]
+        model.create_model()
+        state = self.get_state()
+        model.set_state(state['positions'] + offset, state['velocities'], state['angles'], state['angular_velocities'])
+        return model
+
+
+    def get_moving_shapes(self) -> list:
+        #Shapes of all moving points: base points (with the central point) and then loaded rope points (the last one is the load)
+        return self.circles['base_shapes'] + self.circles['loaded_rope_shapes']
+
+
+    def get_springs(self) -> list:
+        return self.circles['base_springs'] + self.circles['loaded_rope_springs']
+
+
+    def get_load_point(self) -> pm.Body:
+        return self.circles['loaded_rope_shapes'][-1].body
+
+
+    def get_state(self) -> dict:
+        #Returns (N, 2) arrays of positions and velocities and (N,) arrays of angles and angular velocities of the moving points
+        return self.__bodies_state.get_state()
+
+
+    def set_state(self, positions = None, velocities = None, angles = None, angular_velocities = None):
+        #Setting the state of all moving points in one bulk call, None values are left unchanged
+        self.__bodies_state.set_state(positions, velocities, angles, angular_velocities)
+
+
+    def get_edges_coords(self) -> np.ndarray:
+        return np.array([(self.x_left_coord, self.y_coord), (self.x_right_coord, self.y_coord)], dtype = np.float64)
+
+
+    def get_center_point_index(self) -> int:
+        #Index of the central point among the base points (rows of get_state arrays)
+        return int((self.base_points_number + 3) / 2) - 1
+
+
+    def draw_edges(self, surface = None) -> None:
+        #Function draws edges (on the screen or on the cached background surface)
+        stamp_nodes(self.screen if surface is None else surface, self.get_edges_coords(), self.static_edges_radius, (0, 0, 50))
+
+
+    def draw_circles(self, positions = None) -> list:
+        #Drawing all moving points and springs from (N, 2) array of positions in the order of get_moving_shapes().
+        #Each chain of springs is one polyline and the points are stamped with cached sprites.
+        #Returns the list of bounding rectangles of the drawn points and chains (for DirtyRectRenderer).
+        positions = self.get_state()['positions'] if positions is None else np.asarray(positions, dtype = np.float64)
+        base_points_num, center_index = self.base_points_number + 1, self.get_center_point_index()
+        edges = self.get_edges_coords()
+        rects = stamp_nodes(self.screen, positions[:-1], self.moving_points_radius, (0,0,50), return_rects = True)
+        rects += stamp_nodes(self.screen, positions[-1:], self.moving_points_radius, (0, 0, 250), return_rects = True)
+        rects += draw_chain(self.screen, np.concatenate((edges[:1], positions[:base_points_num], edges[1:])), (0,0,0), 1, True)
+        rects += draw_chain(self.screen, np.concatenate((positions[center_index:center_index + 1], positions[base_points_num:])),
+                            (0,0,0), 1, True)
+        return rects
+
+
+    def draw_static(self, surface = None):
+        self.draw_edges(surface)
+
+
+    def draw_dynamic(self, positions = None) -> list:
+        return self.draw_circles(positions)
+
+
+    def draw_state(self, positions):
+        #Drawing the model from (N, 2) array of moving points positions in the order of get_moving_shapes(),
+        #pymunk objects aren't used, so recorded trajectories can be drawn without creating the model
+        self.draw_edges()
+        self.draw_circles(positions)
+
+
+    def draw(self):
+        self.draw_state(self.get_state()['positions'])
+
+
+if __name__ == '__main__':
+    import pygame as pg
+    from loop_policy import FixedTimestepPolicy
+    from snapshot_writer import SnapshotWriter
+    from stability import StabilityEstimator
+    from quiescence import RestDetector
+    FPS = 60
+    pg.init()
+    screen = pg.display.set_mode((800, 650))
+    clock = pg.time.Clock()
+    space = pm.Space()
+    space.gravity = (0,100)
+    do_snapshots = False  #Do (True) or not (False) snapshots
+    interval = 1.05   #Interval between snapshots in seconds of simulated time
+    num_snapshots = 12  #Number of shots
+    snapshot_delay = 2.2 #Delay in taking shots in seconds of simulated time
+
+    #Hyperparameters
+    base_points_number = 20 #12 #24 #18            #the number of base points without a central point
+    base_rope_stiffness =  7  #3.8 #7       #stiffness coefficient of the entire base rope
+    delta_len = 150                          #the size of the extension of the base springs at the initial moment of time
+    weight_point_mass, weight_point_moment = 30, 5               #mass and moment of inertia of the weight point
+
+    rope_model = LoadedRopeModel(space, screen, base_points_number = base_points_number, base_rope_stiffness = base_rope_stiffness,
+                                 delta_len = delta_len, weight_point_mass = weight_point_mass, weight_point_moment = weight_point_moment)
+    rope_model.create_model()
+    policy = FixedTimestepPolicy(physics_rate = FPS, max_substeps = 8)
+    #Stiffness of the base springs grows with base_points_number, the physics rate and solver iterations are chosen for it
+    StabilityEstimator(space).configure(policy, 1 / FPS)
+
+    #Snapshots are encoded and saved in background threads, so they don't stall the frames
+    snapshot_writer = SnapshotWriter(interval, num_snapshots, snapshot_delay) if do_snapshots else None
+    #The settled rope isn't stepped and redrawn until a key or mouse button is pressed
+    rest_detector = RestDetector(space)
+    #Fixed edges are drawn once on the cached background, only the changed rectangles of the window are updated
+    renderer = DirtyRectRenderer(screen, rope_model.draw_static, rope_model.draw_dynamic)
+
+    while True:
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                pg.quit()
+
+            if event.type in (pg.KEYDOWN, pg.MOUSEBUTTONDOWN, pg.WINDOWEXPOSED):
+                rest_detector.wake()
+
+            if event.type == pg.WINDOWEXPOSED:
+                renderer.invalidate()
+
+        if rest_detector.update(policy.sim_time):
+            clock.tick(FPS)
+            continue
+
+        rects = renderer.render()
+        policy.run(space, clock.get_time() / 1000)
+        if snapshot_writer is not None:
+            snapshot_writer.update(screen, policy.sim_time)
+        pg.display.update(rects)
+        clock.tick(FPS)
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from coupled_oscillator_model import WindowSpaceInitializer, CoupledOscillatorModel, GameLoop
+from lattice_model import CoupledLatticeModel
+from newton_pendulum import NewtonPendulum
+from rope_system_modified import LoadedRopeModel
+from observables import ObservablesMonitor
+from stability import StabilityEstimator
+from trajectory_recorder import TrajectoryRecorder
+
+
+'''
+Command-line runs of the models described by scenario files, without editing the source code.
+
+A scenario names the model and its constructor parameters, the run and the outputs:
+    {
+        "name": "oscillator_k10",
+        "model": "coupled_oscillator",          coupled_oscillator, lattice, newton_pendulum or loaded_rope
+        "parameters": {"left_fixed_edge_coords": [100, 100], "right_fixed_edge_coords": [700, 100],
+                       "fixed_points_num": 5, "hor_rest_len": 100, "hor_stiffness": 10, "hor_damping": 5},
+        "duration": 20, "dt": 0.0166667,        simulated seconds and the fixed step (1 / fps by default)
+        "window": [900, 600], "gravity": 100, "fps": 60,
+        "initial_velocities": [[100, 0], [0, 0], [0, 0], [0, 0], [0, 0]],
+        "stability": false,                     substeps and solver iterations of stability.StabilityEstimator
+        "stop_at_rest": false,                  the run ends when quiescence.RestDetector finds the model at rest
+        "sample_every": 1,                      steps between the samples of the trajectory and the observables
+        "outputs": {"trajectory": "runs/{name}", "observables": "runs/{name}_observables.json",
+                    "checkpoint": "runs/{name}.chk", "screenshot": "runs/{name}.png", "summary": "runs/{name}.json"}
+    }
+Lists in the parameters are passed as tuples, {name} in the output paths is replaced by the name of the scenario.
+
+A file holds one scenario, a list of scenarios or {"defaults": {...}, "scenarios": [...]} (defaults are merged into
+every scenario). TOML files use the same keys: top-level keys are one scenario, or [defaults] and [[scenarios]] tables.
+Scenarios of all files are run headlessly in parallel worker processes (one scenario per worker at a time), a failed
+scenario doesn't stop the others, its summary has the error. Names of the scenarios must be unique in all files.
+With --interactive the scenarios are shown in one window (multi_scene.MultiSceneRunner), every scene is stepped
+in its own process.
+
+Usage:
+    python scenario_cli.py scenarios.json more_scenarios.toml --workers 8 --summary summary.json
+    python scenario_cli.py scenario.toml --interactive
+'''
+
+
+#Model name: (class, True if the constructor takes WindowSpaceInitializer, False if it takes space and screen)
+MODELS = {'coupled_oscillator': (CoupledOscillatorModel, True),
+          'lattice': (CoupledLatticeModel, True),
+          'newton_pendulum': (NewtonPendulum, False),
+          'loaded_rope': (LoadedRopeModel, False)}
+DEFAULTS = {'name': None, 'parameters': {}, 'duration': None, 'dt': None, 'window': (900, 600), 'gravity': 100, 'fps': 60,
+            'initial_velocities': None, 'stability': False, 'stop_at_rest': False, 'sample_every': 1, 'outputs': {}}
+OUTPUTS = ('trajectory', 'observables', 'checkpoint', 'screenshot', 'summary')
+
+
+def to_tuples(value):
+    #Lists of json / toml are converted to tuples (coordinates are checked as tuples by the models)
+    if isinstance(value, list):
+        return tuple(to_tuples(item) for item in value)
+    if isinstance(value, dict):
+        return {key: to_tuples(item) for key, item in value.items()}
+    return value
+
+
+def normalize_scenario(scenario: dict, default_name = 'scenario') -> dict:
+    #Checking the keys of the scenario and filling the defaults
+    unknown = set(scenario) - set(DEFAULTS) - {'model'}
+    if unknown:
+        raise ValueError(f'Unknown keys of the scenario: {sorted(unknown)}')
+    if scenario.get('model') not in MODELS:
+        raise ValueError(f"model must be one of {list(MODELS)}, got {scenario.get('model')!r}")
+    scenario = {**DEFAULTS, **scenario}
+    if scenario['duration'] is None or scenario['duration'] <= 0:
+        raise ValueError('duration of the scenario must be a positive number of simulated seconds')
+    unknown = set(scenario['outputs']) - set(OUTPUTS)
+    if unknown:
+        raise ValueError(f'Unknown outputs of the scenario: {sorted(unknown)}')
+    if scenario['name'] is None:
+        scenario['name'] = default_name
+    if scenario['dt'] is None:
+        scenario['dt'] = 1 / scenario['fps']
+    scenario['parameters'] = to_tuples(scenario['parameters'])
+    scenario['outputs'] = {key: path.format(name = scenario['name']) for key, path in scenario['outputs'].items()}
+    return scenario
+
+
+def load_scenarios(path: str) -> list:
+    #List of the normalized scenarios of json or toml file
+    if path.endswith('.toml'):
+        import tomllib
+        with open(path, 'rb') as file:
+            content = tomllib.load(file)
+    else:
+        with open(path) as file:
+            content = json.load(file)
+    if isinstance(content, dict) and 'scenarios' in content:
+        defaults = content.get('defaults', {})
+        scenarios = [{**defaults, **scenario} for scenario in content['scenarios']]
+    else:
+        scenarios = content if isinstance(content, list) else [content]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return [normalize_scenario(scenario, f'{stem}_{i}') for i, scenario in enumerate(scenarios)]
+
+
+def load_all_scenarios(paths: list) -> list:
+    #Scenarios of all files, names must be unique (outputs of the scenarios with the same name would overwrite each other)
+    scenarios, sources = [], {}
+    for path in paths:
+        for scenario in load_scenarios(path):
+            if scenario['name'] in sources:
+                raise ValueError(f"Scenario name {scenario['name']!r} of {path} is already used in {sources[scenario['name']]}")
+            sources[scenario['name']] = path
+            scenarios.append(scenario)
+    return scenarios
+
+
+def build_model(scenario: dict) -> tuple:
+    #Headless WindowSpaceInitializer and the built model of the scenario, the model has no screen surface
+    #(GameLoop creates it when the model is drawn, pygame isn't imported by the runs without screenshots)
+    wsinit = WindowSpaceInitializer(*scenario['window'], scenario['gravity'], scenario['fps'], headless = True)
+    wsinit.initialize()
+    model_class, takes_wsinit = MODELS[scenario['model']]
+    if takes_wsinit:
+        model = model_class(wsinit, **scenario['parameters'])
+    else:
+        model = model_class(wsinit.space, wsinit.screen, **scenario['parameters'])
+    model.create_model()
+    if scenario['initial_velocities'] is not None:
+        model.set_state(velocities = np.array(scenario['initial_velocities'], dtype = np.float64))
+    return wsinit, model
+
+
+def build_scene(scenario: dict) -> tuple:
+    #Builder of multi_scene.MultiSceneRunner scenes, the model draws its tile on the off-screen surface
+    wsinit, model = build_model(scenario)
+    model.screen = wsinit.get_screen()
+    return wsinit.space, model
+
+
+def make_directory(path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+
+
+def run_scenario(scenario: dict) -> dict:
+    #Headless run of one normalized scenario, returns its summary
+    outputs = scenario['outputs']
+    wsinit, model = build_model(scenario)
+    stability = StabilityEstimator(wsinit.space) if scenario['stability'] else None
+    gameloop = GameLoop(wsinit, model, stability = stability, rest_detector = True if scenario['stop_at_rest'] else None)
+
+    callbacks, recorder, monitor = [], None, None
+    if 'trajectory' in outputs:
+        recorder = TrajectoryRecorder.for_model(outputs['trajectory'], model, metadata = {'scenario': scenario['name']})
+        recorder.record(0.0)
+        callbacks.append(recorder.as_callback())
+    if 'observables' in outputs:
+        monitor = ObservablesMonitor.for_space(wsinit.space)
+        monitor.update(0.0)
+        callbacks.append(monitor.as_callback())
+    def callback(gameloop):
+        for function in callbacks:
+            function(gameloop)
+
+    start_time = time.perf_counter()
+    try:
+        gameloop.run_until(scenario['duration'], scenario['dt'], callback if callbacks else None, scenario['sample_every'])
+    finally:
+        if recorder is not None:
+            recorder.close()
+    summary = {'name': scenario['name'], 'model': scenario['model'], 'sim_time': gameloop.sim_time,
+               'steps': gameloop.steps_done, 'wall_time': time.perf_counter() - start_time,
+               'at_rest': gameloop.rest_detector is not None and gameloop.rest_detector.is_at_rest, 'error': None}
+
+    if monitor is not None:
+        summary['observables'] = monitor.summary()
+        make_directory(outputs['observables'])
+        with open(outputs['observables'], 'w') as file:
+            json.dump(summary['observables'], file, indent = 2)
+    if 'checkpoint' in outputs:
+        make_directory(outputs['checkpoint'])
+        gameloop.save_checkpoint(outputs['checkpoint'])
+    if 'screenshot' in outputs:
+        import pygame as pg
+        make_directory(outputs['screenshot'])
+        gameloop.draw_frame()
+        pg.image.save(gameloop.get_screen(), outputs['screenshot'])
+    if 'summary' in outputs:
+        make_directory(outputs['summary'])
+        with open(outputs['summary'], 'w') as file:
+            json.dump(summary, file, indent = 2)
+    return summary
+
+
+def run_scenario_safely(scenario: dict) -> dict:
+    #run_scenario which returns the error in the summary instead of raising it (one failed run doesn't stop the queue)
+    try:
+        return run_scenario(scenario)
+    except Exception as error:
+        return {'name': scenario['name'], 'model': scenario['model'], 'error': f'{type(error).__name__}: {error}',
+                'traceback': traceback.format_exc()}
+
+
+def run_scenarios(scenarios: list, max_workers = None) -> list:
+    #Summaries of the scenarios in their order, the scenarios are run in parallel processes
+    if len(scenarios) == 0:
+        return []
+    max_workers = min(os.cpu_count() if max_workers is None else max_workers, len(scenarios))
+    if max_workers == 1:
+        return [run_scenario_safely(scenario) for scenario in scenarios]
+    with ProcessPoolExecutor(max_workers = max_workers) as executor:
+        return list(executor.map(run_scenario_safely, scenarios))
+
+
+def play_scenarios(scenarios: list):
+    #Interactive run: every scenario is a tile of one window, the scenes are stepped with their dt in worker processes
+    from multi_scene import MultiSceneRunner
+    scenes = [{'builder': build_scene, 'parameters': {'scenario': scenario}, 'title': scenario['name'],
+               'physics_rate': 1 / scenario['dt']} for scenario in scenarios]
+    window = scenarios[0]['window']
+    tile_size = window if len(scenarios) == 1 else (window[0] // 2, window[1] // 2)
+    with MultiSceneRunner(scenes, tile_size = tile_size, fps = scenarios[0]['fps']) as runner:
+        runner.play()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Runs of the models described by json or toml scenario files')
+    parser.add_argument('scenarios', nargs = '+', help = 'json or toml files with one scenario or a list of scenarios')
+    parser.add_argument('--interactive', action = 'store_true', help = 'show the scenarios in a window instead of the batch run')
+    parser.add_argument('--workers', type = int, default = None, help = 'number of worker processes (cpu count by default)')
+    parser.add_argument('--summary', default = None, help = 'json file for the summaries of all scenarios')
+    args = parser.parse_args()
+
+    try:
+        all_scenarios = load_all_scenarios(args.scenarios)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.interactive:
+        play_scenarios(all_scenarios)
+    else:
+        summaries = run_scenarios(all_scenarios, args.workers)
+        for row in summaries:
+            if row['error'] is None:
+                print(f"{row['name']:>30}: {row['steps']} steps, t = {row['sim_time']:.3f} s, "
+                      f"wall {row['wall_time']:.2f} s{', at rest' if row['at_rest'] else ''}")
+            else:
+                print(f"{row['name']:>30}: FAILED {row['error']}")
+        if args.summary is not None:
+            make_directory(args.summary)
+            with open(args.summary, 'w') as file:
+                json.dump(summaries, file, indent = 2)
+        raise SystemExit(1 if any(row['error'] is not None for row in summaries) else 0)
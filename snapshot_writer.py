@@ -0,0 +1,84 @@
+import datetime
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pygame as pg
+
+#pygame < 2.1.3 has only tostring / fromstring
+image_tobytes = getattr(pg.image, 'tobytes', None) or pg.image.tostring
+image_frombytes = getattr(pg.image, 'frombytes', None) or pg.image.fromstring
+
+
+'''
+Asynchronous snapshots of the pygame surface.
+On the main thread the surface is only copied to a raw RGB buffer, PNG encoding and saving are done
+by a thread pool (or a process pool with use_processes = True).
+The number of snapshots which are being encoded is bounded by max_pending: when the limit is reached
+the main thread waits for a free slot (block = True) or the snapshot is dropped (block = False).
+Snapshots are scheduled by simulated time, so the moments of the shots don't depend on the frame rate
+and on the time spent for the snapshots themselves.
+Snapshots which couldn't be encoded or saved are counted in failed, their exceptions are kept in errors.
+'''
+
+
+def encode_snapshot(raw: bytes, size: tuple, path: str) -> str:
+    #Encoding of one snapshot (runs in a worker thread or process)
+    surface = image_frombytes(raw, size, 'RGB')
+    pg.image.save(surface, path)
+    return path
+
+
+class SnapshotWriter:
+    def __init__(self, interval: float, num_snapshots = None, delay = 0.0, directory = '.', max_pending = 4, workers = 2,
+                 use_processes = False, block = True, file_pattern = 'screenshot_{counter}_{datetime}.png'):
+        #interval and delay are in seconds of simulated time, the first snapshot is taken at delay + interval
+        self.interval, self.num_snapshots, self.directory = interval, num_snapshots, directory
+        self.block, self.file_pattern = block, file_pattern
+        self.next_time = delay + interval
+        self.counter, self.dropped, self.failed, self.saved_paths, self.errors = 0, 0, 0, [], []
+        self.__slots = threading.BoundedSemaphore(max_pending)
+        self.__executor = (ProcessPoolExecutor if use_processes else ThreadPoolExecutor)(max_workers = workers)
+        os.makedirs(directory, exist_ok = True)
+
+
+    def is_finished(self) -> bool:
+        return self.num_snapshots is not None and self.counter >= self.num_snapshots
+
+
+    def update(self, surface: pg.Surface, sim_time: float) -> bool:
+        #Called every frame, takes the snapshot if it is due at sim_time. Returns True if the snapshot was taken.
+        if self.is_finished() or sim_time < self.next_time:
+            return False
+        self.next_time += self.interval * (1 + int((sim_time - self.next_time) // self.interval))
+        if not self.__slots.acquire(blocking = self.block):
+            self.dropped += 1
+            return False
+        self.__capture(surface)
+        return True
+
+
+    def __capture(self, surface: pg.Surface):
+        #Copy of the surface to the raw buffer on the main thread, encoding in the pool
+        raw, size = image_tobytes(surface, 'RGB'), surface.get_size()
+        name = self.file_pattern.format(counter = self.counter, datetime = datetime.datetime.now().strftime("%d%m%Y_%H%M%S"))
+        future = self.__executor.submit(encode_snapshot, raw, size, os.path.join(self.directory, name))
+        future.add_done_callback(self.__on_done)
+        self.counter += 1
+
+
+    def __on_done(self, future):
+        self.__slots.release()
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            self.saved_paths.append(future.result())
+        else:
+            self.failed += 1
+            self.errors.append(future.exception())
+
+
+    def close(self, wait = True) -> list:
+        #Waiting for the pending snapshots (if wait), returns paths of the saved files (see failed and errors for the others)
+        self.__executor.shutdown(wait = wait)
+        return self.saved_paths
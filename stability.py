@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+import pymunk as pm
+from model_state import get_space_layout
+
+
+'''
+Stability estimate of the fixed step for the spring models.
+
+1. The highest natural frequency of the spring network is bounded with the Gershgorin circle theorem applied to
+   M^(-1/2) K M^(-1/2): for every dynamic body i
+       omega_max^2 <= sum over springs s of i of k_s * (1 / m_i + 1 / sqrt(m_i * m_j)),
+   springs to static bodies (infinite mass) add only the first term. The bound is cheap (one pass over the springs)
+   and never underestimates the frequency.
+2. Explicit spring forces are stable for omega_max * dt < 2, the largest stable step is safety * 2 / omega_max.
+3. The number of substeps of a frame is ceil(frame_dt / max_stable_dt).
+4. Rods (PinJoints) are solved by the iterations of the solver: the number of iterations grows with the size of the
+   largest group of bodies connected by rods and with the mass ratio across the rods,
+   iterations = clamp(min_iterations + iterations_per_rod * rods in the group * (1 + log10(mass ratio))).
+
+Stiffness of the loaded rope springs is base_rope_stiffness * base_points_number, so ropes with many points need smaller dt,
+StabilityEstimator.configure(policy, frame_dt) sets the physics rate of FixedTimestepPolicy and space.iterations.
+update() re-evaluates the estimate when bodies or constraints were added or removed (or when stiffness of the springs
+and masses of the bodies were changed, with watch_parameters = True).
+'''
+
+
+class StabilityEstimator:
+    def __init__(self, space: pm.Space, safety = 0.5, min_iterations = 10, max_iterations = 100, iterations_per_rod = 1.0,
+                 watch_parameters = False):
+        self.space, self.safety = space, safety
+        self.min_iterations, self.max_iterations, self.iterations_per_rod = min_iterations, max_iterations, iterations_per_rod
+        self.watch_parameters = watch_parameters
+        self.__signature = None
+        self.refresh()
+
+
+    def __get_signature(self):
+        signature = (len(self.space.bodies), len(self.space.constraints))
+        if self.watch_parameters:
+            signature += (tuple(s.stiffness for s in self.__springs), tuple(body.mass for body in self.space.bodies))
+        return signature
+
+
+    def refresh(self):
+        #Reading masses and springs of the space and computing the estimate
+        layout = get_space_layout(self.space)
+        self.__springs = layout['springs']
+        masses, ends, stiffness = layout['masses'], layout['springs_ends'], layout['stiffness']
+        self.omega_max = self.get_omega_bound(masses, ends, stiffness)
+        self.max_stable_dt = self.safety * 2 / self.omega_max if self.omega_max > 0 else math.inf
+        self.iterations = self.get_iterations(masses, layout['rods_ends'])
+        self.__signature = self.__get_signature()
+
+
+    def update(self) -> bool:
+        #Re-evaluating the estimate if the space was changed, returns True if it was re-evaluated
+        if self.__get_signature() == self.__signature:
+            return False
+        self.refresh()
+        return True
+
+
+    @staticmethod
+    def get_omega_bound(masses: np.ndarray, ends: np.ndarray, stiffness: np.ndarray) -> float:
+        #Gershgorin bound of the highest angular frequency of the springs network
+        if len(ends) == 0:
+            return 0.0
+        inverse_masses = np.where(np.isfinite(masses), 1 / masses, 0.0)
+        coupling = stiffness * np.sqrt(inverse_masses[ends[:, 0]] * inverse_masses[ends[:, 1]])
+        row_sums = np.zeros(len(masses))
+        np.add.at(row_sums, ends[:, 0], stiffness * inverse_masses[ends[:, 0]] + coupling)
+        np.add.at(row_sums, ends[:, 1], stiffness * inverse_masses[ends[:, 1]] + coupling)
+        return float(np.sqrt(row_sums.max()))
+
+
+    def get_iterations(self, masses: np.ndarray, rods_ends: np.ndarray) -> int:
+        if len(rods_ends) == 0:
+            return self.min_iterations
+        #Groups of bodies connected by rods (union-find over the rods ends), static bodies don't join the groups
+        parents = np.arange(len(masses))
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+        dynamic = np.isfinite(masses)
+        for a, b in rods_ends.tolist():
+            if dynamic[a] and dynamic[b]:
+                parents[find(a)] = find(b)
+        roots = np.array([find(i) for i in range(len(masses))])
+        rod_roots = np.where(dynamic[rods_ends[:, 0]], roots[rods_ends[:, 0]], roots[rods_ends[:, 1]])
+        largest_group = int(np.bincount(rod_roots).max())
+
+        finite_masses = np.where(dynamic, masses, np.nan)
+        pair_masses = finite_masses[rods_ends]
+        ratios = np.nanmax(pair_masses, axis = 1) / np.nanmin(pair_masses, axis = 1)
+        mass_ratio = float(np.nanmax(ratios)) if np.isfinite(ratios).any() else 1.0
+        iterations = self.min_iterations + self.iterations_per_rod * largest_group * (1 + math.log10(mass_ratio))
+        return int(min(self.max_iterations, max(self.min_iterations, math.ceil(iterations))))
+
+
+    def get_substeps(self, frame_dt: float, max_substeps = None) -> int:
+        substeps = max(1, math.ceil(frame_dt / self.max_stable_dt - 1e-9)) if math.isfinite(self.max_stable_dt) else 1
+        return substeps if max_substeps is None else min(substeps, max_substeps)
+
+
+    def configure(self, policy = None, frame_dt = 1 / 60) -> dict:
+        #Setting space.iterations and (if policy is given) the physics rate and max_substeps of FixedTimestepPolicy.
+        #The physics rate is a multiple of the frame rate which gives a stable step, a higher rate of the policy is kept.
+        substeps = self.get_substeps(frame_dt)
+        self.space.iterations = self.iterations
+        if policy is not None:
+            policy.set_physics_rate(max(policy.physics_rate, substeps / frame_dt))
+            policy.max_substeps = max(policy.max_substeps, 2 * substeps)
+        return {'omega_max': self.omega_max, 'max_stable_dt': self.max_stable_dt, 'substeps': substeps,
+                'dt': frame_dt / substeps, 'iterations': self.iterations}
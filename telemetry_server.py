@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import pymunk as pm
+from observables import Observables
+
+
+'''
+Telemetry of the running simulation for the dashboards on the same host.
+
+TelemetryServer runs an asyncio server (local TCP or Unix socket) in the event loop of a background thread.
+The simulation thread calls publish() (or ModelTelemetry.update()), the frame is encoded and handed to the loop with
+call_soon_threadsafe, so the simulation never waits for the sockets:
+    1. frames are decimated: only every `every`-th call is published and not more than max_rate frames per second
+       of wall time, nothing is encoded while no client is connected;
+    2. every client has its own queue of max_queue frames, when the queue is full the oldest (stale) frame is dropped;
+    3. the writer task of the client waits for drain() of its socket (backpressure of one client doesn't stop
+       the others and doesn't stop the simulation).
+
+Stream of messages, every message is uint32 length (of the type and the payload) | uint8 type | payload (little-endian):
+    type 0 - hello (utf-8 json): version, energy names, sent once after the connection
+    type 1 - frame: FRAME_HEADER (step uint64, sim_time float64, step_time float64 - mean wall time of one step
+             of the engine since the previous frame, drawing and waiting of the loop aren't included, nodes number uint32,
+             energies number uint32) | energies float64[] | positions float32[nodes, 2]
+
+Usage:
+    with TelemetryServer(port = 5555) as server:
+        GameLoop(wsinit, model, telemetry = ModelTelemetry(server, model, wsinit.space)).run_until(600)
+'''
+
+
+VERSION = 1
+MESSAGE_PREFIX = struct.Struct('<IB')
+FRAME_HEADER = struct.Struct('<QddII')
+HELLO, FRAME = 0, 1
+ENERGY_NAMES = ('kinetic', 'gravitational', 'elastic', 'total')
+
+
+def encode_message(message_type: int, payload: bytes) -> bytes:
+    return MESSAGE_PREFIX.pack(len(payload) + 1, message_type) + payload
+
+
+def encode_frame(step: int, sim_time: float, step_time: float, positions, energies = ()) -> bytes:
+    positions = np.ascontiguousarray(positions, dtype = '<f4').reshape(-1, 2)
+    energies = np.ascontiguousarray(energies, dtype = '<f8')
+    header = FRAME_HEADER.pack(step, sim_time, step_time, len(positions), len(energies))
+    return encode_message(FRAME, header + energies.tobytes() + positions.tobytes())
+
+
+def decode_frame(payload: bytes) -> dict:
+    #Decoding the payload of the frame message (without the length and the type), for the clients
+    step, sim_time, step_time, nodes_num, energies_num = FRAME_HEADER.unpack_from(payload)
+    offset = FRAME_HEADER.size
+    energies = np.frombuffer(payload, '<f8', energies_num, offset)
+    positions = np.frombuffer(payload, '<f4', 2 * nodes_num, offset + 8 * energies_num).reshape(nodes_num, 2)
+    return {'step': step, 'sim_time': sim_time, 'step_time': step_time, 'energies': energies, 'positions': positions}
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple:
+    #(type, payload) of the next message of the stream, for the clients
+    length, message_type = MESSAGE_PREFIX.unpack(await reader.readexactly(MESSAGE_PREFIX.size))
+    return message_type, await reader.readexactly(length - 1)
+
+
+class TelemetryServer:
+    def __init__(self, host = '127.0.0.1', port = 0, unix_path = None, every = 1, max_rate = 30.0, max_queue = 4,
+                 energy_names = ENERGY_NAMES):
+        #port = 0 chooses a free port (see address after start()), with unix_path the server listens on the Unix socket
+        self.host, self.port, self.unix_path = host, port, unix_path
+        self.every, self.max_rate, self.max_queue = max(1, every), max_rate, max(1, max_queue)
+        self.energy_names = tuple(energy_names)
+        self.address = None
+        self.frames_published, self.frames_dropped = 0, 0
+        self.__loop, self.__thread, self.__server = None, None, None
+        self.__clients = {}
+        self.__calls, self.__last_publish_time = 0, -np.inf
+
+
+    @property
+    def clients_num(self) -> int:
+        return len(self.__clients)
+
+
+    def start(self):
+        #Starting the event loop thread and the server, returns when the server is listening
+        if self.__thread is not None:
+            raise RuntimeError('Telemetry server is already started')
+        ready, errors = threading.Event(), []
+        def run_loop():
+            asyncio.set_event_loop(self.__loop)
+            try:
+                self.__loop.run_until_complete(self.__start_server())
+            except Exception as error:
+                errors.append(error)
+                ready.set()
+                return
+            ready.set()
+            self.__loop.run_forever()
+            self.__loop.run_until_complete(self.__close_server())
+            self.__loop.close()
+        self.__loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target = run_loop, name = 'telemetry-server', daemon = True)
+        self.__thread.start()
+        ready.wait()
+        if errors:
+            self.__thread.join()
+            self.__loop, self.__thread = None, None
+            raise errors[0]
+        return self
+
+
+    async def __start_server(self):
+        if self.unix_path is None:
+            self.__server = await asyncio.start_server(self.__handle_client, self.host, self.port)
+            self.address = self.__server.sockets[0].getsockname()[:2]
+        else:
+            self.__server = await asyncio.start_unix_server(self.__handle_client, self.unix_path)
+            self.address = self.unix_path
+
+
+    async def __close_server(self):
+        self.__server.close()
+        for queue, task in list(self.__clients.values()):
+            task.cancel()
+        await asyncio.gather(*(task for queue, task in self.__clients.values()), return_exceptions = True)
+        await self.__server.wait_closed()
+        if self.unix_path is not None and os.path.exists(self.unix_path):
+            os.remove(self.unix_path)
+
+
+    def stop(self, timeout = 5.0):
+        if self.__thread is None:
+            return
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join(timeout)
+        if self.__thread.is_alive():
+            raise RuntimeError(f'Telemetry server loop has not stopped in {timeout} s')
+        self.__loop, self.__thread, self.__server = None, None, None
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    async def __handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        queue = asyncio.Queue(self.max_queue)
+        self.__clients[writer] = (queue, asyncio.current_task())
+        try:
+            hello = {'version': VERSION, 'energy_names': list(self.energy_names)}
+            writer.write(encode_message(HELLO, json.dumps(hello).encode('utf-8')))
+            await writer.drain()
+            while True:
+                writer.write(await queue.get())
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            del self.__clients[writer]
+            writer.close()
+
+
+    def __broadcast(self, frame: bytes):
+        #Called in the loop thread: the frame is queued for every client, the oldest frame of a full queue is dropped
+        for queue, task in self.__clients.values():
+            if queue.full():
+                queue.get_nowait()
+                self.frames_dropped += 1
+            queue.put_nowait(frame)
+
+
+    def is_due(self) -> bool:
+        #Decimation of the publish() calls, True if the next call is published
+        if not self.__clients or self.__loop is None:
+            return False
+        self.__calls += 1
+        if self.__calls % self.every != 0:
+            return False
+        now = time.perf_counter()
+        if self.max_rate is not None and now - self.__last_publish_time < 1 / self.max_rate:
+            return False
+        self.__last_publish_time = now
+        return True
+
+
+    def publish(self, step: int, sim_time: float, positions, energies = (), step_time = 0.0, check_due = True) -> bool:
+        #Publishing the frame from the simulation thread without waiting, returns True if the frame was sent to the loop
+        if check_due and not self.is_due():
+            return False
+        frame = encode_frame(step, sim_time, step_time, positions, energies)
+        self.__loop.call_soon_threadsafe(self.__broadcast, frame)
+        self.frames_published += 1
+        return True
+
+
+
+class ModelTelemetry:
+    #Frames of a model (any model with get_state()) with the energies of its space and the mean wall time of the steps,
+    #sync() is called before the state is read (for example sync_to_space of mass_spring_engine.MassSpringEngine)
+    def __init__(self, server: TelemetryServer, model, space: pm.Space, sync = None):
+        self.server, self.model, self.sync = server, model, sync
+        self.observables = Observables(space)
+        self.__last_wall_time, self.__last_steps = None, 0
+
+
+    def update(self, sim_time: float, steps_done: int, step_wall_time = None) -> bool:
+        #step_wall_time is the total wall time spent in the steps (GameLoop.step_wall_time),
+        #without it step_time of the frames is 0
+        if not self.server.is_due():
+            return False
+        step_time = 0.0
+        if step_wall_time is not None:
+            if self.__last_wall_time is not None and steps_done > self.__last_steps:
+                step_time = (step_wall_time - self.__last_wall_time) / (steps_done - self.__last_steps)
+            self.__last_wall_time, self.__last_steps = step_wall_time, steps_done
+        if self.sync is not None:
+            self.sync()
+        values = self.observables.compute()
+        energies = [values[name] for name in self.server.energy_names]
+        return self.server.publish(steps_done, sim_time, self.model.get_state()['positions'], energies, step_time,
+                                   check_due = False)
+
+
+    def as_callback(self):
+        #Callback for GameLoop.run() / run_until()
+        return lambda gameloop: self.update(gameloop.sim_time, gameloop.steps_done, gameloop.step_wall_time)
+
+
+
+if __name__ == '__main__':
+    #Headless run of the coupled oscillator streamed on the local port, the client prints the received frames
+    from coupled_oscillator_model import WindowSpaceInitializer, CoupledOscillatorModel, GameLoop
+
+    async def print_frames(address, frames_num):
+        reader, writer = await asyncio.open_connection(*address)
+        message_type, payload = await read_message(reader)
+        energy_names = json.loads(payload)['energy_names']
+        for _ in range(frames_num):
+            message_type, payload = await read_message(reader)
+            frame = decode_frame(payload)
+            energies = ', '.join(f'{name} {value:.1f}' for name, value in zip(energy_names, frame['energies']))
+            print(f"step {frame['step']}, t = {frame['sim_time']:.2f} s, step {frame['step_time'] * 1e6:.1f} us, {energies}")
+        writer.close()
+
+    wsinit = WindowSpaceInitializer(900, 600, 100, 60, headless = True)
+    wsinit.initialize()
+    model = CoupledOscillatorModel(wsinit, (100, 100), (700, 100), 5, hor_rest_len = 100, hor_damping = 5, hor_stiffness = 10,
+                                   vert_rest_len = 200)
+    model.create_model()
+    with TelemetryServer(max_rate = 10) as server:
+        client = threading.Thread(target = lambda: asyncio.run(print_frames(server.address, 20)))
+        client.start()
+        while server.clients_num == 0:
+            time.sleep(0.01)
+        gameloop = GameLoop(wsinit, model, telemetry = ModelTelemetry(server, model, wsinit.space))
+        while client.is_alive():
+            gameloop.run(60)
+            time.sleep(0.05)
@@ -0,0 +1,51 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame as pg
+from batched_renderer import draw_chain, draw_segments, stamp_nodes, DirtyRectRenderer
+
+
+SIZE = (200, 160)
+
+
+def draw_static(surface):
+    stamp_nodes(surface, [(20, 80), (180, 80)], 4, (0,0,0))
+
+
+def draw_dynamic(screen, positions):
+    rects = draw_chain(screen, positions, (0,0,0), 1, True)
+    rects += draw_segments(screen, positions[:1], positions[-1:], (0,0,90), 1, True)
+    rects += stamp_nodes(screen, positions, 3, (0,0,50), return_rects = True)
+    return rects
+
+
+def full_redraw(positions) -> np.ndarray:
+    surface = pg.Surface(SIZE)
+    surface.fill((255,255,255))
+    draw_static(surface)
+    draw_dynamic(surface, positions)
+    return pg.surfarray.array3d(surface)
+
+
+def test_updated_rects_match_full_redraw():
+    #The window shows only the returned rectangles of every frame, it must be equal to the full redraw.
+    #The ends of the chain are fixed and its inner points move, so the bounding rectangles don't change.
+    screen, window = pg.Surface(SIZE), pg.Surface(SIZE)
+    renderer = DirtyRectRenderer(screen, draw_static, lambda positions: draw_dynamic(screen, positions))
+    frames = [np.array([(20, 80), (70, 40), (130, 120), (180, 80)], dtype = np.float64),
+              np.array([(20, 80), (70, 120), (130, 40), (180, 80)], dtype = np.float64),
+              np.array([(20, 80), (75, 118), (125, 42), (180, 80)], dtype = np.float64)]
+    for positions in frames:
+        for rect in renderer.render(positions):
+            window.blit(screen, rect, rect)
+        assert np.array_equal(pg.surfarray.array3d(window), full_redraw(positions))
+
+
+def test_invalidate_updates_whole_screen():
+    screen = pg.Surface(SIZE)
+    positions = np.array([(20, 80), (100, 100), (180, 80)], dtype = np.float64)
+    renderer = DirtyRectRenderer(screen, draw_static, lambda: draw_dynamic(screen, positions))
+    assert renderer.render() == [screen.get_rect()]
+    renderer.invalidate()
+    assert renderer.render() == [screen.get_rect()]
@@ -0,0 +1,184 @@
+import json
+import os
+
+import numpy as np
+
+
+'''
+Streaming recording of model trajectories to disk.
+
+Layout of the recording directory:
+    header.json - small metadata header (format version, nodes number, chunk size, dtype,
+                  number of recorded frames, user metadata)
+    times_00000.npy - (chunk_steps,) simulated times of the frames
+    positions_00000.npy - (chunk_steps, N, 2) positions of the nodes
+    velocities_00000.npy - (chunk_steps, N, 2) velocities of the nodes (if velocities are recorded)
+
+Chunk files are preallocated memory-mapped .npy files, so the memory used by the recorder doesn't depend
+on the length of the run. Every flush_every frames the chunk is flushed and the header is rewritten,
+so a run which was stopped in the middle can still be read up to the last flush.
+Any model with get_state() method (NewtonPendulum, CoupledOscillatorModel, LoadedRopeModel) can be recorded.
+'''
+
+FORMAT_VERSION = 1
+
+
+class TrajectoryRecorder:
+    def __init__(self, directory: str, nodes_num: int, chunk_steps = 4096, flush_every = 256, record_velocities = True,
+                 dtype = np.float64, metadata = None):
+        self.directory, self.nodes_num = directory, nodes_num
+        self.chunk_steps, self.flush_every = chunk_steps, flush_every
+        self.record_velocities, self.dtype = record_velocities, np.dtype(dtype)
+        self.metadata = {} if metadata is None else metadata
+        self.frames_num, self.model = 0, None
+        self.__chunk_index, self.__chunk = -1, None
+        os.makedirs(directory, exist_ok = True)
+        self.__write_header()
+
+
+    @classmethod
+    def for_model(cls, directory: str, model, **kwargs):
+        #Creating the recorder attached to the model (nodes number is taken from the model state)
+        nodes_num = len(model.get_state()['positions'])
+        metadata = {'model': type(model).__name__, **kwargs.pop('metadata', {})}
+        recorder = cls(directory, nodes_num, metadata = metadata, **kwargs)
+        recorder.attach(model)
+        return recorder
+
+
+    def attach(self, model):
+        self.model = model
+
+
+    def __write_header(self):
+        header = {'format_version': FORMAT_VERSION, 'nodes_num': self.nodes_num, 'chunk_steps': self.chunk_steps,
+                  'dtype': self.dtype.str, 'record_velocities': self.record_velocities,
+                  'frames_num': self.frames_num, 'metadata': self.metadata}
+        tmp_path = os.path.join(self.directory, 'header.json.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump(header, file, indent = 2)
+        os.replace(tmp_path, os.path.join(self.directory, 'header.json'))
+
+
+    def __open_chunk(self, chunk_index: int):
+        #Preallocation of the memory-mapped files of the next chunk
+        def open_memmap(name, shape, dtype):
+            path = os.path.join(self.directory, f'{name}_{chunk_index:05d}.npy')
+            return np.lib.format.open_memmap(path, mode = 'w+', dtype = dtype, shape = shape)
+
+        shape = (self.chunk_steps, self.nodes_num, 2)
+        self.__chunk = {'times': open_memmap('times', (self.chunk_steps,), np.float64),
+                        'positions': open_memmap('positions', shape, self.dtype)}
+        if self.record_velocities:
+            self.__chunk['velocities'] = open_memmap('velocities', shape, self.dtype)
+        self.__chunk_index = chunk_index
+
+
+    def append(self, positions, velocities = None, t = None):
+        #Appending one frame, t is the simulated time of the frame (frame number by default)
+        chunk_index, row = divmod(self.frames_num, self.chunk_steps)
+        if chunk_index != self.__chunk_index:
+            self.__close_chunk()
+            self.__open_chunk(chunk_index)
+        self.__chunk['times'][row] = self.frames_num if t is None else t
+        self.__chunk['positions'][row] = positions
+        if self.record_velocities:
+            self.__chunk['velocities'][row] = 0 if velocities is None else velocities
+        self.frames_num += 1
+        if self.frames_num % self.flush_every == 0:
+            self.flush()
+
+
+    def record(self, t = None):
+        #Appending the current state of the attached model
+        state = self.model.get_state()
+        self.append(state['positions'], state['velocities'], t)
+
+
+    def as_callback(self):
+        #Callback for GameLoop.run() / run_until(): records the model state with the simulated time of the loop
+        return lambda gameloop: self.record(gameloop.sim_time)
+
+
+    def flush(self):
+        if self.__chunk is not None:
+            for array in self.__chunk.values():
+                array.flush()
+        self.__write_header()
+
+
+    def __close_chunk(self):
+        if self.__chunk is not None:
+            self.flush()
+            self.__chunk = None
+
+
+    def close(self):
+        self.__close_chunk()
+        self.__write_header()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+class TrajectoryReader:
+    #Reading of the recordings made by TrajectoryRecorder, chunks are opened as read-only memory maps
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, 'header.json')) as file:
+            self.header = json.load(file)
+        if self.header['format_version'] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported format version {self.header['format_version']}")
+        self.nodes_num, self.chunk_steps = self.header['nodes_num'], self.header['chunk_steps']
+        self.frames_num, self.metadata = self.header['frames_num'], self.header['metadata']
+        self.has_velocities = self.header['record_velocities']
+        self.__chunks = {}
+        times = [np.asarray(self.__get_chunk(k)['times']) for k in range(self.chunks_num)]
+        self.times = np.concatenate(times)[:self.frames_num] if times else np.empty(0)
+
+
+    @property
+    def chunks_num(self) -> int:
+        return -(-self.frames_num // self.chunk_steps)
+
+
+    def __get_chunk(self, chunk_index: int) -> dict:
+        if chunk_index not in self.__chunks:
+            names = ('times', 'positions', 'velocities') if self.has_velocities else ('times', 'positions')
+            self.__chunks[chunk_index] = {name: np.load(os.path.join(self.directory, f'{name}_{chunk_index:05d}.npy'), mmap_mode = 'r')
+                                          for name in names}
+        return self.__chunks[chunk_index]
+
+
+    def get_frame(self, frame_index: int) -> dict:
+        #Returns dict with time, positions (N, 2) and velocities (N, 2) of one frame
+        if not 0 <= frame_index < self.frames_num:
+            raise IndexError('frame_index out of range')
+        chunk_index, row = divmod(frame_index, self.chunk_steps)
+        chunk = self.__get_chunk(chunk_index)
+        frame = {'time': float(chunk['times'][row]), 'positions': np.asarray(chunk['positions'][row])}
+        if self.has_velocities:
+            frame['velocities'] = np.asarray(chunk['velocities'][row])
+        return frame
+
+
+    def get_positions(self, start = 0, stop = None) -> np.ndarray:
+        #Positions of frames [start, stop) as one (frames, N, 2) array
+        stop = self.frames_num if stop is None else min(stop, self.frames_num)
+        parts = []
+        for chunk_index in range(start // self.chunk_steps, -(-stop // self.chunk_steps)):
+            first = chunk_index * self.chunk_steps
+            rows = slice(max(start - first, 0), min(stop - first, self.chunk_steps))
+            parts.append(self.__get_chunk(chunk_index)['positions'][rows])
+        return np.concatenate(parts) if parts else np.empty((0, self.nodes_num, 2))
+
+
+    def find_frame(self, t: float) -> int:
+        #Index of the last frame with time <= t
+        return int(np.clip(np.searchsorted(self.times, t, side = 'right') - 1, 0, max(self.frames_num - 1, 0)))
@@ -1,70 +1,89 @@
-import pygame
 import pymunk
+from loop_policy import FixedTimestepPolicy
 '''
 In this module you can watch the simulation of moving of the usual spring pendulum.
 Try to change initial coordinates of the moving point.
 Do your own experiments:)
+The model is created by create_model() without pygame, the window is opened only by main().
 '''
 
 
-# Pygame initialization
-pygame.init()
-screen = pygame.display.set_mode((800, 600))
-clock = pygame.time.Clock()
+def create_model(point_position = (450, 100), gravity = (0, 10)) -> tuple:
+    # Pymunk initialization
+    space = pymunk.Space()
+    space.gravity = gravity
 
+    # Creating fixed points
+    pivot = pymunk.Body(body_type=pymunk.Body.STATIC)
+    pivot.position = (400, 100)
 
-# Pymunk initialization
-space = pymunk.Space()
-space.gravity = (0, 10)
+    point = pymunk.Body(1, 1, body_type=pymunk.Body.DYNAMIC)
+    #point.position = (400, 300)
+    point.position = point_position
 
-# Creating fixed points
-pivot = pymunk.Body(body_type=pymunk.Body.STATIC)
-pivot.position = (400, 100)
 
-point = pymunk.Body(1, 1, body_type=pymunk.Body.DYNAMIC)
-#point.position = (400, 300)
-point.position = (450, 100)
+    # Creating spring
+    spring = pymunk.DampedSpring(pivot, point, (0, 0), (0, 0), rest_length = 200, stiffness = 0.2, damping = 0.05)
+    #spring = pymunk.DampedRotarySpring(pivot, bob, 0, 5000, 50)
 
+    # Adding objects to the space
+    space.add(pivot, point, spring)
 
-# Creating spring
-spring = pymunk.DampedSpring(pivot, point, (0, 0), (0, 0), rest_length = 200, stiffness = 0.2, damping = 0.05)
-#spring = pymunk.DampedRotarySpring(pivot, bob, 0, 5000, 50)
+    point.angular_velocity = 5
+    return space, pivot, point, spring
 
-# Adding objects to the space
-space.add(pivot, point, spring)
 
-point.angular_velocity = 5
+def draw(screen, pivot: pymunk.Body, point: pymunk.Body):
+    import pygame
+    pygame.draw.line(screen, (0, 0, 0), pivot.position, point.position, 2)
+    pygame.draw.circle(screen, (255, 0, 0), (int(pivot.position.x), int(pivot.position.y)), 5)
+    pygame.draw.circle(screen, (0, 0, 255), (int(point.position.x), int(point.position.y)), 10)
 
 
-#check_click = False
-while True:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            pygame.quit()
-            exit()
-        '''
-        #Advanced idea: set initial coordinates of the moving point by the left button mouse click
-        if event.type == pygame.MOUSEBUTTONDOWN and check_click == False:
-            if event.button == 1:
-                point = pymunk.Body(1, 1, body_type=pymunk.Body.DYNAMIC)
-                point.position = event.pos
-                point.angular_velocity = 5
-                spring = pymunk.DampedSpring(pivot, point, (0, 0), (0, 0), rest_length = 200, stiffness = 0.2, damping = 0.05)
-                space.add(point, spring)
-                check_click = True
-        '''     
-    screen.fill((255, 255, 255))
+def main():
+    import pygame
+    # Pygame initialization
+    pygame.init()
+    screen = pygame.display.set_mode((800, 600))
+    clock = pygame.time.Clock()
+
+    space, pivot, point, spring = create_model()
+
+    # Physics is stepped with dt = 1/60 and runs 10 times faster than real time (as 10 steps of 1/60 per frame before),
+    # but it doesn't depend on the display rate now
+    policy = FixedTimestepPolicy(physics_rate = 60, max_substeps = 20, time_scale = 10)
+
+
+    #check_click = False
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+            '''
+            #Advanced idea: set initial coordinates of the moving point by the left button mouse click
+            if event.type == pygame.MOUSEBUTTONDOWN and check_click == False:
+                if event.button == 1:
+                    point = pymunk.Body(1, 1, body_type=pymunk.Body.DYNAMIC)
+                    point.position = event.pos
+                    point.angular_velocity = 5
+                    spring = pymunk.DampedSpring(pivot, point, (0, 0), (0, 0), rest_length = 200, stiffness = 0.2, damping = 0.05)
+                    space.add(point, spring)
+                    check_click = True
+            '''
+        screen.fill((255, 255, 255))
+
+
+        policy.run(space, clock.get_time() / 1000)
+
+
+        draw(screen, pivot, point)
+
+        pygame.display.flip()
+
+        clock.tick(60)
 
-    
-    dt = 1.0 / 60.0
-    for _ in range(10):
-        space.step(dt)
 
-    
-    pygame.draw.line(screen, (0, 0, 0), pivot.position, point.position, 2)
-    pygame.draw.circle(screen, (255, 0, 0), (int(pivot.position.x), int(pivot.position.y)), 5)
-    pygame.draw.circle(screen, (0, 0, 255), (int(point.position.x), int(point.position.y)), 10)
 
-    pygame.display.flip()
-    
-    clock.tick(60)
+if __name__ == '__main__':
+    main()